@@ -3,7 +3,9 @@
 # Distributed under the terms of the MIT License.
 
 import copy
-from typing import Any, Dict, List, Optional, Tuple
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import networkx as nx
 import numpy as np
@@ -13,6 +15,7 @@ from pymatgen.analysis.local_env import OpenBabelNN, metal_edge_extender
 from pymatgen.core.structure import Molecule
 
 from mrnet.utils.constants import ROOM_TEMP
+from mrnet.utils.graphs import weisfeiler_lehman_hash
 
 __author__ = "Sam Blau, Mingjian Wen"
 __copyright__ = "Copyright 2019, The Materials Project"
@@ -22,6 +25,62 @@ __status__ = "Alpha"
 __date__ = "Aug 1, 2019"
 
 
+class BondFragments(NamedTuple):
+    """
+    Fragments obtained by breaking one bond of a molecule: a single graph for a
+    ring-opening bond, two graphs otherwise. The formulas, bond counts and
+    Weisfeiler-Lehman hashes are listed in the same order as the graphs.
+    """
+
+    graphs: List[MoleculeGraph]
+    formulas: List[str]
+    num_bonds: List[int]
+    hashes: List[str]
+
+
+class _FragmentCacheRegistry:
+    """
+    Bookkeeping of the MoleculeEntry fragment caches shared by all entries. Entries
+    are kept in least recently used order, together with the number of fragment
+    graphs they hold, and are only referenced weakly.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()  # type: OrderedDict
+        self.size = 0
+
+    def touch(self, entry: "MoleculeEntry"):
+        key = id(entry)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+
+    def add(self, entry: "MoleculeEntry", size: int, max_size: int):
+        key = id(entry)
+        self.discard(key)
+        ref = weakref.ref(entry, lambda dead: self._collected(key, dead))
+        self.entries[key] = (ref, size)
+        self.size += size
+        while self.size > max_size and len(self.entries) > 1:
+            _, (ref, n) = self.entries.popitem(last=False)
+            self.size -= n
+            evicted = ref()
+            if evicted is not None:
+                evicted._fragment_cache = None
+
+    def discard(self, key: int):
+        if key in self.entries:
+            _, n = self.entries.pop(key)
+            self.size -= n
+
+    def _collected(self, key: int, ref: weakref.ref):
+        # the id may have been reused by a newer entry before the callback ran
+        if key in self.entries and self.entries[key][0] is ref:
+            self.discard(key)
+
+
+_fragment_caches = _FragmentCacheRegistry()
+
+
 class MoleculeEntry(MSONable):
     """
     A molecule entry class to provide easy access to Molecule properties.
@@ -45,6 +104,12 @@ class MoleculeEntry(MSONable):
         mol_graph: MoleculeGraph of the molecule.
     """
 
+    # upper bound on the number of fragment graphs cached by get_bond_fragments over
+    # all entries; the least recently used entries are evicted first
+    fragment_cache_size = 50000
+
+    _fragment_cache = None  # type: Optional[Dict[Tuple[int, int], BondFragments]]
+
     def __init__(
         self,
         molecule: Molecule,
@@ -268,10 +333,62 @@ class MoleculeEntry(MSONable):
         else:
             return None
 
+    def get_bond_fragments(self) -> Dict[Tuple[int, int], BondFragments]:
+        """
+        Get the fragments of the molecule by breaking each of its bonds, together with
+        their formulas, number of bonds and Weisfeiler-Lehman hashes.
+
+        The fragments are computed on first use and cached on the entry, so reaction
+        generation and isomorphic bond analysis only split each bond once. The cache
+        is bounded by `MoleculeEntry.fragment_cache_size` fragment graphs over all
+        entries, evicting the least recently used entries first. It assumes the
+        molecule graph is not modified in place, and the cached graphs are shared
+        between callers, so they must not be modified either.
+
+        Returns:
+            Fragments dict {(atom1, atom2): BondFragments}, in the order of
+                `self.bonds`. The graphs of a BondFragments have either one element
+                (ring-opening A->B) or two elements (not ring-opening A->B+C).
+        """
+
+        if self._fragment_cache is not None:
+            _fragment_caches.touch(self)
+            return self._fragment_cache
+
+        fragments = {}
+        for edge in self.bonds:
+            if edge in fragments:
+                continue
+            try:
+                frags = self.mol_graph.split_molecule_subgraphs(
+                    [edge], allow_reverse=True, alterations=None
+                )
+            except MolGraphSplitError:
+                # cannot split (ring-opening editing)
+                frag = copy.deepcopy(self.mol_graph)
+                idx1, idx2 = edge
+                frag.break_edge(idx1, idx2, allow_reverse=True)
+                frags = [frag]
+
+            fragments[edge] = BondFragments(
+                graphs=frags,
+                formulas=[f.molecule.composition.alphabetical_formula for f in frags],
+                num_bonds=[len(f.graph.edges()) for f in frags],
+                hashes=[weisfeiler_lehman_hash(f.graph) for f in frags],
+            )
+
+        self._fragment_cache = fragments
+        size = sum(len(f.graphs) for f in fragments.values())
+        _fragment_caches.add(self, size, self.fragment_cache_size)
+        return fragments
+
     def get_fragments(self) -> Optional[Dict[Tuple[Any, Any], List[MoleculeGraph]]]:
         """
         Get the fragments of the molecule by breaking all its bonds.
 
+        The fragments come from the cache of `get_bond_fragments()` and must not be
+        modified.
+
         Returns:
             Fragments dict {(atom1, atom2): [fragments]}, where
                 the key `(atom1, atom2)` specifies the broken bond indexed by the two
@@ -281,23 +398,11 @@ class MoleculeEntry(MSONable):
                 The dictionary is empty if the molecule has no bonds (e.g. Li+).
         """
 
-        fragments = {}
         if self.mol_graph:
-            for edge in self.bonds:
-                try:
-                    frags = self.mol_graph.split_molecule_subgraphs(
-                        [edge], allow_reverse=True, alterations=None
-                    )
-                    fragments[edge] = frags
-
-                except MolGraphSplitError:
-                    # cannot split (ring-opening editing)
-                    frag = copy.deepcopy(self.mol_graph)
-                    idx1, idx2 = edge
-                    frag.break_edge(idx1, idx2, allow_reverse=True)
-                    fragments[edge] = [frag]
-
-            return fragments
+            return {
+                bond: list(frags.graphs)
+                for bond, frags in self.get_bond_fragments().items()
+            }
         else:
             return None
 
@@ -336,7 +441,16 @@ class MoleculeEntry(MSONable):
             [[(0,1), (0,2)], [(0,3), (0,4)], [(3,4)]]
         """
 
-        fragments = self.get_fragments() if fragments is None else fragments
+        # fragments with different hashes cannot be isomorphic, so the cached hashes
+        # rule out most pairs before the isomorphism checks
+        hashes = None  # type: Optional[Dict[Tuple[int, int], List[str]]]
+        if fragments is None:
+            fragments = self.get_fragments()
+            if fragments:
+                hashes = {
+                    bond: sorted(frags.hashes)
+                    for bond, frags in self.get_bond_fragments().items()
+                }
 
         if fragments:
 
@@ -349,6 +463,10 @@ class MoleculeEntry(MSONable):
                     # isomorphic to each other
                     existing_bond = group[0]
                     exsiting_frags = fragments[existing_bond]
+                    if hashes is not None and (
+                        hashes[current_bond] != hashes[existing_bond]
+                    ):
+                        continue
 
                     # one fragments (ring-opening like fragments)
                     if len(current_frags) == len(exsiting_frags) == 1:
@@ -376,6 +494,12 @@ class MoleculeEntry(MSONable):
         else:
             return None
 
+    def __getstate__(self):
+        # the fragment cache is cheap to rebuild and tied to this object
+        state = self.__dict__.copy()
+        state.pop("_fragment_cache", None)
+        return state
+
     def __repr__(self):
 
         output = [
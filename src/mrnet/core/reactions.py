@@ -1,10 +1,9 @@
-import copy
 import itertools
 import math
 from abc import ABCMeta, abstractmethod
 from collections import Counter
 from collections.abc import Iterable
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Collection, Dict, List, Optional, Tuple, Union
 import networkx as nx
 import networkx.algorithms.isomorphism as iso
 import numpy as np
@@ -20,6 +19,7 @@ from mrnet.core.rates import (
     RedoxRateCalculator,
 )
 from mrnet.utils.constants import KB, PLANCK, ROOM_TEMP
+from mrnet.utils.graphs import weisfeiler_lehman_hash
 from mrnet.utils.mols import mol_free_energy
 from mrnet.utils.reaction import (
     ReactionMappingError,
@@ -157,7 +157,7 @@ class Reaction(MSONable, metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         pass
 
     @abstractmethod
@@ -346,16 +346,20 @@ class RedoxReaction(Reaction):
             self.set_free_energy()
             self.set_rate_constant()
 
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         """
         A method to convert a RedoxReaction class object into graph representation
         (nx.Digraph object). Redox Reaction must be of type 1 reactant -> 1 product
 
+        Args:
+            edge_costs: if False, leave the costs of the reactant edges to
+                set_edge_costs
+
         Returns:
             nx.Digraph object of a single Redox Reaction
         """
         assert len(self.reactant_ids) == len(self.product_ids) == 1
-        return general_graph_rep(self)
+        return general_graph_rep(self, edge_costs)
 
     def update_calculator(
         self,
@@ -400,6 +404,7 @@ class RedoxReaction(Reaction):
         cls,
         entries: MappingDict,
         determine_atom_mappings: bool = False,
+        formulas: Optional[Collection[str]] = None,
     ) -> List[Reaction]:
         """
         A method to generate all the possible redox reactions from given entries
@@ -407,12 +412,20 @@ class RedoxReaction(Reaction):
         Args:
             entries: ReactionNetwork(input_entries).entries,
                entries = {[formula]:{[num_bonds]:{[charge]:MoleculeEntry}}}
+            determine_atom_mappings: whether to determine the atom mappings
+            formulas: only generate the reactions whose reactant has one of
+               these formulas, None for all. Reactions are grouped by reactant
+               formula, in the order of `entries`, so generating disjoint
+               chunks of formulas and concatenating the results in order
+               reproduces a single call.
 
         Returns:
             list of RedoxReaction class objects
         """
         reactions = list()  # type: List[Reaction]
         for formula in entries:
+            if formulas is not None and formula not in formulas:
+                continue
             for Nbonds in entries[formula]:
                 charges = sorted(entries[formula][Nbonds].keys())
                 if len(charges) > 1:
@@ -688,26 +701,34 @@ class IntramolSingleBondChangeReaction(Reaction):
         self.set_free_energy()
         self.set_rate_constant()
 
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         """
         A method to convert a IntramolSingleBondChangeReaction class object into
         graph representation (nx.Digraph object).
         IntramolSingleBondChangeReaction must be of type 1 reactant -> 1 product
 
+        Args:
+            edge_costs: if False, leave the costs of the reactant edges to
+                set_edge_costs
+
         Returns:
             nx.Digraph object of a single IntramolSingleBondChangeReaction object
         """
         assert len(self.reactant_ids) == len(self.product_ids) == 1
-        return general_graph_rep(self)
+        return general_graph_rep(self, edge_costs)
 
     @classmethod
     def generate(
         cls,
         entries: MappingDict,
         determine_atom_mappings: bool = False,
+        formulas: Optional[Collection[str]] = None,
     ) -> List[Reaction]:
         reactions = list()  # type: List[Reaction]
+        hash_index = GraphHashIndex(entries)
         for formula in entries:
+            if formulas is not None and formula not in formulas:
+                continue
             Nbonds_list = sorted(entries[formula].keys())
             if len(Nbonds_list) <= 1:
                 continue
@@ -731,6 +752,7 @@ class IntramolSingleBondChangeReaction(Reaction):
                             charge,
                             determine_atom_mappings,
                             cls,
+                            hash_index=hash_index,
                         )
                         reactions.extend(rxns)
 
@@ -738,18 +760,29 @@ class IntramolSingleBondChangeReaction(Reaction):
 
     @staticmethod
     def _generate_one(
-        entry1, entries, formula, Nbonds0, charge, determine_atom_mappings, cls
+        entry1,
+        entries,
+        formula,
+        Nbonds0,
+        charge,
+        determine_atom_mappings,
+        cls,
+        hash_index=None,
     ) -> List[Reaction]:
         """
         Helper function to generate reactions for one molecule entry.
         """
+        if hash_index is None:
+            hash_index = GraphHashIndex(entries)
         reactions = []
         entry0_set = set()
-        for bond in entry1.bonds:
-            mg = copy.deepcopy(entry1.mol_graph)
-            mg.break_edge(bond[0], bond[1], allow_reverse=True)
-            if nx.is_weakly_connected(mg.graph):
-                for entry0 in entries[formula][Nbonds0][charge]:
+        for frags in entry1.get_bond_fragments().values():
+            # ring-opening bonds leave a single fragment
+            if len(frags.graphs) == 1:
+                mg = frags.graphs[0]
+                for entry0 in hash_index.candidates(
+                    formula, Nbonds0, charge, frags.hashes[0]
+                ):
                     isomorphic, node_mapping = is_isomorphic(entry0.graph, mg.graph)
                     if (
                         isomorphic
@@ -1003,28 +1036,36 @@ class IntermolecularReaction(Reaction):
         self.set_free_energy()
         self.set_rate_constant()
 
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         """
         A method to convert a IntermolecularReaction class object into graph
         representation (nx.Digraph object).
         IntermolecularReaction must be of type 1 reactant -> 2 products
 
+        Args:
+            edge_costs: if False, leave the costs of the reactant edges to
+                set_edge_costs
+
         Returns:
             nx.Digraph object of a single IntermolecularReaction object
         """
         assert len(self.reactant_ids) == 1
         assert len(self.product_ids) == 2
-        return general_graph_rep(self)
+        return general_graph_rep(self, edge_costs)
 
     @classmethod
     def generate(
         cls,
         entries: MappingDict,
         determine_atom_mappings: bool = False,
+        formulas: Optional[Collection[str]] = None,
     ) -> List[Reaction]:
         reactions = list()  # type: List[Reaction]
+        hash_index = GraphHashIndex(entries)
 
         for formula in entries:
+            if formulas is not None and formula not in formulas:
+                continue
             for Nbonds in entries[formula]:
                 if Nbonds <= 0:
                     continue
@@ -1032,7 +1073,12 @@ class IntermolecularReaction(Reaction):
                 for charge in entries[formula][Nbonds]:
                     for entry in entries[formula][Nbonds][charge]:
                         rxns = cls._generate_one(
-                            entry, entries, charge, determine_atom_mappings, cls
+                            entry,
+                            entries,
+                            charge,
+                            determine_atom_mappings,
+                            cls,
+                            hash_index=hash_index,
                         )
                         reactions.extend(rxns)
 
@@ -1040,24 +1086,22 @@ class IntermolecularReaction(Reaction):
 
     @staticmethod
     def _generate_one(
-        entry, entries, charge, determine_atom_mappings, cls
+        entry, entries, charge, determine_atom_mappings, cls, hash_index=None
     ) -> List[Reaction]:
         """
         Helper function to generate reactions for one molecule entry.
         """
+        if hash_index is None:
+            hash_index = GraphHashIndex(entries)
         reactions = []
         product_set = set()
 
-        for edge in entry.bonds:
-            bond = [(edge[0], edge[1])]
-            try:
-                frags = entry.mol_graph.split_molecule_subgraphs(
-                    bond, allow_reverse=True
-                )
-                formula0 = frags[0].molecule.composition.alphabetical_formula
-                Nbonds0 = len(frags[0].graph.edges())
-                formula1 = frags[1].molecule.composition.alphabetical_formula
-                Nbonds1 = len(frags[1].graph.edges())
+        for bond_frags in entry.get_bond_fragments().values():
+            # ring-opening bonds cannot split the molecule
+            if len(bond_frags.graphs) == 2:
+                frags = bond_frags.graphs
+                formula0, formula1 = bond_frags.formulas
+                Nbonds0, Nbonds1 = bond_frags.num_bonds
 
                 if (
                     formula0 not in entries
@@ -1067,16 +1111,22 @@ class IntermolecularReaction(Reaction):
                 ):
                     continue
 
+                hash0, hash1 = bond_frags.hashes
+
                 for charge0 in entries[formula0][Nbonds0]:
                     charge1 = charge - charge0
                     if charge1 not in entries[formula1][Nbonds1]:
                         continue
 
-                    for entry0 in entries[formula0][Nbonds0][charge0]:
+                    for entry0 in hash_index.candidates(
+                        formula0, Nbonds0, charge0, hash0
+                    ):
                         isomorphic0, _ = is_isomorphic(frags[0].graph, entry0.graph)
                         if isomorphic0:
 
-                            for entry1 in entries[formula1][Nbonds1][charge1]:
+                            for entry1 in hash_index.candidates(
+                                formula1, Nbonds1, charge1, hash1
+                            ):
                                 isomorphic1, _ = is_isomorphic(
                                     frags[1].graph, entry1.graph
                                 )
@@ -1122,8 +1172,6 @@ class IntermolecularReaction(Reaction):
 
                                     break
                             break
-            except MolGraphSplitError:
-                pass
 
         return reactions
 
@@ -1360,25 +1408,30 @@ class CoordinationBondChangeReaction(Reaction):
         self.set_free_energy()
         self.set_rate_constant()
 
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         """
         A method to convert a CoordinationBondChangeReaction class object into graph
         representation (nx.Digraph object).
 
         CoordinationBondChangeReaction must be of type 1 reactant -> 2 products
 
+        Args:
+            edge_costs: if False, leave the costs of the reactant edges to
+                set_edge_costs
+
         Returns:
              nx.Digraph object of a single CoordinationBondChangeReaction object
         """
         assert len(self.reactant_ids) == 1
         assert len(self.product_ids) == 2
-        return general_graph_rep(self)
+        return general_graph_rep(self, edge_costs)
 
     @classmethod
     def generate(
         cls,
         entries: MappingDict,
         determine_atom_mappings: bool = False,
+        formulas: Optional[Collection[str]] = None,
     ) -> List[Reaction]:
 
         # find metal entries
@@ -1396,7 +1449,10 @@ class CoordinationBondChangeReaction(Reaction):
         if not M_entries:
             return reactions
 
+        hash_index = GraphHashIndex(entries)
         for formula in entries:
+            if formulas is not None and formula not in formulas:
+                continue
             if "Li" in formula or "Mg" in formula or "Ca" in formula or "Zn" in formula:
 
                 for Nbonds in entries[formula]:
@@ -1406,7 +1462,12 @@ class CoordinationBondChangeReaction(Reaction):
                     for charge in entries[formula][Nbonds]:
                         for entry in entries[formula][Nbonds][charge]:
                             rxns = cls._generate_one(
-                                entry, entries, M_entries, determine_atom_mappings, cls
+                                entry,
+                                entries,
+                                M_entries,
+                                determine_atom_mappings,
+                                cls,
+                                hash_index=hash_index,
                             )
                             reactions.extend(rxns)
 
@@ -1414,28 +1475,26 @@ class CoordinationBondChangeReaction(Reaction):
 
     @staticmethod
     def _generate_one(
-        entry, entries, M_entries, determine_atom_mappings, cls
+        entry, entries, M_entries, determine_atom_mappings, cls, hash_index=None
     ) -> List[Reaction]:
         """
         Helper function to generate reactions for one molecule entry.
         """
+        if hash_index is None:
+            hash_index = GraphHashIndex(entries)
         reactions = []
         product_set = set()
 
         nosplit_M_bonds = list()
 
+        fragments = entry.get_bond_fragments()
         for bond in entry.bonds:
             if (
                 str(entry.molecule.sites[bond[0]].species) in M_entries
                 or str(entry.molecule.sites[bond[1]].species) in M_entries
             ):
-                M_bond = (bond[0], bond[1])
-                try:
-                    entry.mol_graph.split_molecule_subgraphs(
-                        [M_bond], allow_reverse=True
-                    )
-                except MolGraphSplitError:
-                    nosplit_M_bonds.append(M_bond)
+                if len(fragments[bond].graphs) == 1:
+                    nosplit_M_bonds.append((bond[0], bond[1]))
 
         bond_pairs = itertools.combinations(nosplit_M_bonds, 2)
 
@@ -1473,14 +1532,15 @@ class CoordinationBondChangeReaction(Reaction):
                     ):
                         continue
 
+                    nonM_hash = weisfeiler_lehman_hash(frag.graph)
                     for nonM_charge in entries[nonM_formula][nonM_Nbonds]:
                         M_charge = entry.charge - nonM_charge
                         if M_charge not in M_entries[M_formula]:
                             continue
 
-                        for nonM_entry in entries[nonM_formula][nonM_Nbonds][
-                            nonM_charge
-                        ]:
+                        for nonM_entry in hash_index.candidates(
+                            nonM_formula, nonM_Nbonds, nonM_charge, nonM_hash
+                        ):
                             isomorphic, _ = is_isomorphic(frag.graph, nonM_entry.graph)
                             if (
                                 isomorphic
@@ -1768,20 +1828,22 @@ class ConcertedReaction(Reaction):
         self.set_rate_constant()
 
     def graph_representation(
-        self,
+        self, edge_costs: bool = True
     ) -> nx.DiGraph:  # temp here, use graph_rep_1_2 instead
 
         """
         A method to convert a Concerted class object into graph
             representation (nx.Digraph object).
         IntermolecularReaction must be of type 1 reactant -> 2 products
+        :param edge_costs: if False, leave the costs of the reactant edges
+            to set_edge_costs
         :return nx.Digraph object of a single IntermolecularReaction object
         """
         assert len(self.reactant_ids) <= 3
         assert len(self.product_ids) <= 3
         if len(self.reactants) == 2 and len(self.products) == 1:
             self.swap_elements()
-        g = general_graph_rep(self)
+        g = general_graph_rep(self, edge_costs)
         for node in list(g.nodes):
             if not isinstance(node, int) and g.nodes[node]["free_energy"] > 0:
                 g.remove_node(node)
@@ -2148,18 +2210,20 @@ class MetalHopReaction(Reaction):
         self.set_free_energy()
         self.set_rate_constant()
 
-    def graph_representation(self) -> nx.DiGraph:
+    def graph_representation(self, edge_costs: bool = True) -> nx.DiGraph:
         """
         A method to convert a CoordinationBondChangeReaction class object
             into graph representation (nx.Digraph object).
         CoordinationBondChangeReaction must be of type 1 reactant -> 2 products
 
+        :param edge_costs: if False, leave the costs of the reactant edges
+            to set_edge_costs
         :return nx.Digraph object of a single CoordinationBondChangeReaction object
         """
 
         assert len(self.reactant_ids) == 2
         assert len(self.product_ids) == 2
-        return general_graph_rep(self)
+        return general_graph_rep(self, edge_costs)
 
     @classmethod
     def generate(
@@ -2410,13 +2474,16 @@ class MetalHopReaction(Reaction):
         return reaction
 
 
-def general_graph_rep(reaction: Reaction) -> nx.DiGraph:
+def general_graph_rep(reaction: Reaction, edge_costs: bool = True) -> nx.DiGraph:
     """
     A method to convert a reaction type object into a general graph representation.
     Can handle reactions with arbitrary numbers of reactants and products
     Args:
        :param reaction:(any of the reaction class object, ex. RedoxReaction,
        IntramolSingleBondChangeReaction)
+       :param edge_costs: if False, the edges from the reactants to the reaction
+       nodes are created without cost attributes, to be filled for a whole graph
+       at once by set_edge_costs
     """
     assert len(reaction.reactant_ids) <= 3
     assert len(reaction.product_ids) <= 3
@@ -2488,6 +2555,22 @@ def general_graph_rep(reaction: Reaction) -> nx.DiGraph:
             if count > 1
         ]
     )
+    costs_A = dict()  # type: Dict[str, float]
+    costs_B = dict()  # type: Dict[str, float]
+    if edge_costs:
+        costs_A = dict(
+            softplus=softplus(free_energy_A),
+            exponent=exponent(free_energy_A),
+            rexp=rexp(free_energy_A),
+            default_cost=default_cost(free_energy_A),
+        )
+        costs_B = dict(
+            softplus=softplus(free_energy_B),
+            exponent=exponent(free_energy_B),
+            rexp=rexp(free_energy_B),
+            default_cost=default_cost(free_energy_B),
+        )
+
     # Create edges w/ reactant molecule nodes
     for reactant in reaction.reactant_indices:
         # Edge from reactant molecule to fwd reaction node
@@ -2495,10 +2578,7 @@ def general_graph_rep(reaction: Reaction) -> nx.DiGraph:
             graph.add_edge(
                 int(reactant),
                 fwd_node_name,
-                softplus=softplus(free_energy_A),
-                exponent=exponent(free_energy_A),
-                rexp=rexp(free_energy_A),
-                default_cost=default_cost(free_energy_A),
+                **costs_A,
                 weight=1.0,
                 PRs=[
                     int(r)
@@ -2528,10 +2608,7 @@ def general_graph_rep(reaction: Reaction) -> nx.DiGraph:
             graph.add_edge(
                 int(product),
                 rev_node_name,
-                softplus=softplus(free_energy_B),
-                exponent=exponent(free_energy_B),
-                rexp=rexp(free_energy_B),
-                default_cost=default_cost(free_energy_B),
+                **costs_B,
                 weight=1.0,
                 PRs=[
                     int(p)
@@ -2572,10 +2649,10 @@ def rexp(free_energy: float) -> float:
     Method to determine edge weight using exponent(dG/kt) cost function
     """
     if free_energy <= 0:
-        d = np.array([[free_energy]], dtype=np.float128)
+        d = np.array([[free_energy]], dtype=np.longdouble)
         r = np.exp(d)
     else:
-        d = np.array([[free_energy]], dtype=np.float128)
+        d = np.array([[free_energy]], dtype=np.longdouble)
         r = np.exp(38.94 * d)
 
     return r[0][0]
@@ -2588,6 +2665,77 @@ def default_cost(free_energy: float) -> float:
     return math.exp(min(10.0, free_energy) / (ROOM_TEMP * KB)) + 1
 
 
+def softplus_array(free_energies: np.ndarray) -> np.ndarray:
+    """
+    Vectorized softplus over an array of free energies
+    """
+    return np.log(1 + (273.0 / 500.0) * np.exp(free_energies))
+
+
+def exponent_array(free_energies: np.ndarray) -> np.ndarray:
+    """
+    Vectorized exponent over an array of free energies
+    """
+    return np.exp(free_energies)
+
+
+def rexp_array(free_energies: np.ndarray) -> np.ndarray:
+    """
+    Vectorized rexp over an array of free energies, in np.longdouble like rexp
+    """
+    d = np.asarray(free_energies, dtype=np.longdouble)
+    return np.exp(np.where(d <= 0, d, 38.94 * d))
+
+
+def default_cost_array(free_energies: np.ndarray) -> np.ndarray:
+    """
+    Vectorized default_cost over an array of free energies
+    """
+    return np.exp(np.minimum(10.0, free_energies) / (ROOM_TEMP * KB)) + 1
+
+
+def edge_costs(free_energies: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Evaluate every cost function over an array of free energies.
+
+    Args:
+        free_energies: free energies of the reactions the edges lead to
+
+    Returns:
+        {cost function name: array of edge weights}
+    """
+    free_energies = np.asarray(free_energies, dtype=float)
+    return {
+        "softplus": softplus_array(free_energies),
+        "exponent": exponent_array(free_energies),
+        "rexp": rexp_array(free_energies),
+        "default_cost": default_cost_array(free_energies),
+    }
+
+
+def set_edge_costs(graph: nx.DiGraph):
+    """
+    Fill the cost attributes of all the edges from molecule nodes to reaction nodes
+    of a reaction network graph in one vectorized pass, from the free energies of
+    the reaction nodes. The graph is typically built from graph representations
+    made with edge_costs=False.
+
+    Args:
+        graph: bipartite reaction network graph, modified in place
+    """
+    edges = [(u, v) for u, v in graph.edges() if isinstance(v, str)]
+    costs = edge_costs(np.array([graph.nodes[v]["free_energy"] for _, v in edges]))
+    # plain floats like the scalar cost functions, except for the np.longdouble rexp
+    columns = {
+        name: list(values) if name == "rexp" else values.tolist()
+        for name, values in costs.items()
+    }
+    for ii, (u, v) in enumerate(edges):
+        data = graph[u][v]
+        for name, values in columns.items():
+            data[name] = values[ii]
+
+
 def is_isomorphic(
     g1: nx.MultiDiGraph, g2: nx.MultiDiGraph
 ) -> Tuple[bool, Union[None, Dict[int, int]]]:
@@ -2614,6 +2762,49 @@ def is_isomorphic(
         return False, None
 
 
+class GraphHashIndex:
+    """
+    Index of the entries of a MappingDict by the Weisfeiler-Lehman hash of their
+    molecule graph, built lazily for each (formula, num_bonds, charge) bucket.
+
+    Only entries with the same hash can be isomorphic, so the candidates returned
+    for a fragment are the entries of the bucket that need a full isomorphism
+    check, in the same order as in the bucket. With deduplicated entries this is
+    at most one entry.
+
+    Args:
+        entries: entries = {[formula]:{[num_bonds]:{[charge]:MoleculeEntry}}}
+    """
+
+    def __init__(self, entries: MappingDict):
+        self.entries = entries
+        # {(formula, num_bonds, charge): {graph hash: [entries]}}
+        self._buckets = dict()  # type: Dict[Tuple, Dict[str, List[MoleculeEntry]]]
+
+    def candidates(
+        self, formula: str, num_bonds: int, charge: int, graph_hash: str
+    ) -> List[MoleculeEntry]:
+        """
+        Get the entries of a bucket whose graph hash is graph_hash.
+
+        Args:
+            formula: alphabetical formula of the bucket
+            num_bonds: number of bonds of the bucket
+            charge: charge of the bucket
+            graph_hash: weisfeiler_lehman_hash of the graph to match
+
+        Returns:
+            list of MoleculeEntry
+        """
+        key = (formula, num_bonds, charge)
+        if key not in self._buckets:
+            bucket = dict()  # type: Dict[str, List[MoleculeEntry]]
+            for entry in self.entries[formula][num_bonds][charge]:
+                bucket.setdefault(weisfeiler_lehman_hash(entry.graph), []).append(entry)
+            self._buckets[key] = bucket
+        return self._buckets[key].get(graph_hash, [])
+
+
 # TODO `bucket_mol_entries` and `unbucket_mol_entries` can be moved to mol_entry.py
 def bucket_mol_entries(entries: List[MoleculeEntry], keys: Optional[List[str]] = None):
     """
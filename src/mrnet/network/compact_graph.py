@@ -0,0 +1,763 @@
+import heapq
+import itertools
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+__author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith, Daniel Barter"
+__version__ = "0.1"
+__maintainer__ = "Sam Blau"
+__status__ = "Alpha"
+
+
+COST_FUNCTIONS = ("softplus", "exponent", "rexp", "default_cost")
+
+Node_Label = Union[int, str]
+
+
+def multi_source_labels(
+    sources: Sequence[Hashable],
+    neighbors: Callable[[Any], Iterable[Tuple[Any, float]]],
+    k: Optional[int] = None,
+) -> Tuple[List[Dict[Any, float]], List[Dict[Any, Any]]]:
+    """
+    A label setting search from several sources in a single pass: one heap
+    holds a label for every (source, node) pair, so every node is expanded once
+    per source it is reached from, in order of increasing cost over all the
+    sources.
+
+    With k=None the exact cost from each source to each node it reaches is
+    returned. With an integer k a node only takes the labels of the first k
+    sources to reach it, and only those are expanded further, so that the
+    search does about k / len(sources) of the work. The kept labels are still
+    the exact costs of the k cheapest sources: a source pruned at a node on its
+    shortest path to another node is beaten there by the k sources kept at the
+    first one. It follows that a node with fewer than k labels has a label for
+    every source reaching it, and that a source without a label at a node with
+    k labels reaches it, if at all, at a cost at least as high as the kept ones.
+    :param sources: source nodes
+    :param neighbors: function returning the (node, edge weight) pairs of the
+        out edges of a node
+    :param k: number of cheapest sources to keep per node, None for all
+    :return: dist: list with a dict {node: cost} per source
+    :return: predecessors: list with a dict {node: predecessor on the path
+        from the source} per source, None for the source itself
+    """
+    if k is None:
+        k = len(sources)
+    dist = [{} for _ in sources]  # type: List[Dict[Any, float]]
+    predecessors = [{} for _ in sources]  # type: List[Dict[Any, Any]]
+    tentative = [{} for _ in sources]  # type: List[Dict[Any, float]]
+    num_labels = {}  # type: Dict[Any, int]
+    # ties are broken by source, then in the order the labels were pushed
+    counter = itertools.count()
+    heap = [
+        (0.0, row, next(counter), source, None) for row, source in enumerate(sources)
+    ]
+    heapq.heapify(heap)
+    while heap:
+        cost, row, _, node, parent = heapq.heappop(heap)
+        settled = dist[row]
+        if node in settled or num_labels.get(node, 0) >= k:
+            continue
+        settled[node] = cost
+        predecessors[row][node] = parent
+        num_labels[node] = num_labels.get(node, 0) + 1
+        seen = tentative[row]
+        for nbr, edge_weight in neighbors(node):
+            if nbr in settled or num_labels.get(nbr, 0) >= k:
+                continue
+            new_cost = cost + edge_weight
+            if nbr not in seen or new_cost < seen[nbr]:
+                seen[nbr] = new_cost
+                heapq.heappush(heap, (new_cost, row, next(counter), nbr, node))
+    return dist, predecessors
+
+
+def multi_source_reach(
+    sources: Sequence[Hashable],
+    successors: Callable[[Any], Iterable[Any]],
+) -> Dict[Any, int]:
+    """
+    A search from several sources in a single pass for the sources reaching
+    each node, whatever the cost. A node is visited again only when a source is
+    added to its set, which multi_source_labels can not tell once it pruned the
+    label of that source with a top k.
+    :param sources: source nodes
+    :param successors: function returning the nodes at the end of the out
+        edges of a node
+    :return: dict {node: bit mask with the bit ii set if sources[ii] reaches
+        the node}
+    """
+    reach = {}  # type: Dict[Any, int]
+    for row, source in enumerate(sources):
+        reach[source] = reach.get(source, 0) | 1 << row
+    stack = list(reach)
+    while stack:
+        node = stack.pop()
+        mask = reach[node]
+        for nbr in successors(node):
+            old_mask = reach.get(nbr, 0)
+            if old_mask | mask != old_mask:
+                reach[nbr] = old_mask | mask
+                stack.append(nbr)
+    return reach
+
+
+def nx_reachable_sources(
+    graph: nx.DiGraph, sources: Sequence[Node_Label]
+) -> Dict[Node_Label, int]:
+    """
+    A method to get the sources reaching the molecule nodes of a
+    ReactionNetwork.graph, with a single multi_source_reach search.
+    :param graph: ReactionNetwork.graph of type nx.DiGraph
+    :param sources: source node labels
+    :return: dict {node: bit mask of the sources reaching it}
+    """
+    reach = multi_source_reach(sources, graph.successors)
+    return {
+        node: mask
+        for node, mask in reach.items()
+        if graph.nodes[node]["bipartite"] == 0
+    }
+
+
+def nx_multi_source_paths(
+    graph: nx.DiGraph,
+    sources: Sequence[Node_Label],
+    weight: str,
+    k: Optional[int] = None,
+) -> Dict[
+    Node_Label, Tuple[Dict[Node_Label, float], Dict[Node_Label, List[Node_Label]]]
+]:
+    """
+    A method to get the costs and paths from several sources to the molecule
+    nodes of a ReactionNetwork.graph, with a single multi_source_labels search.
+    :param graph: ReactionNetwork.graph of type nx.DiGraph
+    :param sources: source node labels
+    :param weight: cost function, ex "default_cost"
+    :param k: number of cheapest sources to keep per node, None for all
+    :return: dict {source: (costs, paths)} with costs and paths as returned by
+        CompactGraph.single_source_paths
+    """
+    succ = graph.succ
+    dist, predecessors = multi_source_labels(
+        sources,
+        lambda node: ((nbr, data[weight]) for nbr, data in succ[node].items()),
+        k,
+    )
+    results = {}
+    for ii, source in enumerate(sources):
+        costs = {}
+        paths = {}
+        for node, cost in dist[ii].items():
+            if graph.nodes[node]["bipartite"] == 0:
+                costs[node] = cost
+                path = [node]
+                while predecessors[ii][path[-1]] is not None:
+                    path.append(predecessors[ii][path[-1]])
+                path.reverse()
+                paths[node] = path
+        results[source] = (costs, paths)
+    return results
+
+
+class CompactGraph:
+    """
+    Integer indexed, array backed copy of a ReactionNetwork.graph used for path
+    solving on large networks.
+
+    Molecule nodes are numbered first (in ascending order of their label) followed
+    by the reaction nodes (in the order they were added to the nx.DiGraph), so that
+    every node has a contiguous integer id. The edges are stored in CSR form
+    (indptr, indices) with one float array per cost function, and the reactants and
+    products of each reaction node are kept in a side table so that paths can be
+    characterized without parsing reaction node strings.
+
+    :param graph: ReactionNetwork.graph of type nx.DiGraph
+    :param weights: cost functions (edge attributes) to copy from the graph
+    """
+
+    def __init__(self, graph: nx.DiGraph, weights: Iterable[str] = COST_FUNCTIONS):
+        species = sorted(n for n in graph.nodes if graph.nodes[n]["bipartite"] == 0)
+        reactions = [n for n in graph.nodes if graph.nodes[n]["bipartite"] == 1]
+
+        self.num_species = len(species)
+        self.num_nodes = len(species) + len(reactions)
+        self.labels = species + reactions  # type: List[Node_Label]
+        self.index = {
+            label: ii for ii, label in enumerate(self.labels)
+        }  # type: Dict[Node_Label, int]
+
+        weights = list(weights)
+        num_edges = graph.number_of_edges()
+        sources = np.empty(num_edges, dtype=np.int64)
+        targets = np.empty(num_edges, dtype=np.int64)
+        values = {w: np.empty(num_edges, dtype=np.float64) for w in weights}
+        for ii, (u, v, data) in enumerate(graph.edges(data=True)):
+            sources[ii] = self.index[u]
+            targets[ii] = self.index[v]
+            for w in weights:
+                values[w][ii] = data[w]
+
+        # sort edges by (source, target) so that each CSR row can be binary searched
+        order = np.lexsort((targets, sources))
+        self.sources = sources[order]
+        self.indices = targets[order]
+        self.indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.sources, minlength=self.num_nodes), out=self.indptr[1:]
+        )
+        self.weights = {w: values[w][order] for w in weights}
+
+        # side table with the (stoichiometric) reactants and products of each
+        # reaction node, padded with -1
+        self.reactants, self.products = self._reaction_side_table(
+            reactions, graph.graph.get("reaction_nodes")
+        )
+
+        self._csr_cache = {}  # type: Dict[str, csr_matrix]
+        # python list copies of the CSR arrays for the searches run in python,
+        # kept in sync by set_edge_weights
+        self._adjacency_cache = None  # type: Optional[Tuple[List[int], List[int]]]
+        self._weight_list_cache = {}  # type: Dict[str, List[float]]
+        # positions of edges whose weights changed, per cost function, since the
+        # last call to pop_changed_edges
+        self._changed_edges = {w: set() for w in weights}  # type: Dict[str, set]
+        self._in_edge_cache = None  # type: Optional[Tuple[np.ndarray, np.ndarray]]
+
+    def _reaction_side_table(
+        self, reactions: List[Node_Label], table: Optional[Any] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        A method to parse every reaction node string once into padded integer arrays
+        of species node ids. If the graph carries a ReactionNodeTable, its arrays
+        are used instead.
+        :param reactions: reaction node labels, ex ["1+2,3", "3,1+2"]
+        :param table: ReactionNodeTable of the graph, or None
+        :return: reactants: array of shape (number of reactions, max reactants)
+        :return: products: array of shape (number of reactions, max products)
+        """
+        if table is not None:
+            # species labels -> node ids, with -1 (padding) mapped to -1
+            species = np.array(self.labels[: self.num_species], dtype=np.int64)
+            lookup = np.full(max(species.max(initial=-1), 0) + 2, -1, dtype=np.int64)
+            lookup[species] = np.arange(self.num_species)
+            rows = np.array([table.node_id(n) for n in reactions], dtype=np.int64)
+            return (
+                lookup[table.reactants[rows]],
+                lookup[table.products[rows]],
+            )
+
+        parsed = []
+        for node in reactions:
+            rcts, prods = str(node).split(",")
+            parsed.append(
+                (
+                    [self.index[int(r)] for r in rcts.split("+")],
+                    [self.index[int(p)] for p in prods.split("+")],
+                )
+            )
+        width_r = max([len(r) for r, _ in parsed], default=1)
+        width_p = max([len(p) for _, p in parsed], default=1)
+        reactants = np.full((len(parsed), width_r), -1, dtype=np.int64)
+        products = np.full((len(parsed), width_p), -1, dtype=np.int64)
+        for ii, (rct_ids, prod_ids) in enumerate(parsed):
+            reactants[ii, : len(rct_ids)] = rct_ids
+            products[ii, : len(prod_ids)] = prod_ids
+        return reactants, products
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def node_id(self, label: Node_Label) -> int:
+        return self.index[label]
+
+    def label(self, node_id: int) -> Node_Label:
+        return self.labels[node_id]
+
+    def is_reaction(self, label: Node_Label) -> bool:
+        return self.index[label] >= self.num_species
+
+    def reaction_species(self, label: Node_Label) -> Tuple[List[int], List[int]]:
+        """
+        A method to look up the reactants and products of a reaction node in the
+        side table.
+        :param label: reaction node label, ex "1+2,3"
+        :return: reactants: list of species node labels, ex [1, 2]
+        :return: products: list of species node labels, ex [3]
+        """
+        row = self.index[label] - self.num_species
+        rcts = [self.labels[r] for r in self.reactants[row] if r >= 0]
+        prods = [self.labels[p] for p in self.products[row] if p >= 0]
+        return rcts, prods  # type: ignore
+
+    def edge_index(self, u: Node_Label, v: Node_Label) -> int:
+        """
+        A method to find the position of the edge (u, v) in the edge arrays.
+        :param u: source node label
+        :param v: target node label
+        :return: index into CompactGraph.indices and CompactGraph.weights
+        """
+        u_id = self.index[u]
+        v_id = self.index[v]
+        start = self.indptr[u_id]
+        end = self.indptr[u_id + 1]
+        pos = start + np.searchsorted(self.indices[start:end], v_id)
+        if pos == end or self.indices[pos] != v_id:
+            raise KeyError((u, v))
+        return int(pos)
+
+    def edge_weight(self, u: Node_Label, v: Node_Label, weight: str) -> float:
+        return float(self.weights[weight][self.edge_index(u, v)])
+
+    def set_edge_weights(self, attrs: Dict[Tuple[Node_Label, Node_Label], dict]):
+        """
+        A method to update edge weights, mirroring nx.set_edge_attributes.
+        :param attrs: dict of form {(node1, node2): {"softplus": float, ...}, ...}
+        """
+        for edge, values in attrs.items():
+            pos = self.edge_index(edge[0], edge[1])
+            for w, value in values.items():
+                if w in self.weights and self.weights[w][pos] != value:
+                    self.weights[w][pos] = value
+                    self._changed_edges[w].add(pos)
+                    self._csr_cache.pop(w, None)
+                    if w in self._weight_list_cache:
+                        self._weight_list_cache[w][pos] = value
+
+    def pop_changed_edges(self, weight: str) -> np.ndarray:
+        """
+        A method to get (and forget) the edges whose weight changed since the last
+        call, as used by CompactGraph.repair_shortest_paths.
+        :param weight: cost function, ex "default_cost"
+        :return: sorted array of edge positions
+        """
+        changed = np.array(sorted(self._changed_edges[weight]), dtype=np.int64)
+        self._changed_edges[weight] = set()
+        return changed
+
+    def _in_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Incoming edges of every node in CSC form: the positions of the edges into
+        node n are in_edges[in_indptr[n]:in_indptr[n + 1]].
+        """
+        if self._in_edge_cache is None:
+            in_edges = np.argsort(self.indices, kind="stable")
+            in_indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(self.indices, minlength=self.num_nodes),
+                out=in_indptr[1:],
+            )
+            self._in_edge_cache = (in_indptr, in_edges)
+        return self._in_edge_cache
+
+    def _adjacency_lists(
+        self, weight: Optional[str] = None
+    ) -> Tuple[List[int], List[int], Optional[List[float]]]:
+        """
+        indptr, indices and (if a cost function is given) weights as python
+        lists, which are much faster to index one element at a time. They are
+        built once and reused by every call.
+        """
+        if self._adjacency_cache is None:
+            self._adjacency_cache = (self.indptr.tolist(), self.indices.tolist())
+        indptr, indices = self._adjacency_cache
+        if weight is None:
+            return indptr, indices, None
+        if weight not in self._weight_list_cache:
+            self._weight_list_cache[weight] = self.weights[weight].tolist()
+        return indptr, indices, self._weight_list_cache[weight]
+
+    def csr(
+        self,
+        weight: str,
+        node_mask: Optional[np.ndarray] = None,
+        edge_mask: Optional[np.ndarray] = None,
+    ) -> csr_matrix:
+        """
+        A method to build a scipy CSR matrix for a cost function, optionally
+        dropping nodes and edges.
+        :param weight: cost function, ex "default_cost"
+        :param node_mask: boolean array over node ids, False for nodes to drop
+        :param edge_mask: boolean array over edges, False for edges to drop
+        :return: scipy.sparse.csr_matrix of shape (num_nodes, num_nodes)
+        """
+        shape = (self.num_nodes, self.num_nodes)
+        if node_mask is None and edge_mask is None:
+            if weight not in self._csr_cache:
+                self._csr_cache[weight] = csr_matrix(
+                    (self.weights[weight], self.indices, self.indptr), shape=shape
+                )
+            return self._csr_cache[weight]
+
+        keep = np.ones(self.num_edges, dtype=bool)
+        if edge_mask is not None:
+            keep &= edge_mask
+        if node_mask is not None:
+            keep &= node_mask[self.sources] & node_mask[self.indices]
+        indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.sources[keep], minlength=self.num_nodes), out=indptr[1:]
+        )
+        return csr_matrix(
+            (self.weights[weight][keep], self.indices[keep], indptr), shape=shape
+        )
+
+    def node_mask(self, ignore_nodes: Optional[Iterable[Any]]) -> np.ndarray:
+        """
+        A method to turn a list of node labels into a boolean mask over node ids.
+        Labels which are not nodes of the graph are skipped, as networkx does.
+        """
+        mask = np.ones(self.num_nodes, dtype=bool)
+        if ignore_nodes is not None:
+            ids = [self.index[n] for n in ignore_nodes if n in self.index]
+            mask[ids] = False
+        return mask
+
+    def dijkstra(
+        self,
+        source: Node_Label,
+        weight: str,
+        ignore_nodes: Optional[Iterable[Any]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        A method to solve single source shortest paths on the CSR arrays.
+        :param source: source node label
+        :param weight: cost function, ex "default_cost"
+        :param ignore_nodes: node labels the paths may not go through
+        :return: dist: array of path costs indexed by node id, inf if unreachable
+        :return: predecessors: array of predecessor node ids, negative if none
+        """
+        node_mask = None if ignore_nodes is None else self.node_mask(ignore_nodes)
+        return self._dijkstra(self.index[source], weight, node_mask=node_mask)
+
+    def _dijkstra(
+        self,
+        source: int,
+        weight: str,
+        node_mask: Optional[np.ndarray] = None,
+        edge_mask: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        dist, predecessors = dijkstra(
+            self.csr(weight, node_mask, edge_mask),
+            directed=True,
+            indices=source,
+            return_predecessors=True,
+        )
+        return dist, predecessors
+
+    def path(self, predecessors: np.ndarray, target: Node_Label) -> List[Node_Label]:
+        """
+        A method to reconstruct the path to target from a predecessor array.
+        :return: list of node labels from the source to target
+        """
+        return [
+            self.labels[n] for n in self._path_ids(predecessors, self.index[target])
+        ]
+
+    @staticmethod
+    def _path_ids(predecessors: np.ndarray, target: int) -> List[int]:
+        path = [target]
+        while predecessors[path[-1]] >= 0:
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+        return path
+
+    def path_cost(self, path: List[Node_Label], weight: str) -> float:
+        return sum(self.edge_weight(u, v, weight) for u, v in zip(path[:-1], path[1:]))
+
+    def single_source_paths(
+        self, source: Node_Label, weight: str
+    ) -> Tuple[Dict[Node_Label, float], Dict[Node_Label, List[Node_Label]]]:
+        """
+        A method to get the costs and paths from source to every reachable molecule
+        node, in the same form as nx.single_source_dijkstra.
+        :return: dist: dict {node: cost}
+        :return: paths: dict {node: [source, ..., node]}
+        """
+        dist, predecessors = self.dijkstra(source, weight)
+        costs = {}
+        paths = {}
+        for node_id in np.flatnonzero(np.isfinite(dist[: self.num_species])):
+            label = self.labels[node_id]
+            costs[label] = float(dist[node_id])
+            paths[label] = self.path(predecessors, label)
+        return costs, paths
+
+    def multi_source_dijkstra(
+        self, sources: Sequence[Node_Label], weight: str, k: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        A method to solve shortest paths from several sources.
+
+        With k=None (or k >= len(sources)) the exact cost from each source to each
+        node is returned, from one scipy call. With a smaller integer k only the
+        (up to) k cheapest sources are kept for every node, from a single
+        multi_source_labels search over the CSR arrays; the costs of the other
+        sources are left at inf.
+        :param sources: source node labels
+        :param weight: cost function, ex "default_cost"
+        :param k: number of cheapest sources to keep per node, None for all
+        :return: dist: array of shape (len(sources), num_nodes)
+        :return: predecessors: array of shape (len(sources), num_nodes) of
+            predecessor node ids on the path from each source, negative if none
+        """
+        source_ids = [self.index[s] for s in sources]
+        if k is None or k >= len(sources):
+            dist, predecessors = dijkstra(
+                self.csr(weight),
+                directed=True,
+                indices=source_ids,
+                return_predecessors=True,
+            )
+            return (
+                np.atleast_2d(dist),
+                np.atleast_2d(predecessors).astype(np.int64),
+            )
+
+        indptr, indices, weights = self._adjacency_lists(weight)
+        labels, parents = multi_source_labels(
+            source_ids,
+            lambda node: zip(
+                indices[indptr[node] : indptr[node + 1]],
+                weights[indptr[node] : indptr[node + 1]],
+            ),
+            k,
+        )
+
+        dist = np.full((len(sources), self.num_nodes), np.inf)
+        predecessors = np.full((len(sources), self.num_nodes), -9999, dtype=np.int64)
+        for ii in range(len(sources)):
+            nodes = np.fromiter(labels[ii].keys(), dtype=np.int64)
+            dist[ii, nodes] = np.fromiter(labels[ii].values(), dtype=np.float64)
+            predecessors[ii, nodes] = [
+                -9999 if p is None else p for p in parents[ii].values()
+            ]
+        return dist, predecessors
+
+    def reachable_sources(self, sources: Sequence[Node_Label]) -> Dict[Node_Label, int]:
+        """
+        A method to get the sources reaching the species nodes, with a single
+        multi_source_reach search over the CSR arrays.
+        :param sources: source node labels
+        :return: dict {node label: bit mask of the sources reaching it}
+        """
+        indptr, indices, _ = self._adjacency_lists()
+        reach = multi_source_reach(
+            [self.index[s] for s in sources],
+            lambda node: indices[indptr[node] : indptr[node + 1]],
+        )
+        return {
+            self.labels[node_id]: mask
+            for node_id, mask in reach.items()
+            if node_id < self.num_species
+        }
+
+    def repair_shortest_paths(
+        self,
+        dist: np.ndarray,
+        predecessors: np.ndarray,
+        weight: str,
+        edge_ids: np.ndarray,
+    ):
+        """
+        A method to update, in place, the result of multi_source_dijkstra after
+        the weights of some edges changed, in the style of Ramalingam and Reps.
+
+        For each source, the nodes whose shortest path tree branch hangs off a
+        changed edge lose their labels. They are reseeded from their unaffected
+        predecessors and the changed edges. A Dijkstra search then runs from
+        those seeds only, so nodes the change does not touch are never visited.
+        :param dist: array of shape (number of sources, num_nodes)
+        :param predecessors: array of shape (number of sources, num_nodes)
+        :param weight: cost function, ex "default_cost"
+        :param edge_ids: positions of the edges whose weight changed, as returned
+            by CompactGraph.pop_changed_edges
+        """
+        if len(edge_ids) == 0:
+            return
+        weights = self.weights[weight]
+        in_indptr, in_edges = self._in_edges()
+        for row in range(dist.shape[0]):
+            d = dist[row]
+            p = predecessors[row]
+
+            stack = [
+                int(self.indices[e])
+                for e in edge_ids
+                if p[self.indices[e]] == self.sources[e]
+            ]
+            affected = set(stack)
+            while stack:
+                node = stack.pop()
+                for pos in range(self.indptr[node], self.indptr[node + 1]):
+                    child = int(self.indices[pos])
+                    if p[child] == node and child not in affected:
+                        affected.add(child)
+                        stack.append(child)
+            affected_ids = np.array(sorted(affected), dtype=np.int64)
+            d[affected_ids] = np.inf
+            p[affected_ids] = -9999
+
+            heap = []  # type: List[Tuple[float, int]]
+            seeds = itertools.chain(
+                edge_ids,
+                *(in_edges[in_indptr[a] : in_indptr[a + 1]] for a in affected_ids),
+            )
+            for e in seeds:
+                u = self.sources[e]
+                v = int(self.indices[e])
+                cost = d[u] + weights[e]
+                if cost < d[v]:
+                    d[v] = cost
+                    p[v] = u
+                    heapq.heappush(heap, (cost, v))
+            while heap:
+                cost, node = heapq.heappop(heap)
+                if cost > d[node]:
+                    continue
+                for pos in range(self.indptr[node], self.indptr[node + 1]):
+                    nbr = int(self.indices[pos])
+                    new_cost = cost + weights[pos]
+                    if new_cost < d[nbr]:
+                        d[nbr] = new_cost
+                        p[nbr] = node
+                        heapq.heappush(heap, (new_cost, nbr))
+
+    def multi_source_paths(
+        self,
+        sources: Sequence[Node_Label],
+        weight: str,
+        arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        k: Optional[int] = None,
+    ) -> Dict[
+        Node_Label, Tuple[Dict[Node_Label, float], Dict[Node_Label, List[Node_Label]]]
+    ]:
+        """
+        A method to get single_source_paths for several sources from one
+        multi_source_dijkstra call.
+        :param arrays: (dist, predecessors) already computed for these sources, ex
+            kept up to date by CompactGraph.repair_shortest_paths
+        :param k: number of cheapest sources to keep per node, None for all
+        :return: dict {source: (costs, paths)} with costs and paths as returned by
+            CompactGraph.single_source_paths
+        """
+        if arrays is None:
+            dist, predecessors = self.multi_source_dijkstra(sources, weight, k=k)
+        else:
+            dist, predecessors = arrays
+        results = {}
+        for ii, source in enumerate(sources):
+            costs = {}
+            paths = {}
+            for node_id in np.flatnonzero(np.isfinite(dist[ii, : self.num_species])):
+                label = self.labels[node_id]
+                costs[label] = float(dist[ii, node_id])
+                paths[label] = [
+                    self.labels[n] for n in self._path_ids(predecessors[ii], node_id)
+                ]
+            results[source] = (costs, paths)
+        return results
+
+    def shortest_path(
+        self,
+        source: Node_Label,
+        target: Node_Label,
+        weight: str,
+        ignore_nodes: Optional[Iterable[Any]] = None,
+    ) -> Tuple[float, List[Node_Label]]:
+        """
+        A method to find the shortest path between two nodes, avoiding ignore_nodes.
+        :return: length: cost of the path
+        :return: path: list of node labels
+        :raises nx.NetworkXNoPath: if target can not be reached
+        """
+        dist, predecessors = self.dijkstra(source, weight, ignore_nodes)
+        if not np.isfinite(dist[self.index[target]]):
+            raise nx.NetworkXNoPath("No path between {} and {}.".format(source, target))
+        return float(dist[self.index[target]]), self.path(predecessors, target)
+
+    def shortest_simple_paths(
+        self,
+        source: Node_Label,
+        target: Node_Label,
+        weight: str,
+        ignore_nodes: Optional[Iterable[Any]] = None,
+    ):
+        """
+        A generator of simple paths from source to target in order of increasing
+        cost (Yen's algorithm), the CSR counterpart of nx.shortest_simple_paths.
+        :param source: source node label
+        :param target: target node label
+        :param weight: cost function, ex "default_cost"
+        :param ignore_nodes: node labels the paths may not go through
+        :return: generator of lists of node labels
+        """
+        base_mask = self.node_mask(ignore_nodes)
+        source_id = self.index[source]
+        target_id = self.index[target]
+
+        dist, predecessors = self._dijkstra(source_id, weight, node_mask=base_mask)
+        if not np.isfinite(dist[target_id]):
+            raise nx.NetworkXNoPath("No path between {} and {}.".format(source, target))
+
+        accepted = [self._path_ids(predecessors, target_id)]
+        seen = {tuple(accepted[0])}
+        candidates = []  # type: List[Tuple[float, int, List[int]]]
+        counter = itertools.count()
+        weights = self.weights[weight]
+
+        while True:
+            yield [self.labels[n] for n in accepted[-1]]
+
+            previous = accepted[-1]
+            for ii in range(len(previous) - 1):
+                root = previous[: ii + 1]
+                node_mask = base_mask.copy()
+                node_mask[root[:-1]] = False
+                edge_mask = np.ones(self.num_edges, dtype=bool)
+                for path in accepted:
+                    if path[: ii + 1] == root:
+                        edge_mask[self._edge_id(path[ii], path[ii + 1])] = False
+
+                dist, predecessors = self._dijkstra(
+                    root[-1], weight, node_mask=node_mask, edge_mask=edge_mask
+                )
+                if not np.isfinite(dist[target_id]):
+                    continue
+                new_path = root[:-1] + self._path_ids(predecessors, target_id)
+                if tuple(new_path) not in seen:
+                    seen.add(tuple(new_path))
+                    cost = float(
+                        sum(
+                            weights[self._edge_id(u, v)]
+                            for u, v in zip(new_path[:-1], new_path[1:])
+                        )
+                    )
+                    heapq.heappush(candidates, (cost, next(counter), new_path))
+
+            if not candidates:
+                return
+            accepted.append(heapq.heappop(candidates)[2])
+
+    def _edge_id(self, u_id: int, v_id: int) -> int:
+        start = self.indptr[u_id]
+        return int(
+            start + np.searchsorted(self.indices[start : self.indptr[u_id + 1]], v_id)
+        )
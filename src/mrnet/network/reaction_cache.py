@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from mrnet.core.mol_entry import MoleculeEntry
+from mrnet.core.reactions import Reaction
+from mrnet.utils.classes import load_class
+
+__author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith, Daniel Barter"
+__maintainer__ = "Daniel Barter"
+
+
+# bump whenever the file layout or the reaction generation changes in a way that
+# makes old cache files invalid
+REACTION_CACHE_VERSION = 1
+
+
+def reaction_cache_key(
+    entries_list: List[MoleculeEntry],
+    reaction_types: Iterable[str],
+    determine_atom_mappings: bool,
+) -> str:
+    """
+    A function to compute a content hash of everything the generated elementary
+    reactions depend on: the entry ids, indices, energies and molecule graphs, the
+    reaction classes and the generation parameters.
+    :param entries_list: EntriesBox.entries_list
+    :param reaction_types: names of the reaction classes to generate
+    :param determine_atom_mappings: whether atom mappings are generated
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    header = {
+        "version": REACTION_CACHE_VERSION,
+        "reaction_types": sorted(reaction_types),
+        "determine_atom_mappings": bool(determine_atom_mappings),
+    }
+    sha.update(json.dumps(header, sort_keys=True).encode())
+    for entry in entries_list:
+        record = [
+            str(entry.entry_id),
+            entry.parameters.get("ind"),
+            entry.formula,
+            entry.charge,
+            entry.energy,
+            entry.enthalpy,
+            entry.entropy,
+            entry.species,
+            sorted(entry.bonds),
+        ]
+        sha.update(json.dumps(record, default=str).encode())
+    return sha.hexdigest()
+
+
+def reaction_cache_path(
+    cache_dir: str,
+    entries_list: List[MoleculeEntry],
+    reaction_types: Iterable[str],
+    determine_atom_mappings: bool,
+) -> str:
+    """
+    A function to get the cache file for a set of entries and generation
+    parameters.
+    :return: path of the form cache_dir/reactions_<key>.npz
+    """
+    key = reaction_cache_key(entries_list, reaction_types, determine_atom_mappings)
+    return os.path.join(cache_dir, "reactions_{}.npz".format(key))
+
+
+def reactions_to_records(reactions: List[Reaction]) -> Dict[str, np.ndarray]:
+    """
+    A function to flatten elementary reactions into arrays of entry indices, in
+    the order they were generated. The records are small and picklable, and do
+    not hold on to the MoleculeEntries.
+    :param reactions: reactions returned by the generate methods, every entry
+        must have parameters["ind"] set
+    :return: dict of arrays: classes (class names), reactants (reactant index),
+        products (product indices padded with -1) and atom_mappings (json)
+    """
+    num_products = max([len(r.product_indices) for r in reactions], default=1)
+    reactants = np.array(
+        [int(r.reactant_indices[0]) for r in reactions], dtype=np.int64
+    )
+    products = np.full((len(reactions), num_products), -1, dtype=np.int64)
+    for ii, r in enumerate(reactions):
+        products[ii, : len(r.product_indices)] = r.product_indices
+    classes = np.array([r.__class__.__name__ for r in reactions], dtype=str)
+
+    # atom mappings are dicts with int keys, stored as lists of pairs
+    mappings = list()  # type: List[Optional[list]]
+    for r in reactions:
+        if r.reactants_atom_mapping is None or r.products_atom_mapping is None:
+            mappings.append(None)
+        else:
+            mappings.append(
+                [
+                    [sorted(m.items()) for m in r.reactants_atom_mapping],
+                    [sorted(m.items()) for m in r.products_atom_mapping],
+                ]
+            )
+
+    return {
+        "classes": classes,
+        "reactants": reactants,
+        "products": products,
+        "atom_mappings": np.array(json.dumps(mappings, default=int)),
+    }
+
+
+def reactions_from_records(
+    records: Dict[str, np.ndarray], entries_list: List[MoleculeEntry]
+) -> List[Reaction]:
+    """
+    A function to rebuild the reactions flattened by reactions_to_records, in the
+    same order, from the entries they refer to.
+    :param records: dict of arrays returned by reactions_to_records
+    :param entries_list: EntriesBox.entries_list the records were made from
+    :return: list of Reaction objects
+    """
+    classes = [str(c) for c in records["classes"]]
+    reactants = records["reactants"]
+    products = records["products"]
+    mappings = json.loads(str(records["atom_mappings"]))
+
+    reaction_classes = {
+        name: load_class("mrnet.core.reactions", name) for name in set(classes)
+    }
+    by_ind = {e.parameters["ind"]: e for e in entries_list}
+    reactions = list()  # type: List[Reaction]
+    for ii, name in enumerate(classes):
+        reactant = by_ind[reactants[ii]]
+        prods = [by_ind[p] for p in products[ii] if p >= 0]
+        kwargs = dict()  # type: Dict[str, Any]
+        mapping = mappings[ii]  # type: Optional[list]
+        if mapping is not None:
+            rcts_mp = [dict(m) for m in mapping[0]]
+            prdts_mp = [dict(m) for m in mapping[1]]
+            kwargs["reactant_atom_mapping"] = rcts_mp[0]
+            if len(prods) == 1:
+                kwargs["product_atom_mapping"] = prdts_mp[0]
+            else:
+                kwargs["products_atom_mapping"] = prdts_mp
+        if len(prods) == 1:
+            reactions.append(reaction_classes[name](reactant, prods[0], **kwargs))
+        else:
+            reactions.append(reaction_classes[name](reactant, prods, **kwargs))
+    return reactions
+
+
+def save_reactions(path: str, reactions: List[Reaction]):
+    """
+    A function to write elementary reactions to a compressed .npz file of the
+    arrays returned by reactions_to_records. The file is written to a temporary
+    name first and moved into place, so readers never see a partial file.
+    :param path: file to write
+    :param reactions: reactions returned by the generate methods, every entry
+        must have parameters["ind"] set
+    """
+    records = reactions_to_records(reactions)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **records)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_reactions(path: str, entries_list: List[MoleculeEntry]) -> List[Reaction]:
+    """
+    A function to rebuild the reactions written by save_reactions, in the same
+    order, from the entries they refer to.
+    :param path: file written by save_reactions
+    :param entries_list: EntriesBox.entries_list the cache was written for
+    :return: list of Reaction objects
+    """
+    with np.load(path) as data:
+        records = {key: data[key] for key in data.files}
+    return reactions_from_records(records, entries_list)
@@ -1,8 +1,14 @@
 import networkx as nx
+import numpy as np
 from monty.json import MSONable
+import gc
 import itertools
+import math
+import multiprocessing
+import os
 import time as time
-from typing import Dict, List, Tuple, Union, Any, FrozenSet, Set
+from collections import deque
+from typing import Dict, List, Tuple, Union, Any, FrozenSet, Set, Optional
 from mrnet.core.mol_entry import MoleculeEntry
 from mrnet.core.reactions import (
     ConcertedReaction,
@@ -11,11 +17,21 @@ from mrnet.core.reactions import (
     IntramolSingleBondChangeReaction,
     Reaction,
     RedoxReaction,
+    set_edge_costs,
 )
 import copy
 
 
+from mrnet.network.reaction_matrix import ReactionMatrix
+from mrnet.network.reaction_cache import (
+    load_reactions,
+    reaction_cache_path,
+    reactions_from_records,
+    reactions_to_records,
+    save_reactions,
+)
 from mrnet.utils.classes import load_class
+from mrnet.utils.graphs import weisfeiler_lehman_hash
 
 
 __author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith, Daniel Barter"
@@ -25,6 +41,86 @@ __maintainer__ = "Daniel Barter"
 metals = ["Li", "Na", "K", "Mg", "Ca", "Zn", "Al"]
 m_formulas = [m + "1" for m in metals]
 
+# reaction classes whose generate method can be restricted to chunks of reactant
+# formulas, and so can be run across a process pool
+parallel_reaction_types = [
+    "RedoxReaction",
+    "IntramolSingleBondChangeReaction",
+    "IntermolecularReaction",
+    "CoordinationBondChangeReaction",
+]
+
+# entries dict of a generation worker process, set by _init_generation_worker
+_worker_entries_dict = None  # type: Any
+
+
+def _init_generation_worker(entries_dict):
+    global _worker_entries_dict
+    _worker_entries_dict = entries_dict
+
+
+def _generate_chunk(task) -> Dict[str, Any]:
+    """
+    Generate the reactions of one reaction class for a chunk of reactant formulas
+    in a worker process. The reactions are returned as records of entry indices,
+    since the entries of the worker are copies of the ones in the parent process.
+    """
+    reaction_type, formulas, determine_atom_mappings = task
+    reactions = load_class("mrnet.core.reactions", reaction_type).generate(
+        _worker_entries_dict,
+        determine_atom_mappings=determine_atom_mappings,
+        formulas=formulas,
+    )
+    return reactions_to_records(reactions)
+
+
+def _can_fork() -> bool:
+    """
+    Whether worker processes can be forked on this platform, which is not the
+    case on Windows. Pools that need fork ask for it explicitly, whatever the
+    default start method is (spawn on macOS).
+    """
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _fork_pool(processes: int, initializer, initargs) -> Any:
+    """
+    A process pool whose workers are forked where the platform allows it, so the
+    data handed to the initializer is shared copy on write instead of pickled.
+    The objects of the parent are frozen for the fork, so that the garbage
+    collector of the workers does not touch (and copy) their pages. Elsewhere
+    the default start method is used, and initargs must be picklable.
+    """
+    if _can_fork():
+        context = multiprocessing.get_context("fork")  # type: Any
+    else:
+        context = multiprocessing.get_context()
+    gc.freeze()
+    try:
+        return context.Pool(processes, initializer=initializer, initargs=initargs)
+    finally:
+        gc.unfreeze()
+
+
+# reaction iterator of a concerted generation worker process, set by
+# _init_concerted_worker
+_worker_reaction_iterator = None  # type: Any
+
+
+def _init_concerted_worker(reaction_iterator):
+    global _worker_reaction_iterator
+    _worker_reaction_iterator = reaction_iterator
+
+
+def _concerted_chunk(intermediate_index: int) -> List[Tuple]:
+    """
+    Generate the concerted reactions of one intermediate in a worker process.
+    """
+    iterator = _worker_reaction_iterator
+    return iterator.generate_concerted_reactions(
+        iterator.entries_box.entries_list[intermediate_index]
+    )
+
 
 class EntriesBox:
     """
@@ -100,11 +196,18 @@ class EntriesBox:
                         sorted_entries_3 = sorted(list(g3), key=get_free_energy)
                         if len(sorted_entries_3) > 1:
                             unique = list()
+                            # indices into unique, grouped by graph hash. Only
+                            # entries with the same hash can be isomorphic
+                            hash_groups = dict()  # type: Dict[str, List[int]]
                             for entry in sorted_entries_3:
                                 isomorphic_found = False
+                                group = hash_groups.setdefault(
+                                    weisfeiler_lehman_hash(entry.graph), []
+                                )
                                 # Sort by graph isomorphism, taking the isomorphic
                                 # entry with the lowest free energy
-                                for ii, Uentry in enumerate(unique):
+                                for ii in group:
+                                    Uentry = unique[ii]
                                     if entry.mol_graph.isomorphic_to(Uentry.mol_graph):
                                         isomorphic_found = True
                                         if (
@@ -121,6 +224,7 @@ class EntriesBox:
                                             unique[ii] = entry
                                         break
                                 if not isomorphic_found:
+                                    group.append(len(unique))
                                     unique.append(entry)
                             entries[k1][k2][k3] = unique
                         else:
@@ -150,6 +254,35 @@ class EntriesBox:
             self.entries_list = input_entries
 
 
+# number of (outgoing, incoming) reaction pairs of an intermediate whose free
+# energies are compared at once
+concerted_block_size = 2 ** 22
+
+
+def _cancel_species(reactants: np.ndarray, products: np.ndarray):
+    """
+    Cancel the species on both sides of combined reactions, like
+    concerted_reaction_filter does: a species is removed from both sides as many
+    times as it appears on both, but at most twice.
+    :param reactants: (num reactions, width) species indices padded with -1
+    :param products: (num reactions, width) species indices padded with -1
+    :return: reactants and products with the cancelled species replaced by -1,
+        every row sorted
+    """
+
+    def cancelled(a, b):
+        shared = (a[:, :, None] == b[:, None, :]).sum(axis=2)
+        # number of earlier copies of the same species on this side
+        rank = np.tril(a[:, :, None] == a[:, None, :], -1).sum(axis=2)
+        return (a >= 0) & (rank < np.minimum(shared, 2))
+
+    reactants, products = (
+        np.where(cancelled(reactants, products), -1, reactants),
+        np.where(cancelled(products, reactants), -1, products),
+    )
+    return np.sort(reactants, axis=1), np.sort(products, axis=1)
+
+
 class ReactionGenerator(MSONable):
     """
     Class to build a reaction network from entries
@@ -164,6 +297,9 @@ class ReactionGenerator(MSONable):
         solvent_refractive_index=1.415,
         filter_concerted_metal_coordination=False,
         replace_ind=True,
+        reaction_cache_dir=None,
+        num_workers=1,
+        chunk_size=None,
     ):
         """
         Generate a ReactionNetwork from a set of MoleculeEntries.
@@ -180,10 +316,21 @@ class ReactionGenerator(MSONable):
             indices in the input_entries
         :param filters_metal_coordination: Remove concerted reactions involving
             metal coordination.
+        :param reaction_cache_dir: directory of the on-disk cache of generated
+            elementary reactions, keyed by a hash of the entries and generation
+            parameters. None (default) disables the cache
+        :param num_workers: number of processes used to generate the
+            elementary reactions, 1 (default) to generate them serially
+        :param chunk_size: number of reactant formulas handed to a worker at a
+            time, None to split every reaction class into about four chunks
+            per worker
         :return:
         """
 
         self.entries_box = entries_box
+        self.reaction_cache_dir = reaction_cache_dir
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
 
         self.electron_free_energy = electron_free_energy
         self.temperature = temperature
@@ -191,8 +338,8 @@ class ReactionGenerator(MSONable):
         self.solvent_refractive_index = solvent_refractive_index
 
         self.entry_ids = {e.entry_id for e in self.entries_box.entries_list}
-        self.matrix = None
-        self.matrix_inverse = None
+        self.matrix = None  # type: Any
+        self.matrix_inverse = None  # type: Any
 
         self.index_formula_mapping = {
             e.parameters["ind"]: e.formula for e in self.entries_box.entries_list
@@ -232,20 +379,42 @@ class ReactionGenerator(MSONable):
         for entry in self.entries_box.entries_list:
             self.graph.add_node(entry.parameters["ind"], bipartite=0)
 
-        reaction_classes = [load_class(str(self.__module__), s) for s in reaction_types]
+        cache_path = None
+        if self.reaction_cache_dir is not None:
+            cache_path = reaction_cache_path(
+                self.reaction_cache_dir,
+                self.entries_box.entries_list,
+                reaction_types,
+                determine_atom_mappings,
+            )
 
-        all_reactions = list()
+        if cache_path is not None and os.path.exists(cache_path):
+            print("loading reactions from", cache_path)
+            self.reactions = load_reactions(cache_path, self.entries_box.entries_list)
+        elif self.num_workers > 1:
+            self.reactions = self.generate_reactions_parallel(
+                list(reaction_types), determine_atom_mappings
+            )
+        else:
+            reaction_classes = [
+                load_class(str(self.__module__), s) for s in reaction_types
+            ]
 
-        # Generate reactions
-        for r in reaction_classes:
-            reactions = r.generate(
-                self.entries_box.entries_dict,
-                determine_atom_mappings=determine_atom_mappings,
-            )  # review
-            all_reactions.append(reactions)
+            all_reactions = list()
 
-        all_reactions = [i for i in all_reactions if i]
-        self.reactions = list(itertools.chain.from_iterable(all_reactions))
+            # Generate reactions
+            for r in reaction_classes:
+                reactions = r.generate(
+                    self.entries_box.entries_dict,
+                    determine_atom_mappings=determine_atom_mappings,
+                )  # review
+                all_reactions.append(reactions)
+
+            all_reactions = [i for i in all_reactions if i]
+            self.reactions = list(itertools.chain.from_iterable(all_reactions))
+
+        if cache_path is not None and not os.path.exists(cache_path):
+            save_reactions(cache_path, self.reactions)
 
         self.redox_c = 0
         self.inter_c = 0
@@ -265,7 +434,10 @@ class ReactionGenerator(MSONable):
                 self.inter_c += 1
             elif r.__class__.__name__ == "CoordinationBondChangeReaction":
                 self.coord_c += 1
-            self.add_reaction(r.graph_representation())  # add graph element here
+            # add graph element here, the edge costs are set below in one pass
+            self.add_reaction(r.graph_representation(edge_costs=False))
+
+        set_edge_costs(self.graph)
 
         print(len(self.graph.nodes), "nodes in the graph")
         print(len(self.graph.edges), "edges in the graph")
@@ -285,6 +457,60 @@ class ReactionGenerator(MSONable):
 
         print("build() end", time.time())
 
+    def generate_reactions_parallel(
+        self, reaction_types: List[str], determine_atom_mappings: bool = False
+    ) -> List[Reaction]:
+        """
+            A method to generate the elementary reactions on a pool of
+            ReactionGenerator.num_workers processes. Each reaction class is
+            split into chunks of consecutive reactant formulas; the chunks are
+            merged back in order, so the reactions (and their indices) are the
+            same as when they are generated serially.
+        :param reaction_types: names of the reaction classes to generate
+        :param determine_atom_mappings: If True, create an atom mapping
+            between reactants and products in a given reaction
+        :return: list of reactions
+        """
+        entries_dict = self.entries_box.entries_dict
+        formulas = list(entries_dict.keys())
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(formulas) / (4 * self.num_workers)))
+        chunks = [
+            formulas[ii : ii + chunk_size] for ii in range(0, len(formulas), chunk_size)
+        ]
+
+        tasks = [
+            (reaction_type, chunk, determine_atom_mappings)
+            for reaction_type in reaction_types
+            if reaction_type in parallel_reaction_types
+            for chunk in chunks
+        ]
+        with _fork_pool(
+            self.num_workers,
+            initializer=_init_generation_worker,
+            initargs=(entries_dict,),
+        ) as pool:
+            results = iter(pool.imap(_generate_chunk, tasks))
+
+            reactions = list()  # type: List[Reaction]
+            for reaction_type in reaction_types:
+                if reaction_type in parallel_reaction_types:
+                    for _ in chunks:
+                        reactions.extend(
+                            reactions_from_records(
+                                next(results), self.entries_box.entries_list
+                            )
+                        )
+                else:
+                    reactions.extend(
+                        load_class(str(self.__module__), reaction_type).generate(
+                            entries_dict,
+                            determine_atom_mappings=determine_atom_mappings,
+                        )
+                    )
+        return reactions
+
     def add_reaction(self, graph_representation: nx.DiGraph):
         """
             A method to add a single reaction to the ReactionNetwork.graph
@@ -295,38 +521,17 @@ class ReactionGenerator(MSONable):
         self.graph.add_nodes_from(graph_representation.nodes(data=True))
         self.graph.add_edges_from(graph_representation.edges(data=True))
 
-    def build_matrix(self) -> Dict[int, Dict[int, List[Tuple]]]:
+    def build_matrix(self) -> ReactionMatrix:
         """
-        A method to build a spare adjacency matrix using dictionaries.
-        :return: nested dictionary {r1:{c1:[],c2:[]}, r2:{c1:[],c2:[]}}
+        A method to build the sparse matrix of the elementary reactions, and its
+        transpose, self.matrix_inverse.
+        :return: ReactionMatrix, see ReactionMatrix.to_dict for the nested
+            dictionary form {r1:{c1:[],c2:[]}, r2:{c1:[],c2:[]}}
         """
-        self.matrix = {}
-        for i in range(len(self.entries_box.entries_list)):
-            self.matrix[i] = {}
-        for node in self.graph.nodes:
-            if isinstance(node, str):
-                if "electron" not in self.graph.nodes[node]["rxn_type"]:
-                    in_node = list(self.graph.predecessors(node))
-                    out_nodes = list(self.graph.successors(node))
-                    edges = []
-                    for u in in_node:
-                        for v in out_nodes:
-                            edges.append((u, v))
-                    for e in edges:
-                        if e[1] not in self.matrix[e[0]].keys():
-                            self.matrix[e[0]][e[1]] = [
-                                (node, self.graph.nodes[node]["free_energy"], "e")
-                            ]
-                        else:
-                            self.matrix[e[0]][e[1]].append(
-                                (node, self.graph.nodes[node]["free_energy"], "e")
-                            )
-        self.matrix_inverse = {}
-        for i in range(len(self.matrix)):
-            self.matrix_inverse[i] = {}
-            for k, v in self.matrix.items():
-                if i in v.keys():
-                    self.matrix_inverse[i][k] = v[i]
+        self.matrix = ReactionMatrix.from_graph(
+            self.graph, len(self.entries_box.entries_list)
+        )
+        self.matrix_inverse = self.matrix.transpose()
 
         return self.matrix
 
@@ -396,34 +601,145 @@ class ReactionGenerator(MSONable):
         ):
 
             if update_matrix:
-                self.matrix2 = copy.deepcopy(self.matrix)
-
-            row = self.matrix[entry_ind]  # type: ignore
-            col = self.matrix_inverse[entry_ind]
-
-            for kr, vr in row.items():
-                for kc, vc in col.items():
-                    if kr != kc:
-                        for s2 in vr:
-                            for e2 in vc:
-                                incoming_reaction_dG = e2[1]
-                                total_dG = s2[1] + e2[1]
-                                if incoming_reaction_dG > 0 and total_dG < 0:
-                                    (
-                                        rxn1,
-                                        rxn1_nodes,
-                                    ) = self.concerted_reaction_filter(e2[0], s2[0])
-                                    if rxn1 is not None:
-                                        rxn_from_filer_iter1.append(rxn1)
-                                        rxn_from_filer_iter1_nodes.append(rxn1_nodes)
-                                        if update_matrix:
-                                            reaction = (rxn1[0], rxn1[1], total_dG)
-                                            ReactionGenerator.add_reactions_to_matrix(
-                                                self.matrix2, reaction
-                                            )
+                self.matrix2 = self.matrix.to_dict()
+
+            in_span = self.matrix_inverse.row_span(entry_ind)
+            out_span = self.matrix.row_span(entry_ind)
+            (
+                in_entries,
+                out_entries,
+                total_dGs,
+                reactants,
+                products,
+            ) = self.concerted_candidates(entry_ind)
+            for e2, s2, total_dG, combined_reactants, combined_products in zip(
+                in_entries.tolist(),
+                out_entries.tolist(),
+                total_dGs.tolist(),
+                reactants.tolist(),
+                products.tolist(),
+            ):
+                combined_reactants = [i for i in combined_reactants if i >= 0]
+                combined_products = [i for i in combined_products if i >= 0]
+                if "metal_coordination" in self.filters and self.metal_coordination(
+                    combined_reactants, combined_products
+                ):
+                    continue
+                in_reaction_node = self.matrix_inverse.reaction_nodes[
+                    self.matrix_inverse.reactions[in_span.start + e2]
+                ]
+                out_reaction_node = self.matrix.reaction_nodes[
+                    self.matrix.reactions[out_span.start + s2]
+                ]
+                rxn1 = [combined_reactants, combined_products]
+                rxn1_nodes = [
+                    combined_reactants,
+                    combined_products,
+                    [in_reaction_node, out_reaction_node],
+                ]
+                rxn_from_filer_iter1.append(rxn1)
+                rxn_from_filer_iter1_nodes.append(rxn1_nodes)
+                if update_matrix:
+                    reaction = (rxn1[0], rxn1[1], total_dG)
+                    ReactionGenerator.add_reactions_to_matrix(self.matrix2, reaction)
 
         return rxn_from_filer_iter1, rxn_from_filer_iter1_nodes
 
+    def concerted_candidates(self, entry_ind: int):
+        """
+        A method to find the concerted reactions through an intermediate, before
+        the metal coordination filter, on arrays. A pair of an incoming reaction
+        (producing the intermediate from species a) and an outgoing one
+        (consuming it to species b != a) is kept if the incoming reaction is
+        uphill, the pair is downhill, and the combined reaction cancels down to
+        1-2 reactants and 1-2 products.
+        :param entry_ind: index of the intermediate
+        :return: in_entries, out_entries: positions of the two reactions in the
+            row of the intermediate in matrix_inverse and matrix, total_dGs: free
+            energies of the pairs, reactants, products: species of the combined
+            reactions padded with -1. The pairs are in the order of the
+            columns of the matrix, then of the inverse, then of the entries.
+        """
+        in_span = self.matrix_inverse.row_span(entry_ind)
+        out_span = self.matrix.row_span(entry_ind)
+        in_cols = self.matrix_inverse.cols[in_span]
+        out_cols = self.matrix.cols[out_span]
+        in_dGs = self.matrix_inverse.free_energies[in_span]
+        out_dGs = self.matrix.free_energies[out_span]
+
+        uphill = np.flatnonzero(in_dGs > 0)
+        block = max(1, concerted_block_size // max(len(uphill), 1))
+        in_entries, out_entries = [], []
+        for start in range(0, len(out_dGs), block):
+            stop = min(start + block, len(out_dGs))
+            mask = (out_dGs[start:stop, None] + in_dGs[None, uphill] < 0) & (
+                out_cols[start:stop, None] != in_cols[None, uphill]
+            )
+            out_ind, in_ind = np.nonzero(mask)
+            out_entries.append(out_ind + start)
+            in_entries.append(uphill[in_ind])
+        in_entry = np.concatenate(in_entries) if in_entries else np.zeros(0, int)
+        out_entry = np.concatenate(out_entries) if out_entries else np.zeros(0, int)
+
+        # (matrix column, inverse column, outgoing entry, incoming entry)
+        in_groups = np.cumsum(np.r_[0, in_cols[1:] != in_cols[:-1]])
+        out_groups = np.cumsum(np.r_[0, out_cols[1:] != out_cols[:-1]])
+        order = np.lexsort(
+            (in_entry, out_entry, in_groups[in_entry], out_groups[out_entry])
+        )
+        in_entry, out_entry = in_entry[order], out_entry[order]
+        total_dGs = out_dGs[out_entry] + in_dGs[in_entry]
+
+        in_reactions = self.matrix_inverse.reactions[in_span][in_entry]
+        out_reactions = self.matrix.reactions[out_span][out_entry]
+        in_reactants, in_products = self.matrix_inverse.reaction_species()
+        out_reactants, out_products = self.matrix.reaction_species()
+        reactants, products = _cancel_species(
+            np.hstack([in_reactants[in_reactions], out_reactants[out_reactions]]),
+            np.hstack([in_products[in_reactions], out_products[out_reactions]]),
+        )
+        num_reactants = (reactants >= 0).sum(axis=1)
+        num_products = (products >= 0).sum(axis=1)
+        keep = (
+            (0 < num_reactants)
+            & (num_reactants <= 2)
+            & (0 < num_products)
+            & (num_products <= 2)
+        )
+        return (
+            in_entry[keep],
+            out_entry[keep],
+            total_dGs[keep],
+            reactants[keep],
+            products[keep],
+        )
+
+    def metal_coordination(self, reactants, products) -> bool:
+        """
+        A method to check whether a concerted reaction involves metal
+        coordination, which is only allowed if the same metal decoordinates
+        :param reactants: species indices of the reactants
+        :param products: species indices of the products
+        :return: True if the reaction should be filtered out
+        """
+        reactant_entries = [self.index_formula_mapping[e] for e in reactants]
+        product_entries = [self.index_formula_mapping[e] for e in products]
+        problem_metal = False
+        if any([e in m_formulas for e in reactant_entries]):
+            this_m_formula = [e for e in reactant_entries if e in m_formulas]
+            # Metal coordination can only be part of a concerted reaction if the same metal decoordinates
+            if not any([e in this_m_formula for e in product_entries]):
+                problem_metal = True
+        elif any([e in m_formulas for e in product_entries]):
+            problem_metal = True
+        if problem_metal:
+            print(
+                "FILTER FAILED",
+                [e for e in reactant_entries],
+                [e for e in product_entries],
+            )
+        return problem_metal
+
     def concerted_reaction_filter(self, in_reaction_node, out_reaction_node):
         """
         A method to identify a valid concerted reaction based on stiochomtery of maximum of 2 reactants and products
@@ -454,29 +770,13 @@ class ReactionGenerator(MSONable):
             combined_reactants.remove(i)
             combined_products.remove(i)
 
-        reactant_entries = [self.index_formula_mapping[e] for e in combined_reactants]
-        product_entries = [self.index_formula_mapping[e] for e in combined_products]
         if 0 < len(combined_reactants) <= 2 and 0 < len(combined_products) <= 2:
             # Filter to remove concerted reactions involving metal coordination
             problem_metal = False
             if "metal_coordination" in self.filters:
-                if any([e in m_formulas for e in reactant_entries]):
-                    this_m_formula = [e for e in reactant_entries if e in m_formulas]
-                    # Metal coordination can only be part of a concerted reaction if the same metal decoordinates
-                    if not any([e in this_m_formula for e in product_entries]):
-                        problem_metal = True
-                        print(
-                            "FILTER FAILED",
-                            [e for e in reactant_entries],
-                            [e for e in product_entries],
-                        )
-                elif any([e in m_formulas for e in product_entries]):
-                    problem_metal = True
-                    print(
-                        "FILTER FAILED",
-                        [e for e in reactant_entries],
-                        [e for e in product_entries],
-                    )
+                problem_metal = self.metal_coordination(
+                    combined_reactants, combined_products
+                )
 
             if not problem_metal:
                 r = [combined_reactants, combined_products]
@@ -511,6 +811,12 @@ class ReactionIterator:
     ReactionNetwork.identify_concerted_rxns_for_specific_intermediate.
     This allows looping over concerteds without needing to have them
     all reside in memory simultaneously
+
+    with num_workers > 1 the elementary reactions are generated on a process pool,
+    and so are the concerted batches: the workers are forked once the elementary
+    reactions have been consumed, share rn.matrix and rn.matrix_inverse copy on
+    write, and run at most concerted_window intermediates ahead of the consumer.
+    the reactions come out in the same order as with a single process.
     """
 
     def generate_concerted_reactions(
@@ -554,8 +860,85 @@ class ReactionIterator:
 
         return return_list
 
+    def set_chunk(self, intermediate_index: int, chunk: List[Tuple]):
+        """
+        record chunk as the current chunk, fully consumed
+        """
+        self.intermediate_index = intermediate_index
+        self.current_chunk = chunk
+        self.chunk_index = len(chunk)
+        print(
+            "concerted chunk for intermediate",
+            intermediate_index,
+            ">",
+            len(chunk),
+        )
+
+    def chunks(self, num_workers: int = 1, window: Optional[int] = None):
+        """
+        iterate over the remaining reactions chunk by chunk: first what is left of
+        the current chunk, then the concerted chunk of each following intermediate,
+        in order of intermediate index. empty chunks are skipped, so the reactions
+        come in the same order as when iterating reaction by reaction.
+
+        with num_workers > 1 the concerted chunks are generated by a pool of forked
+        worker processes, which share rn.matrix with this process copy on write.
+        at most window chunks (4 * num_workers by default) are being generated or
+        waiting to be consumed at any time, so the concerteds never all reside in
+        memory. the workers are handed this iterator, which can not be pickled,
+        so where processes can not be forked the chunks are generated serially.
+        """
+        remaining = self.current_chunk[self.chunk_index :]
+        self.chunk_index = len(self.current_chunk)
+
+        indices = iter(
+            range(self.intermediate_index + 1, len(self.entries_box.entries_list))
+        )
+        if num_workers <= 1 or not _can_fork():
+            if remaining:
+                yield remaining
+            for index in indices:
+                chunk = self.generate_concerted_reactions(
+                    self.entries_box.entries_list[index]
+                )
+                self.set_chunk(index, chunk)
+                if chunk:
+                    yield chunk
+            return
+
+        if window is None:
+            window = 4 * num_workers
+        # the workers are forked before the first chunk is handed out
+        with _fork_pool(
+            num_workers, initializer=_init_concerted_worker, initargs=(self,)
+        ) as pool:
+            pending = deque()  # type: deque
+            for index in itertools.islice(indices, window):
+                pending.append((index, pool.apply_async(_concerted_chunk, (index,))))
+            if remaining:
+                yield remaining
+            while pending:
+                index, result = pending.popleft()
+                chunk = result.get()
+                for next_index in itertools.islice(indices, 1):
+                    pending.append(
+                        (next_index, pool.apply_async(_concerted_chunk, (next_index,)))
+                    )
+                self.set_chunk(index, chunk)
+                if chunk:
+                    yield chunk
+
     def next_chunk(self):
 
+        if self.num_workers > 1:
+            if self.chunk_stream is None:
+                self.chunk_stream = self.chunks(
+                    num_workers=self.num_workers, window=self.concerted_window
+                )
+            self.current_chunk = next(self.chunk_stream)
+            self.chunk_index = 0
+            return
+
         next_chunk = []
         while not next_chunk:
             self.intermediate_index += 1
@@ -600,9 +983,17 @@ class ReactionIterator:
         solvent_refractive_index=1.415,
         single_elem_interm_ignore=["C1", "H1", "O1", "Li1", "P1", "F1"],
         filter_concerted_metal_coordination=False,
+        reaction_cache_dir=None,
+        num_workers=1,
+        chunk_size=None,
+        concerted_window=None,
     ):
 
         self.entries_box = entries_box
+        self.num_workers = num_workers
+        self.concerted_window = concerted_window
+        # parallel concerted chunks, started by next_chunk
+        self.chunk_stream = None  # type: Any
 
         self.rn = ReactionGenerator(
             entries_box,
@@ -611,6 +1002,9 @@ class ReactionIterator:
             solvent_dielectric=solvent_dielectric,
             solvent_refractive_index=solvent_refractive_index,
             filter_concerted_metal_coordination=filter_concerted_metal_coordination,
+            reaction_cache_dir=reaction_cache_dir,
+            num_workers=num_workers,
+            chunk_size=chunk_size,
         )
         self.rn.build()
         self.single_elem_interm_ignore = single_elem_interm_ignore
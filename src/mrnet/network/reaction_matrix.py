@@ -0,0 +1,233 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+
+__author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith, Daniel Barter"
+__maintainer__ = "Daniel Barter"
+
+
+class ReactionMatrix:
+    """
+    Array backed species x species matrix of reactions, used to enumerate the
+    concerted reactions through each intermediate.
+
+    Entry (u, v) lists the reactions which consume species u and produce species v.
+    The entries are stored in CSR form: row u spans indptr[u]:indptr[u + 1] of the
+    arrays cols (the other species), reactions (index into reaction_nodes),
+    free_energies and kinds ("e" for elementary, "c" for concerted). Within a row,
+    the entries of one column are contiguous, in the order the reactions were
+    added, and the columns come in the order they first appear; this is the order
+    of the nested dictionaries ReactionGenerator used to build.
+
+    :param num_species: number of rows (and columns)
+    :param indptr: CSR row pointers, of length num_species + 1
+    :param cols: column of every entry
+    :param reactions: reaction of every entry, as an index into reaction_nodes
+    :param free_energies: free energy of the reaction of every entry
+    :param kinds: "e" or "c" for every entry
+    :param reaction_nodes: reaction node strings, e.g. "1+2,3"
+    """
+
+    def __init__(
+        self,
+        num_species: int,
+        indptr: np.ndarray,
+        cols: np.ndarray,
+        reactions: np.ndarray,
+        free_energies: np.ndarray,
+        kinds: np.ndarray,
+        reaction_nodes: List[str],
+    ):
+        self.num_species = num_species
+        self.indptr = indptr
+        self.cols = cols
+        self.reactions = reactions
+        self.free_energies = free_energies
+        self.kinds = kinds
+        self.reaction_nodes = reaction_nodes
+        self._reaction_species = None  # type: Optional[Tuple[np.ndarray, np.ndarray]]
+
+    @classmethod
+    def from_entries(
+        cls,
+        num_species: int,
+        rows: Sequence[int],
+        cols: Sequence[int],
+        reactions: Sequence[int],
+        free_energies: Sequence[float],
+        kinds: Sequence[str],
+        reaction_nodes: List[str],
+    ) -> "ReactionMatrix":
+        """
+        A method to build the matrix from unordered (COO) entries.
+        :return: ReactionMatrix with the entries of each row grouped by column, the
+            columns in order of first appearance and the entries of a column in
+            the order they were given
+        """
+        row_ids = np.asarray(rows, dtype=np.int64)
+        col_ids = np.asarray(cols, dtype=np.int64)
+        position = np.arange(len(row_ids))
+        _, first, inverse = np.unique(
+            row_ids * num_species + col_ids, return_index=True, return_inverse=True
+        )
+        order = np.lexsort((position, first[inverse], row_ids))
+
+        indptr = np.zeros(num_species + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=num_species), out=indptr[1:])
+        return cls(
+            num_species,
+            indptr,
+            col_ids[order],
+            np.asarray(reactions, dtype=np.int64)[order],
+            np.asarray(free_energies, dtype=np.float64)[order],
+            np.asarray(kinds, dtype="<U1")[order],
+            reaction_nodes,
+        )
+
+    @classmethod
+    def from_graph(cls, graph: nx.DiGraph, num_species: int) -> "ReactionMatrix":
+        """
+        A method to build the matrix of the elementary reactions of a reaction
+        network graph: every non redox reaction node contributes one entry for
+        each of its (reactant, product) pairs.
+        :param graph: ReactionGenerator.graph
+        :param num_species: number of molecule nodes
+        :return: ReactionMatrix
+        """
+        rows, cols, reactions, free_energies = [], [], [], []
+        reaction_nodes = []  # type: List[str]
+        for node in graph.nodes:
+            if isinstance(node, str):
+                if "electron" not in graph.nodes[node]["rxn_type"]:
+                    reaction = len(reaction_nodes)
+                    reaction_nodes.append(node)
+                    free_energy = graph.nodes[node]["free_energy"]
+                    for u in graph.predecessors(node):
+                        for v in graph.successors(node):
+                            rows.append(u)
+                            cols.append(v)
+                            reactions.append(reaction)
+                            free_energies.append(free_energy)
+        return cls.from_entries(
+            num_species,
+            rows,
+            cols,
+            reactions,
+            free_energies,
+            ["e"] * len(rows),
+            reaction_nodes,
+        )
+
+    @property
+    def nnz(self) -> int:
+        return len(self.cols)
+
+    def transpose(self) -> "ReactionMatrix":
+        """
+        A method to build the transposed matrix in O(nnz), sharing reaction_nodes.
+        Row v of the transpose lists the reactions producing v, grouped by
+        reactant in ascending order, like the matrix_inverse dictionaries
+        ReactionGenerator used to build.
+        :return: ReactionMatrix
+        """
+        # carry the entry positions through scipy's (stable) CSR -> CSC conversion
+        csc = csr_matrix(
+            (np.arange(self.nnz), self.cols, self.indptr),
+            shape=(self.num_species, self.num_species),
+        ).tocsc()
+        order = csc.data
+        return ReactionMatrix(
+            self.num_species,
+            csc.indptr.astype(np.int64),
+            csc.indices.astype(np.int64),
+            self.reactions[order],
+            self.free_energies[order],
+            self.kinds[order],
+            self.reaction_nodes,
+        )
+
+    def row_span(self, row: int) -> slice:
+        """
+        A method to get the entries of a row.
+        :param row: species index
+        :return: slice of the entry arrays
+        """
+        return slice(int(self.indptr[row]), int(self.indptr[row + 1]))
+
+    def reaction_species(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        A method to parse the reaction nodes into arrays. The nodes are only
+        parsed the first time.
+        :return: reactants and products of every reaction node, as
+            (num reactions, width) arrays of species indices padded with -1
+        """
+        if self._reaction_species is None:
+            sides = [
+                [[int(x) for x in side.split("+")] for side in node.split(",")]
+                for node in self.reaction_nodes
+            ]
+            species = []
+            for side in (0, 1):
+                width = max([len(s[side]) for s in sides], default=1)
+                array = np.full((len(sides), width), -1, dtype=np.int64)
+                for ii, s in enumerate(sides):
+                    array[ii, : len(s[side])] = s[side]
+                species.append(array)
+            self._reaction_species = (species[0], species[1])
+        return self._reaction_species
+
+    def row_groups(self, row: int) -> List[Tuple[int, int, int]]:
+        """
+        A method to split a row into its columns.
+        :param row: species index
+        :return: [(column, start, stop)], where start:stop is the span of the
+            entries of that column, relative to the start of the row
+        """
+        start, stop = int(self.indptr[row]), int(self.indptr[row + 1])
+        if start == stop:
+            return []
+        cols = self.cols[start:stop]
+        bounds = [0] + (np.flatnonzero(cols[1:] != cols[:-1]) + 1).tolist()
+        bounds.append(stop - start)
+        return [(int(cols[a]), a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def row_reactions(self, row: int) -> Tuple[List[str], List[float]]:
+        """
+        A method to get the reactions of the entries of a row.
+        :param row: species index
+        :return: reaction nodes and free energies of the entries of the row
+        """
+        span = self.row_span(row)
+        nodes = [self.reaction_nodes[r] for r in self.reactions[span]]
+        return nodes, self.free_energies[span].tolist()
+
+    def to_dict(self) -> Dict[int, Dict[int, List[Tuple[str, float, str]]]]:
+        """
+        A method to convert the matrix to nested dictionaries.
+        :return: {r1: {c1: [(reaction node, free energy, kind)]}}
+        """
+        matrix = {}  # type: Dict[int, Dict[int, List[Tuple[str, float, str]]]]
+        for row in range(self.num_species):
+            matrix[row] = {}
+            nodes, free_energies = self.row_reactions(row)
+            kinds = self.kinds[self.indptr[row] : self.indptr[row + 1]].tolist()
+            for col, start, stop in self.row_groups(row):
+                matrix[row][col] = list(
+                    zip(nodes[start:stop], free_energies[start:stop], kinds[start:stop])
+                )
+        return matrix
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ReactionMatrix):
+            return NotImplemented
+        return (
+            self.num_species == other.num_species
+            and np.array_equal(self.indptr, other.indptr)
+            and np.array_equal(self.cols, other.cols)
+            and np.array_equal(self.free_energies, other.free_energies)
+            and np.array_equal(self.kinds, other.kinds)
+            and [self.reaction_nodes[r] for r in self.reactions]
+            == [other.reaction_nodes[r] for r in other.reactions]
+        )
@@ -9,6 +9,7 @@ from functools import reduce
 from typing import Dict, List, Tuple, Union, Any, FrozenSet, Set, TypeVar
 from ast import literal_eval
 import networkx as nx
+import numpy as np
 from monty.json import MSONable
 from monty.serialization import dumpfn, loadfn
 from networkx.readwrite import json_graph
@@ -20,6 +21,12 @@ from mrnet.utils.visualization import (
     latex_emit_reaction,
 )
 
+from mrnet.network.compact_graph import (
+    CompactGraph,
+    nx_multi_source_paths,
+    nx_reachable_sources,
+)
+from mrnet.network.reaction_nodes import ReactionNodeTable, parse_reaction_node
 from mrnet.network.reaction_path import ReactionPath
 from mrnet.network.reaction_generation import ReactionIterator, EntriesBox
 from mrnet.core.mol_entry import MoleculeEntry
@@ -37,6 +44,7 @@ from mrnet.core.reactions import (
     softplus,
     default_cost,
     MetalHopReaction,
+    set_edge_costs,
 )
 from mrnet.utils.classes import load_class
 
@@ -55,6 +63,17 @@ class ReactionNetwork(MSONable):
     Class to build a reaction network from entries
     """
 
+    # defaults for networks pickled before the graph backend option existed
+    graph_backend = "networkx"
+    compact_graph = None  # type: Union[CompactGraph, None]
+    incremental = False
+    top_k_starts = None  # type: Union[int, None]
+    PR_base_weights = None  # type: Union[np.ndarray, None]
+    PR_edge_index = None  # type: Union[Dict[Tuple[int, str], int], None]
+    path_arrays = None  # type: Union[Tuple[List[int], np.ndarray, np.ndarray], None]
+    start_reach = None  # type: Union[Tuple[List[int], Dict[int, int]], None]
+    reaction_nodes = None  # type: Union[ReactionNodeTable, None]
+
     def __init__(
         self,
         reaction_iterator,
@@ -63,6 +82,8 @@ class ReactionNetwork(MSONable):
         solvent_dielectric=18.5,
         solvent_refractive_index=1.415,
         add_concerteds=True,
+        graph_backend="networkx",
+        reaction_node_ids=False,
     ):
         """
         Generate a ReactionNetwork from a set of MoleculeEntries.
@@ -75,17 +96,37 @@ class ReactionNetwork(MSONable):
             and rate constants (in K)
         :param solvent_dielectric: Dielectric constant of the solvent medium
         :param solvent_refractive_index: Refractive index of the solvent medium
+        :param graph_backend: "networkx" (default) to solve paths on
+            ReactionNetwork.graph, or "compact" to solve them on an integer
+            indexed CompactGraph built from it
+        :param reaction_node_ids: if True, number the reaction nodes in a
+            ReactionNodeTable (ReactionNetwork.reaction_nodes, also attached to
+            the graph) holding their reactants and products in arrays, so that
+            paths are characterized and nodes removed without parsing the
+            reaction node strings
         :return:
         """
 
+        if graph_backend not in ("networkx", "compact"):
+            raise ValueError(
+                "graph_backend must be 'networkx' or 'compact', got {}".format(
+                    graph_backend
+                )
+            )
+
         self.electron_free_energy = electron_free_energy
         self.temperature = temperature
         self.solvent_dielectric = solvent_dielectric
         self.solvent_refractive_index = solvent_refractive_index
         self.add_concerteds = add_concerteds
+        self.graph_backend = graph_backend
+        self.compact_graph = None
 
         self.entries_list = reaction_iterator.entries_box.entries_list
         self.graph = nx.DiGraph()
+        if reaction_node_ids:
+            self.reaction_nodes = ReactionNodeTable()
+            self.graph.graph["reaction_nodes"] = self.reaction_nodes
         self.PRs: dict = dict()
         self.reachable_nodes: list = []
         self.unsolvable_PRs: list = []
@@ -109,12 +150,15 @@ class ReactionNetwork(MSONable):
                 product_objects = [self.entries_list[i] for i in reaction[1]]
                 reaction_object = ConcertedReaction(reactant_objects, product_objects)
 
-            self.add_reaction(reaction_object.graph_representation())
+            self.add_reaction(reaction_object.graph_representation(edge_costs=False))
             count += 1
             if not self.add_concerteds:
                 if count == len(reaction_iterator.rn.reactions):
                     break
 
+        # evaluate the cost functions for all the edges at once
+        set_edge_costs(self.graph)
+
         self.PR_record = self.build_PR_record()  # begin creating PR list
         self.Reactant_record = self.build_reactant_record()  # begin creating rct list
 
@@ -150,6 +194,16 @@ class ReactionNetwork(MSONable):
         """
         return default_cost(free_energy)
 
+    @property
+    def path_graph(self) -> Union[nx.DiGraph, CompactGraph]:
+        """
+        The graph paths are solved and characterized on, depending on
+        ReactionNetwork.graph_backend
+        """
+        if self.graph_backend == "compact" and self.compact_graph is not None:
+            return self.compact_graph
+        return self.graph
+
     def add_reaction(self, graph_representation: nx.DiGraph):
         """
             A method to add a single reaction to the ReactionNetwork.graph
@@ -159,6 +213,21 @@ class ReactionNetwork(MSONable):
         """
         self.graph.add_nodes_from(graph_representation.nodes(data=True))
         self.graph.add_edges_from(graph_representation.edges(data=True))
+        if self.reaction_nodes is not None:
+            for node in graph_representation.nodes:
+                if isinstance(node, str):
+                    self.reaction_nodes.add(node)
+
+    def build_compact_graph(self) -> CompactGraph:
+        """
+            A method to build the CSR representation of ReactionNetwork.graph
+            used by the "compact" graph backend
+        :return: CompactGraph
+        """
+        self.compact_graph = CompactGraph(self.graph)
+        self.path_arrays = None
+        self.start_reach = None
+        return self.compact_graph
 
     def build_PR_record(self) -> Mapping_Record_Dict:
         """
@@ -183,6 +252,30 @@ class ReactionNetwork(MSONable):
         self.PR_record = PR_record
         return PR_record
 
+    def build_PR_base_weights(self, weight: str) -> np.ndarray:
+        """
+            A method to record the weights of all the edges in
+            ReactionNetwork.PR_record before any PR cost is added to them, so
+            that update_edge_weights does not need a copy of the graph
+        :param weight: "softplus" or "exponent", type of cost function to use
+            when calculating edge weights
+        :return: read-only array of base weights, indexed by
+            ReactionNetwork.PR_edge_index
+        """
+        if self.PR_record is None:
+            self.PR_record = self.build_PR_record()
+        self.PR_edge_index = {}
+        for PR in self.PR_record:
+            for edge in self.PR_record[PR]:
+                if edge not in self.PR_edge_index:
+                    self.PR_edge_index[edge] = len(self.PR_edge_index)
+        base_weights = np.empty(len(self.PR_edge_index), dtype=np.float64)
+        for (u, v), pos in self.PR_edge_index.items():
+            base_weights[pos] = self.graph[u][v][weight]
+        base_weights.flags.writeable = False
+        self.PR_base_weights = base_weights
+        return base_weights
+
     def build_reactant_record(self) -> Mapping_Record_Dict:
         """
         A method to determine all the reaction nodes that have the same non
@@ -207,6 +300,8 @@ class ReactionNetwork(MSONable):
         starts: List[int],
         weight: str,
         max_iter=25,
+        incremental=False,
+        top_k_starts=None,
     ):  # -> Tuple[Union[Dict[Union[int, Any], dict], Any], Any]:
         """
             A method to solve all of the prerequisites found in
@@ -222,6 +317,15 @@ class ReactionNetwork(MSONable):
             when calculating edge weights
         :param max_iter: maximum number of iterations to try to solve all the
             PRs
+        :param incremental: if True (requires graph_backend="compact"), the
+            shortest paths from the starts are kept between iterations and only
+            repaired around the PR edges whose weights changed, instead of being
+            recomputed from scratch
+        :param top_k_starts: if an integer k, the search from the starts only
+            keeps the k cheapest starts of every node, and only their paths are
+            characterized, see find_path_cost. The solved PRs and their min
+            costs are the same, but PRs[node] lacks the starts which were not
+            needed to solve the node. Not compatible with incremental
         :return: PRs: PR_paths: dict that defines a path from each node to a
             start, of the form {int(node1): {int(start1}: {ReactionPath object},
             int(start2): {ReactionPath object}}, int(node2):...}
@@ -238,7 +342,22 @@ class ReactionNetwork(MSONable):
         self.num_starts = len(starts)
         self.PR_byproducts = {}  # type: Dict[int, Dict[str, int]]
 
-        orig_graph = copy.deepcopy(self.graph)
+        if incremental and self.graph_backend != "compact":
+            raise ValueError("incremental solving requires graph_backend='compact'")
+        if top_k_starts is not None and (incremental or top_k_starts < 1):
+            raise ValueError(
+                "top_k_starts must be a positive integer, and can not be used with "
+                "incremental solving, got {}".format(top_k_starts)
+            )
+        self.incremental = incremental
+        self.top_k_starts = top_k_starts
+        self.path_arrays = None
+        self.start_reach = None
+
+        # base weights of the PR edges, PR costs are added on top of these
+        self.build_PR_base_weights(weight)
+        if self.graph_backend == "compact":
+            self.build_compact_graph()
 
         for start in starts:  # all the molecular nodes
             PRs[start] = {}  # no PRs necessary @init
@@ -290,30 +409,30 @@ class ReactionNetwork(MSONable):
             PRs, cost_from_start, min_cost = self.find_path_cost(
                 starts,
                 weight,
-                old_solved_PRs,
+                set(old_solved_PRs),
                 cost_from_start,
                 min_cost,
                 PRs,
             )
 
-            solved_PRs = copy.deepcopy(old_solved_PRs)
-
             solved_PRs, new_solved_PRs, cost_from_start = self.identify_solved_PRs(
-                PRs, solved_PRs, cost_from_start
+                PRs, old_solved_PRs, cost_from_start
             )
 
             # print(ii, len(old_solved_PRs), len(new_solved_PRs), new_solved_PRs)
-            attrs = self.update_edge_weights(min_cost, orig_graph)
+            attrs = self.update_edge_weights(min_cost)
 
-            self.min_cost = copy.deepcopy(min_cost)
-            old_solved_PRs = copy.deepcopy(solved_PRs)
-            old_attrs = copy.deepcopy(new_attrs)
-            new_attrs = copy.deepcopy(attrs)
+            # min_cost, solved_PRs and attrs are rebuilt every iteration, so
+            # they can be handed over without copying
+            self.min_cost = min_cost
+            old_solved_PRs = solved_PRs
+            old_attrs = new_attrs
+            new_attrs = attrs
 
             print("iteration", ii, "end at", time.time())
             ii += 1
         print("out of while loop at ", time.time())
-        self.solved_PRs = copy.deepcopy(old_solved_PRs)
+        self.solved_PRs = list(old_solved_PRs)
         self.PRs_before_final_check = PRs
 
         PRs = self.final_PR_check(PRs)
@@ -345,14 +464,26 @@ class ReactionNetwork(MSONable):
             A method to characterize the path to all the PRs. Characterize by
             determining if the path exist or not, and
             if so, is it a minimum cost path, and if so set PRs[node][start] = ReactionPath(path)
+
+            The paths from all the starts come from a single search, see
+            start_paths. With ReactionNetwork.top_k_starts = k, only the paths
+            of the k cheapest starts of each node are characterized. A start
+            without a path to a node reached by k starts gets the highest of
+            their costs as its cost_from_start, a lower bound of its own cost.
+            That decides identify_solved_PRs and min_cost the same way as the
+            exact costs whenever one of the k paths is solved at a cost no
+            higher than the bound. The other nodes, and the starts whose paths
+            from earlier iterations are still in PRs, fall back to the exact
+            paths from the remaining starts. The starts not reaching a node at
+            all are told apart with reachable_starts, as they get no path.
         :param starts: List(molecular nodes), list of molecular nodes of type
             int found in the ReactionNetwork.graph
         :param target: a single molecular node of type int found in the
             ReactionNetwork.graph
         :param weight: "softplus" or "exponent", type of cost function to use
             when calculating edge weights
-        :param old_solved_PRs: list of PRs (molecular nodes of type int) that
-            are already solved
+        :param old_solved_PRs: list or set of PRs (molecular nodes of type
+            int) that are already solved, only used for membership tests
         :param cost_from_start: dict of type {node1: {start1: float,
                                                       start2: float},
                                               node2: {...}}
@@ -370,21 +501,164 @@ class ReactionNetwork(MSONable):
         :return: min_cost: updated min_cost based on new PRs solved
         """
 
+        self.num_starts = len(starts)
+        self.unsolvable_PRs_per_start = {start: [] for start in starts}
+        k = self.top_k_starts
+        if k is None or k >= len(starts):
+            self.characterize_start_paths(
+                starts,
+                weight,
+                self.start_paths(starts),
+                old_solved_PRs,
+                cost_from_start,
+                min_cost,
+                PRs,
+            )
+            return PRs, cost_from_start, min_cost
+
+        start_paths = self.start_paths(starts, k)
+        # the highest of the k costs of the nodes reached by k starts
+        bounds = {}  # type: Dict[int, float]
+        num_labels = {}  # type: Dict[int, int]
+        for dist, _ in start_paths.values():
+            for node, cost in dist.items():
+                num_labels[node] = num_labels.get(node, 0) + 1
+                bounds[node] = max(bounds.get(node, cost), cost)
+        reach = self.reachable_starts(starts)
+        lower_bounds = {
+            start: {} for start in starts
+        }  # type: Dict[int, Dict[int, float]]
+        for node, bound in bounds.items():
+            if num_labels[node] == k:
+                for row, start in enumerate(starts):
+                    if reach[node] >> row & 1 and node not in start_paths[start][0]:
+                        lower_bounds[start][node] = bound
+
+        solved_costs = self.characterize_start_paths(
+            starts,
+            weight,
+            start_paths,
+            old_solved_PRs,
+            cost_from_start,
+            min_cost,
+            PRs,
+            lower_bounds=lower_bounds,
+        )
+
+        fallback = {}  # type: Dict[int, Set[int]]
+        for start in starts:
+            for node, bound in lower_bounds[start].items():
+                if node in old_solved_PRs:
+                    continue
+                # a path kept in PRs by an earlier iteration is refreshed too
+                if solved_costs.get(node, np.inf) > bound or start in PRs[node]:
+                    fallback.setdefault(start, set()).add(node)
+        if len(fallback) > 0:
+            self.characterize_start_paths(
+                starts,
+                weight,
+                self.start_paths(starts),
+                old_solved_PRs,
+                cost_from_start,
+                min_cost,
+                PRs,
+                nodes=fallback,
+            )
+
+        return PRs, cost_from_start, min_cost
+
+    def start_paths(
+        self, starts: List[int], k: Union[int, None] = None
+    ) -> Dict[int, Tuple[Dict[int, float], Dict[int, List[Union[int, str]]]]]:
+        """
+            A method to get the costs and paths from every start to the
+            molecule nodes it reaches, from a single multi source search on
+            the graph of ReactionNetwork.graph_backend
+        :param starts: List(molecular nodes), list of molecular nodes of type
+            int found in the ReactionNetwork.graph
+        :param k: number of cheapest starts to keep per node, None for all
+        :return: dict {start: (costs, paths)} with costs of the form
+            {node: float} and paths of the form {node: [start, ..., node]}
+        """
+        if self.graph_backend == "compact":
+            if self.compact_graph is None:
+                self.build_compact_graph()
+            return self.compact_graph.multi_source_paths(  # type: ignore
+                starts,
+                self.weight,
+                arrays=self.shortest_path_arrays(starts) if self.incremental else None,
+                k=k,
+            )
+        return nx_multi_source_paths(self.graph, starts, self.weight, k=k)
+
+    def reachable_starts(self, starts: List[int]) -> Dict[int, int]:
+        """
+            A method to get the starts reaching every molecule node, from a
+            single search on the graph of ReactionNetwork.graph_backend. Only
+            the edges matter, so it is computed once per solve_prerequisites
+        :param starts: List(molecular nodes), list of molecular nodes of type
+            int found in the ReactionNetwork.graph
+        :return: dict {node: bit mask with the bit ii set if starts[ii] reaches
+            the node}
+        """
+        if self.start_reach is None or self.start_reach[0] != list(starts):
+            if self.graph_backend == "compact":
+                if self.compact_graph is None:
+                    self.build_compact_graph()
+                reach = self.compact_graph.reachable_sources(starts)  # type: ignore
+            else:
+                reach = nx_reachable_sources(self.graph, starts)
+            self.start_reach = (list(starts), reach)
+        return self.start_reach[1]
+
+    def characterize_start_paths(
+        self,
+        starts,
+        weight,
+        start_paths,
+        old_solved_PRs,
+        cost_from_start,
+        min_cost,
+        PRs,
+        lower_bounds=None,
+        nodes=None,
+    ) -> Dict[int, float]:
+        """
+            A method to characterize the paths from the starts, as returned by
+            start_paths, and record them in PRs, cost_from_start and min_cost
+            for find_path_cost
+        :param start_paths: dict {start: (costs, paths)}
+        :param lower_bounds: dict {start: {node: float}} of the nodes the
+            start reaches but whose path was not kept. The start gets the bound
+            as its cost_from_start, instead of having no path
+        :param nodes: dict {start: set of molecular nodes}, to only
+            characterize those paths. None for all
+        :return: solved_costs: dict {node: float} with the lowest cost of the
+            characterized paths to each node with no unsolved prereqs
+        """
+        if lower_bounds is None:
+            lower_bounds = {}
         not_reachable_nodes_for_start = {}
 
         wrong_paths = {}
         dist_and_path = {}
-        self.num_starts = len(starts)
         for start in starts:
             not_reachable_nodes_for_start[start] = []
-            dist, paths = nx.algorithms.shortest_paths.weighted.single_source_dijkstra(
-                self.graph, start, weight=self.weight
-            )
+            dist, paths = start_paths[start]
+            if nodes is None:
+                start_nodes = range(len(self.entries_list))
+            else:
+                start_nodes = sorted(nodes.get(start, ()))
+                paths = {node: paths[node] for node in start_nodes if node in paths}
             dist_and_path[start] = {}
             wrong_paths[start] = []
-            for node in range(len(self.entries_list)):
+            for node in start_nodes:
                 if node not in paths.keys():
-                    not_reachable_nodes_for_start[start].append(int(node))
+                    if node in lower_bounds.get(start, ()):
+                        if node not in old_solved_PRs:
+                            cost_from_start[node][start] = lower_bounds[start][node]
+                    else:
+                        not_reachable_nodes_for_start[start].append(int(node))
             for node in paths:
                 if self.graph.nodes[node]["bipartite"] == 0:  # molecule node
                     if node not in self.reachable_nodes:
@@ -396,7 +670,7 @@ class ReactionNetwork(MSONable):
                     this_path = ReactionPath.characterize_path(
                         paths[node],
                         weight,
-                        self.graph,
+                        self.path_graph,
                     )
                     if node in this_path.all_prereqs:
                         wrong_paths[start].append(int(node))
@@ -421,27 +695,31 @@ class ReactionNetwork(MSONable):
             for node in wrong_paths[start]:
                 fixed_paths[start][node] = {}
                 try:
-                    (
-                        length,
-                        dij_path,
-                    ) = nx.algorithms.simple_paths._bidirectional_dijkstra(
-                        self.graph,
-                        source=hash(start),
-                        target=hash(node),
-                        ignore_nodes=self.find_or_remove_bad_nodes(
-                            [node] + self.not_reachable_nodes
-                        ),
-                        weight=self.weight,
+                    bad_nodes = self.find_or_remove_bad_nodes(
+                        [node] + self.not_reachable_nodes
                     )
+                    if self.graph_backend == "compact":
+                        length, dij_path = self.compact_graph.shortest_path(
+                            start, node, self.weight, ignore_nodes=bad_nodes
+                        )
+                    else:
+                        (
+                            length,
+                            dij_path,
+                        ) = nx.algorithms.simple_paths._bidirectional_dijkstra(
+                            self.graph,
+                            source=hash(start),
+                            target=hash(node),
+                            ignore_nodes=bad_nodes,
+                            weight=self.weight,
+                        )
                     fixed_paths[start][node]["cost"] = length
                     fixed_paths[start][node]["path"] = dij_path
                 except nx.exception.NetworkXNoPath:
                     fixed_paths[start][node]["cost"] = "no_cost"
                     fixed_paths[start][node]["path"] = "no_path"
 
-        self.unsolvable_PRs_per_start = {}
         for start in starts:
-            self.unsolvable_PRs_per_start[start] = []
             for node in fixed_paths[start]:
                 if fixed_paths[start][node]["path"] == "no_path":
                     dist_and_path[start][node] = {}
@@ -461,6 +739,7 @@ class ReactionNetwork(MSONable):
                 )
             }
 
+        solved_costs = {}  # type: Dict[int, float]
         for start in starts:
             for node in dist_and_path[start]:
                 if node not in old_solved_PRs:
@@ -473,12 +752,15 @@ class ReactionNetwork(MSONable):
                         path_class = ReactionPath.characterize_path(
                             dist_and_path[start][node]["path"],
                             weight,
-                            self.graph,
+                            self.path_graph,
                             old_solved_PRs,
                         )
                         cost_from_start[node][start] = path_class.cost
                         if len(path_class.unsolved_prereqs) == 0:
                             PRs[node][start] = path_class
+                            solved_costs[node] = min(
+                                solved_costs.get(node, np.inf), path_class.cost
+                            )
                         if path_class.cost < min_cost[node]:
                             min_cost[node] = path_class.cost
                             self.PR_byproducts[node][
@@ -486,7 +768,34 @@ class ReactionNetwork(MSONable):
                             ] = path_class.byproducts
                             self.PR_byproducts[node]["start"] = start
 
-        return PRs, cost_from_start, min_cost
+        return solved_costs
+
+    def shortest_path_arrays(self, starts: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            A method to get the shortest path costs and predecessors from all
+            the starts on the compact graph. They are computed once and then
+            only repaired around the edges whose weights changed since the
+            previous call.
+        :param starts: List(molecular nodes), list of molecular nodes of type
+            int found in the ReactionNetwork.graph
+        :return: dist: array of shape (len(starts), number of nodes)
+        :return: predecessors: array of shape (len(starts), number of nodes)
+        """
+        compact_graph = self.compact_graph
+        if compact_graph is None:
+            compact_graph = self.build_compact_graph()
+        changed_edges = compact_graph.pop_changed_edges(self.weight)
+        if self.path_arrays is None or self.path_arrays[0] != list(starts):
+            dist, predecessors = compact_graph.multi_source_dijkstra(
+                starts, self.weight
+            )
+            self.path_arrays = (list(starts), dist, predecessors)
+        else:
+            _, dist, predecessors = self.path_arrays
+            compact_graph.repair_shortest_paths(
+                dist, predecessors, self.weight, changed_edges
+            )
+        return dist, predecessors
 
     def identify_solved_PRs(self, PRs, solved_PRs, cost_from_start):
         """
@@ -508,9 +817,10 @@ class ReactionNetwork(MSONable):
             new PRs solved during current iteration
         """
         new_solved_PRs = []
+        already_solved = set(solved_PRs)
 
         for PR in PRs:
-            if PR not in solved_PRs:
+            if PR not in already_solved:
                 if len(PRs[PR].keys()) == self.num_starts:
                     new_solved_PRs.append(PR)
                 else:
@@ -539,7 +849,7 @@ class ReactionNetwork(MSONable):
     def update_edge_weights(
         self,
         min_cost: Dict[int, float],
-        orig_graph: nx.DiGraph,
+        orig_graph: Union[nx.DiGraph, None] = None,
     ):
         """
             A method to update the ReactionNetwork.graph edge weights based on
@@ -548,7 +858,8 @@ class ReactionNetwork(MSONable):
             from {node: float}, if no path exist, value is "no_path", if path
             is unsolved yet, value is "unsolved_path"
         :param orig_graph: ReactionNetwork.graph of type nx.Digraph before the
-            start of current iteration of updates
+            start of current iteration of updates. If None, the base weights
+            recorded by build_PR_base_weights are used instead
         :return: attrs: dict of form {(node1, node2), {"softplus": float,
                                                        "exponent": float,
                                                        "weight: 1},
@@ -559,19 +870,22 @@ class ReactionNetwork(MSONable):
             self.graph = self.build()
         if self.PR_record is None:
             self.PR_record = self.build_PR_record()
+        if orig_graph is None:
+            if self.PR_base_weights is None or self.PR_edge_index is None:
+                self.build_PR_base_weights(self.weight)
+            base_weights = self.PR_base_weights
+            edge_index = self.PR_edge_index
         attrs = {}
         for PR_ind in min_cost:  # all PRs in path
             for weighted_edge in self.PR_record[PR_ind]:  # all edges with this PR
-                # split = weighted_edge.split(",")
-                # u = split[0]
-                # v = split[1]
-                attrs[weighted_edge] = {
-                    self.weight: orig_graph[weighted_edge[0]][weighted_edge[1]][
-                        self.weight
-                    ]
-                    + min_cost[PR_ind]
-                }
+                if orig_graph is None:
+                    base = float(base_weights[edge_index[weighted_edge]])  # type: ignore
+                else:
+                    base = orig_graph[weighted_edge[0]][weighted_edge[1]][self.weight]
+                attrs[weighted_edge] = {self.weight: base + min_cost[PR_ind]}
         nx.set_edge_attributes(self.graph, attrs)
+        if self.compact_graph is not None:
+            self.compact_graph.set_edge_weights(attrs)
         return attrs
 
     def final_PR_check(self, PRs: Mapping_PR_Dict):
@@ -629,27 +943,36 @@ class ReactionNetwork(MSONable):
         """
         for n in node_ind:
             self.graph.remove_node(n)
-            nodes = list(self.graph.nodes)
-            for node in nodes:
-                if self.graph.nodes[node]["bipartite"] == 1:
-                    reactants = node.split(",")[0].split("+")
-                    products = node.split(",")[1].split("+")
-                    if str(n) in products:
-                        if len(reactants) == 2:
-                            other_reac = [int(r) for r in reactants if r != node]
-                            assert len(other_reac) == 1
-                            self.PR_record[other_reac[0]].remove(node)
-                            self.graph.remove_node(node)
-                            self.PR_record.pop(node, None)
-                    elif str(n) in reactants:
-                        if len(reactants) == 2:
-                            other_reac = [int(r) for r in reactants if r != node]
-                            assert len(other_reac) == 1
-                            self.PR_record[other_reac[0]].remove(node)
-                        self.Reactant_record.pop(node, None)
-                        self.graph.remove_node(node)
-            self.PR_record.pop(n, None)
-            self.Product_record.pop(n, None)
+            if self.reaction_nodes is not None:
+                removed = self.reaction_nodes.reactions_with(n)
+            else:
+                removed = [
+                    node
+                    for node in self.graph.nodes
+                    if isinstance(node, str)
+                    and any(n in species for species in parse_reaction_node(node))
+                ]
+            for node in removed:
+                self.graph.remove_node(node)
+                if self.reaction_nodes is not None:
+                    self.reaction_nodes.remove(node)
+
+            removed_set = set(removed)
+            for record in (self.PR_record, self.Reactant_record):
+                record.pop(n, None)
+                for species in record:
+                    if any(edge[1] in removed_set for edge in record[species]):
+                        record[species] = [
+                            edge
+                            for edge in record[species]
+                            if edge[1] not in removed_set
+                        ]
+
+        # the CSR arrays and the shortest paths on them still hold the removed
+        # nodes, they are rebuilt from self.graph when next needed
+        self.compact_graph = None
+        self.path_arrays = None
+        self.start_reach = None
 
     def find_or_remove_bad_nodes(
         self, nodes: List[int], remove_nodes=False
@@ -696,6 +1019,15 @@ class ReactionNetwork(MSONable):
         :param PRs: not used currently?
         :return: nx.path_generator of type generator
         """
+        if self.graph_backend == "compact":
+            compact_graph = self.compact_graph
+            if compact_graph is None:
+                compact_graph = self.build_compact_graph()
+            bad_nodes = self.find_or_remove_bad_nodes([target])
+            return compact_graph.shortest_simple_paths(
+                start, target, self.weight, ignore_nodes=bad_nodes + list(PRs)
+            )
+
         valid_graph = self.find_or_remove_bad_nodes([target], remove_nodes=True)
         valid_graph.remove_nodes_from(PRs)  # type: ignore
 
@@ -0,0 +1,173 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+__author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith, Daniel Barter"
+__maintainer__ = "Daniel Barter"
+
+
+def format_reaction_node(reactants: Iterable[int], products: Iterable[int]) -> str:
+    """
+    A function to format the label of a reaction node.
+    :param reactants: reactant molecule nodes, ex [1, 2], entries < 0 are skipped
+    :param products: product molecule nodes, ex [3]
+    :return: reaction node label, ex "1+2,3"
+    """
+    return (
+        "+".join([str(r) for r in reactants if r >= 0])
+        + ","
+        + "+".join([str(p) for p in products if p >= 0])
+    )
+
+
+def parse_reaction_node(node: str) -> Tuple[List[int], List[int]]:
+    """
+    A function to parse the label of a reaction node, in the order of the label.
+    :param node: reaction node label, ex "1+2,3"
+    :return: reactants: list of reactant molecule nodes, ex [1, 2]
+    :return: products: list of product molecule nodes, ex [3]
+    """
+    reactants, products = node.split(",")
+    return (
+        [int(r) for r in reactants.split("+")],
+        [int(p) for p in products.split("+")],
+    )
+
+
+class ReactionNodeTable:
+    """
+    Side table numbering the reaction nodes of a ReactionNetwork.graph 0, 1, 2, ...
+    in the order they are added, with their reactants and products stored in
+    integer arrays padded with -1, so that the species of a reaction node never
+    have to be parsed from its "1+2,3" label again.
+
+    The graph itself stays labeled with the strings: whether a node is an int or a
+    str is what tells molecule nodes and reaction nodes apart throughout mrnet.
+    The table is attached to the graph as graph.graph["reaction_nodes"], where
+    ReactionPath and CompactGraph pick it up. Removed reaction nodes keep their id.
+
+    :param width: maximum number of reactants (and of products) of a reaction
+    """
+
+    def __init__(self, width: int = 3):
+        self.index = {}  # type: Dict[str, int]
+        self.num_reactions = 0
+        self.width = width
+        # reactants in the first width columns, products in the last width
+        self._species = np.full((16, 2 * width), -1, dtype=np.int64)
+        self._removed = np.zeros(16, dtype=bool)
+
+    @classmethod
+    def from_graph(cls, graph) -> "ReactionNodeTable":
+        """
+        A method to build the table of the reaction nodes of a graph, in the order
+        of graph.nodes.
+        :param graph: nx.DiGraph with int molecule nodes and str reaction nodes
+        :return: ReactionNodeTable
+        """
+        table = cls()
+        for node in graph.nodes:
+            if isinstance(node, str):
+                table.add(node)
+        return table
+
+    @property
+    def reactants(self) -> np.ndarray:
+        """
+        reactants of every reaction node, of shape (num_reactions, width)
+        """
+        return self._species[: self.num_reactions, : self.width]
+
+    @property
+    def products(self) -> np.ndarray:
+        """
+        products of every reaction node, of shape (num_reactions, width)
+        """
+        return self._species[: self.num_reactions, self.width :]
+
+    @property
+    def removed(self) -> np.ndarray:
+        """
+        mask of the reaction nodes which have been removed from the graph
+        """
+        return self._removed[: self.num_reactions]
+
+    def __len__(self) -> int:
+        return self.num_reactions
+
+    def __contains__(self, label) -> bool:
+        return label in self.index
+
+    def add(self, label: str) -> int:
+        """
+        A method to add a reaction node to the table. The label is parsed once,
+        here.
+        :param label: reaction node label, ex "1+2,3"
+        :return: id of the reaction node
+        """
+        if label in self.index:
+            return self.index[label]
+        reactants, products = parse_reaction_node(label)
+        if len(reactants) > self.width or len(products) > self.width:
+            raise ValueError(
+                "reaction node {} has more than {} reactants or products".format(
+                    label, self.width
+                )
+            )
+        node_id = self.num_reactions
+        if node_id == len(self._removed):
+            self._species = np.concatenate(
+                [self._species, np.full_like(self._species, -1)]
+            )
+            self._removed = np.concatenate(
+                [self._removed, np.zeros_like(self._removed)]
+            )
+        self._species[node_id, : len(reactants)] = reactants
+        self._species[node_id, self.width : self.width + len(products)] = products
+        self.index[label] = node_id
+        self.num_reactions += 1
+        return node_id
+
+    def node_id(self, label: str) -> int:
+        return self.index[label]
+
+    def label(self, node_id: int) -> str:
+        """
+        A method to format the legacy label of a reaction node.
+        :param node_id: id of the reaction node
+        :return: reaction node label, ex "1+2,3"
+        """
+        species = self._species[node_id].tolist()
+        return format_reaction_node(species[: self.width], species[self.width :])
+
+    def species(self, label: str) -> Tuple[List[int], List[int]]:
+        """
+        A method to look up the reactants and products of a reaction node.
+        :param label: reaction node label, ex "1+2,3"
+        :return: reactants: list of reactant molecule nodes, ex [1, 2]
+        :return: products: list of product molecule nodes, ex [3]
+        """
+        species = self._species[self.index[label]].tolist()
+        return (
+            [r for r in species[: self.width] if r >= 0],
+            [p for p in species[self.width :] if p >= 0],
+        )
+
+    def reactions_with(self, species: int) -> List[str]:
+        """
+        A method to find the reaction nodes, not yet removed, which have a
+        species as a reactant or a product.
+        :param species: molecule node
+        :return: labels of the reaction nodes, in order of their ids
+        """
+        found = (self.reactants == species).any(axis=1)
+        found |= (self.products == species).any(axis=1)
+        found &= ~self.removed
+        return [self.label(node_id) for node_id in np.flatnonzero(found)]
+
+    def remove(self, label: str):
+        """
+        A method to mark a reaction node as removed from the graph.
+        :param label: reaction node label
+        """
+        self._removed[self.index[label]] = True
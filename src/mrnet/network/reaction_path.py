@@ -9,6 +9,8 @@ from mrnet.core.reactions import (
     softplus,
     default_cost,
 )
+from mrnet.network.compact_graph import CompactGraph
+from mrnet.network.reaction_nodes import parse_reaction_node
 from mrnet.utils.classes import load_class
 
 __author__ = "Sam Blau, Hetal Patel, Xiaowei Xie, Evan Spotte-Smith"
@@ -113,7 +115,7 @@ class ReactionPath(MSONable):
         cls,
         path: List[Union[str, int]],
         weight: str,
-        graph: nx.DiGraph,
+        graph: Union[nx.DiGraph, CompactGraph],
         old_solved_PRs=[],
     ):  # -> ReactionPath
         """
@@ -122,7 +124,7 @@ class ReactionPath(MSONable):
         :param path: a list of nodes that defines a path from node A to B
             within a graph built using ReactionNetwork.build()
         :param weight: string (either "softplus" or "exponent")
-        :param graph: nx.Digraph
+        :param graph: nx.Digraph or CompactGraph
         :param old_solved_PRs: previously solved PRs from the iterations before
             the current iteration
         :return: ReactionPath object
@@ -135,45 +137,30 @@ class ReactionPath(MSONable):
             pool.append(path[0])
             for ii, step in enumerate(path):
                 if ii != len(path) - 1:
-                    class_instance.cost += graph[step][path[ii + 1]][weight]
+                    if isinstance(graph, CompactGraph):
+                        class_instance.cost += graph.edge_weight(
+                            step, path[ii + 1], weight
+                        )
+                    else:
+                        class_instance.cost += graph[step][path[ii + 1]][weight]
                     if isinstance(step, str):  # REACTION NODE
-                        reactants = step.split(",")[0]
-                        # products = step.split(",")[1]
-                        if "+" in reactants:  # prs for this reaction
-                            prod = []  # type: List[Union[str, int]]
-                            a = path[ii - 1]  # source reactant (non-pr)
-                            rct_indices = list(reactants.split("+"))
-                            rct_indices.remove(str(a))
-                            a = int(a)
-                            pr = int(rct_indices[0])
-                            if "+" in step.split(",")[1]:
-                                c = int(step.split(",")[1].split("+")[0])
-                                d = int(step.split(",")[1].split("+")[1])
-                                prod = [c, d]
-                            else:
-                                c = int(step.split(",")[1])
-                                prod = [c]
+                        reactants, products = cls.reaction_species(step, graph)
+                        if len(reactants) > 1:  # prs for this reaction
+                            a = int(path[ii - 1])  # source reactant (non-pr)
+                            rct_indices = list(reactants)
+                            rct_indices.remove(a)
+                            pr = rct_indices[0]
                             if pr in old_solved_PRs:
                                 class_instance.solved_prereqs.append(pr)
                             else:
                                 class_instance.unsolved_prereqs.append(pr)
                             class_instance.all_prereqs.append(pr)
                             pool.remove(a)
-                            pool = pool + prod
-                        elif "+" in step.split(",")[1]:
-                            # node = A,B+C
-                            a = int(step.split(",")[0])
-                            b = int(step.split(",")[1].split("+")[0])
-                            c = int(step.split(",")[1].split("+")[1])
-                            pool.remove(a)
-                            pool.append(b)
-                            pool.append(c)
+                            pool.extend(products)
                         else:
-                            # node = A,B
-                            a = int(step.split(",")[0])
-                            b = int(step.split(",")[1])
-                            pool.remove(a)
-                            pool.append(b)
+                            # node = A,B or A,B+C
+                            pool.remove(reactants[0])
+                            pool.extend(products)
         pool.remove(class_instance.path[-1])
         class_instance.byproducts = pool
         class_instance.path_dict = {
@@ -310,6 +297,26 @@ class ReactionPath(MSONable):
         }
         return class_instance
 
+    @staticmethod
+    def reaction_species(
+        node: str, graph: Union[nx.DiGraph, CompactGraph]
+    ) -> Tuple[List[int], List[int]]:
+        """
+            A method to get the reactants and products of a reaction node. A
+            CompactGraph answers from its side table, and so does an nx.DiGraph
+            carrying a ReactionNodeTable, otherwise the node string is parsed.
+        :param node: reaction node, ex "1+2,3"
+        :param graph: nx.Digraph or CompactGraph
+        :return: reactants: list of reactant molecule nodes, ex [1, 2]
+        :return: products: list of product molecule nodes, ex [3]
+        """
+        if isinstance(graph, CompactGraph):
+            return graph.reaction_species(node)  # type: ignore
+        table = graph.graph.get("reaction_nodes")
+        if table is not None:
+            return table.species(node)
+        return parse_reaction_node(node)
+
     def __eq__(self, obj):
         if type(self) == type(obj):
             return self.as_dict() == obj.as_dict()
@@ -1,11 +1,15 @@
-from typing import Tuple, List, Dict, TextIO
+from typing import Any, Tuple, List, Dict, Iterable, Optional, Sequence, TextIO, Union
 import pickle
 import os
-import copy
 import sqlite3
+import tempfile
+import zlib
+import itertools
+from collections import deque
 from multiprocessing import Pool
 import numpy as np
 from functools import partial
+from scipy.sparse import csr_matrix
 
 from mrnet.core.mol_entry import MoleculeEntry
 from mrnet.utils.visualization import (
@@ -19,7 +23,12 @@ from mrnet.utils.visualization import (
 )
 
 from mrnet.core.reactions import default_cost
-from mrnet.stochastic.serialize import rate
+from mrnet.stochastic.serialize import rates
+from mrnet.stochastic.histories import (
+    HistoryFiles,
+    HistorySequence,
+    SimulationHistories,
+)
 from mrnet.network.reaction_generation import EntriesBox
 
 get_metadata = """
@@ -41,6 +50,25 @@ def get_reaction(n: int):
     )
 
 
+def get_reaction_columns(shard: int):
+    return (
+        """
+    SELECT reaction_id,
+           reactant_1,
+           reactant_2,
+           product_1,
+           product_2,
+           dG
+    FROM reactions_"""
+        + str(shard)
+        + ";"
+    )
+
+
+def get_free_energies(shard: int):
+    return "SELECT reaction_id, dG FROM reactions_" + str(shard) + ";"
+
+
 def update_rate(shard: int):
     return (
         "UPDATE reactions_"
@@ -52,52 +80,65 @@ def update_rate(shard: int):
     )
 
 
-def does_reaction_exist(n):
-    return (
-        "SELECT reaction_id FROM reactions_" + str(n) + " WHERE reaction_string = ?1;"
-    )
+def get_reaction_strings(shard: int):
+    return "SELECT reaction_id, reaction_string FROM reactions_" + str(shard) + ";"
 
 
-def get_reaction_string(n: int):
-    return (
-        """
-    SELECT reaction_string
-    FROM reactions_"""
-        + str(n)
-        + " WHERE reaction_id = ?1;"
+def partition_file(partition_folder: str, partition: int, shard: int) -> str:
+    return os.path.join(
+        partition_folder, "partition_{}_shard_{}".format(partition, shard)
     )
 
 
-def find_duplicate_reactions(
+def partition_reaction_strings(
     db_path: str,
-    shard_size: int,
-    number_of_shards: int,
-    number_of_reactions: int,
+    partition_folder: str,
+    number_of_partitions: int,
+    batch_size: int,
     shard: int,
 ):
-    repeats = []
+    """
+    stream the (reaction_id, reaction_string) pairs of a shard into
+    number_of_partitions files, so that equal reaction strings always end up
+    in the same partition. crc32 is used rather than hash, since hash of a str
+    differs between processes.
+    """
     con = sqlite3.connect(db_path)
     cur = con.cursor()
-    get_reaction_string_sql = get_reaction_string(shard)
-
-    does_reaction_exist_sql = []
-    for i in range(number_of_shards):
-        does_reaction_exist_sql.append(does_reaction_exist(i))
-
-    base_index = shard * shard_size
-    top_index = min(number_of_reactions, (shard + 1) * shard_size)
-    for index in range(base_index, top_index):
-        duplicate_indices = []
-        reaction_string = list(cur.execute(get_reaction_string_sql, (index,)))[0][0]
-
-        for sql in does_reaction_exist_sql:
-            for row in cur.execute(sql, (reaction_string,)):
-                duplicate_indices.append(row[0])
-
-        if len(duplicate_indices) != 1:
-            repeats.append(sorted(duplicate_indices))
+    files = [
+        open(partition_file(partition_folder, p, shard), "w")
+        for p in range(number_of_partitions)
+    ]
+    try:
+        cur.execute(get_reaction_strings(shard))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if len(rows) == 0:
+                break
+            for reaction_id, reaction_string in rows:
+                partition = zlib.crc32(reaction_string.encode()) % number_of_partitions
+                files[partition].write(reaction_string + "\t" + str(reaction_id) + "\n")
+    finally:
+        for f in files:
+            f.close()
+        con.close()
+
+
+def duplicates_in_partition(
+    partition_folder: str, number_of_shards: int, partition: int
+) -> List[List[int]]:
+    """
+    group the reaction ids of one partition by reaction string. only one
+    partition is held in memory at a time.
+    """
+    groups = {}  # type: Dict[str, List[int]]
+    for shard in range(number_of_shards):
+        with open(partition_file(partition_folder, partition, shard)) as f:
+            for line in f:
+                reaction_string, reaction_id = line.split("\t")
+                groups.setdefault(reaction_string, []).append(int(reaction_id))
 
-    return repeats
+    return [sorted(ids) for ids in groups.values() if len(ids) > 1]
 
 
 class NetworkUpdater:
@@ -129,47 +170,95 @@ class NetworkUpdater:
             self.get_reactions_sql[i] = get_reaction(i)
 
     def update_rates(self, pairs: List[Tuple[int, float]]):
-        cur = self.connection.cursor()
+        """
+        set the rates of (reaction index, rate) pairs, with one executemany
+        per shard in a single transaction.
+        """
+        by_shard = {}  # type: Dict[int, List[Tuple[float, int]]]
         for (index, r) in pairs:
             shard = index // self.shard_size
-            cur.execute(self.update_rates_sql[shard], (r, index))
+            by_shard.setdefault(shard, []).append((r, index))
+
+        cur = self.connection.cursor()
+        for shard, rows in by_shard.items():
+            cur.executemany(self.update_rates_sql[shard], rows)
 
         self.connection.commit()
 
     def recompute_all_rates(
-        self, temperature, constant_barrier, commit_frequency=10000
+        self,
+        temperature,
+        constant_barrier,
+        commit_frequency=None,
+        batch_size=1 << 16,
     ):
+        """
+        recompute the rate of every reaction from its dG. the dG column of a
+        shard is streamed into an array batch_size rows at a time, and the
+        rates of the whole shard are computed together by rates. they are
+        written back with executemany and committed every commit_frequency
+        rows, or once per shard if commit_frequency is None.
+        """
         cur = self.connection.cursor()
 
-        for index in range(self.number_of_reactions):
-            shard = index // self.shard_size
-            res = list(cur.execute(self.get_reactions_sql[shard], (int(index),)))[0]
-            dG = res[4]
-            new_rate = rate(dG, temperature, constant_barrier)
-            cur.execute(self.update_rates_sql[shard], (new_rate, index))
+        for shard in range(self.number_of_shards):
+            cur.execute(get_free_energies(shard))
+            blocks = []
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                blocks.append(np.array(rows, dtype=np.float64))
+            if len(blocks) == 0:
+                continue
 
-            if index % commit_frequency == 0:
+            block = np.concatenate(blocks)
+            reaction_ids = block[:, 0].astype(np.int64).tolist()
+            new_rates = rates(block[:, 1], temperature, constant_barrier).tolist()
+            step = commit_frequency or len(reaction_ids)
+            for start in range(0, len(reaction_ids), step):
+                cur.executemany(
+                    self.update_rates_sql[shard],
+                    zip(
+                        new_rates[start : start + step],
+                        reaction_ids[start : start + step],
+                    ),
+                )
                 self.connection.commit()
 
-        self.connection.commit()
-
-    def find_duplicates(self):
-        f = partial(
-            find_duplicate_reactions,
-            self.network_folder + self.db_postfix,
-            self.shard_size,
-            self.number_of_shards,
-            self.number_of_reactions,
-        )
+    def find_duplicates(
+        self, number_of_partitions: int = 16, batch_size: int = 1 << 16
+    ):
+        """
+        find the groups of reactions with the same reaction string. every
+        shard is read once, in a single streaming query, and its
+        (reaction_id, reaction_string) pairs are hash partitioned into files
+        in a temporary folder next to the database. the partitions are then
+        grouped independently, so only one partition is ever in memory. both
+        passes run on number_of_threads processes.
+        returns a set of tuples of sorted reaction ids.
+        """
+        with tempfile.TemporaryDirectory(dir=self.network_folder) as partition_folder:
+            partition = partial(
+                partition_reaction_strings,
+                self.network_folder + self.db_postfix,
+                partition_folder,
+                number_of_partitions,
+                batch_size,
+            )
+            group = partial(
+                duplicates_in_partition, partition_folder, self.number_of_shards
+            )
 
-        with Pool(self.number_of_threads) as p:
-            repeats_unordered = p.map(f, range(self.number_of_shards))
+            with Pool(self.number_of_threads) as p:
+                p.map(partition, range(self.number_of_shards))
+                repeats_unordered = p.map(group, range(number_of_partitions))
 
         repeated = set()
 
         for xs in repeats_unordered:
             for x in xs:
-                repeated.add(tuple(sorted(x)))
+                repeated.add(tuple(x))
 
         return repeated
 
@@ -187,6 +276,565 @@ class NetworkUpdater:
         self.update_rates(update_list)
 
 
+class ReactionTable:
+    """
+    reactants, products and dG of every reaction of a sharded database in
+    numpy arrays, indexed by reaction id. the columns of a shard are read in
+    a single streaming query, either all up front with load_all or the first
+    time a reaction of the shard is looked up. the arrays are allocated
+    empty and the rows of a shard are only written when it is loaded, so the
+    memory of the shards that are never loaded is not touched. the rows of
+    those shards are undefined.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        number_of_reactions: int,
+        shard_size: int,
+        number_of_shards: int,
+        batch_size: int = 1 << 16,
+    ):
+        self.connection = connection
+        self.shard_size = shard_size
+        self.number_of_shards = number_of_shards
+        self.batch_size = batch_size
+        self.reactants = np.empty((number_of_reactions, 2), dtype=np.int32)
+        self.products = np.empty((number_of_reactions, 2), dtype=np.int32)
+        self.dG = np.empty(number_of_reactions)
+        self.loaded_shards = np.zeros(number_of_shards, dtype=bool)
+
+    def load_shard(self, shard: int):
+        # absent reactants and products are -1, as in the database
+        rows = slice(shard * self.shard_size, (shard + 1) * self.shard_size)
+        self.reactants[rows] = -1
+        self.products[rows] = -1
+        self.dG[rows] = np.nan
+
+        cur = self.connection.cursor()
+        cur.execute(get_reaction_columns(shard))
+        while True:
+            rows = cur.fetchmany(self.batch_size)
+            if len(rows) == 0:
+                break
+            # species indices are exact as float64
+            block = np.array(rows, dtype=np.float64)
+            ids = block[:, 0].astype(np.int64)
+            self.reactants[ids] = block[:, 1:3]
+            self.products[ids] = block[:, 3:5]
+            self.dG[ids] = block[:, 5]
+        self.loaded_shards[shard] = True
+
+    def load_all(self):
+        for shard in range(self.number_of_shards):
+            if not self.loaded_shards[shard]:
+                self.load_shard(shard)
+
+    def reaction(self, reaction_index: int) -> dict:
+        shard = reaction_index // self.shard_size
+        if not self.loaded_shards[shard]:
+            self.load_shard(shard)
+        return {
+            "reactants": [int(i) for i in self.reactants[reaction_index] if i >= 0],
+            "products": [int(i) for i in self.products[reaction_index] if i >= 0],
+            "dG": float(self.dG[reaction_index]),
+        }
+
+
+class NegativeStateError(ValueError):
+    def __init__(self, species: int, time: float, step: int, reaction: int):
+        super().__init__(
+            "negative specie {}, time {}, step {}, reaction {}".format(
+                species, time, step, reaction
+            )
+        )
+        self.species = species
+        self.time = time
+        self.step = step
+        self.reaction = reaction
+
+
+def incidence_matrices(
+    table: ReactionTable, number_of_species: int
+) -> Tuple[csr_matrix, csr_matrix]:
+    """
+    sparse reactions x species matrices of the number of molecules of each
+    species a reaction consumes (its reactants) and produces (its products).
+    """
+    number_of_reactions = len(table.dG)
+    rows = np.arange(number_of_reactions).repeat(2)
+    matrices = []
+    for species in (table.reactants, table.products):
+        cols = species.ravel().astype(np.int64)
+        present = cols >= 0
+        # duplicate (row, col) entries are summed, A + A -> B consumes 2 A
+        matrices.append(
+            csr_matrix(
+                (
+                    np.ones(np.count_nonzero(present), dtype=np.int64),
+                    (rows[present], cols[present]),
+                ),
+                shape=(number_of_reactions, number_of_species),
+            )
+        )
+    return matrices[0], matrices[1]
+
+
+def stoichiometry_matrix(table: ReactionTable, number_of_species: int) -> csr_matrix:
+    """
+    sparse reactions x species matrix of the net number of molecules of each
+    species a reaction produces (products minus reactants).
+    """
+    consumed, produced = incidence_matrices(table, number_of_species)
+    stoichiometry = produced - consumed
+    stoichiometry.eliminate_zeros()
+    return stoichiometry
+
+
+def reaction_counts(
+    histories: Union[SimulationHistories, HistoryFiles], number_of_reactions: int
+) -> csr_matrix:
+    """
+    sparse simulations x reactions matrix of the number of times each
+    reaction fired in each simulation, built one history at a time.
+    """
+    indptr = [0]
+    indices = []
+    data = []
+    for i in range(len(histories)):
+        fired, counts = np.unique(histories.reaction_history(i), return_counts=True)
+        indices.append(fired.astype(np.int64))
+        data.append(counts.astype(np.int64))
+        indptr.append(indptr[-1] + len(fired))
+
+    return csr_matrix(
+        (
+            np.concatenate(data or [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(indices or [np.zeros(0, dtype=np.int64)]),
+            np.array(indptr, dtype=np.int64),
+        ),
+        shape=(len(histories), number_of_reactions),
+    )
+
+
+def species_production(
+    counts: csr_matrix, consumed: csr_matrix, produced: csr_matrix
+) -> Tuple[csr_matrix, csr_matrix]:
+    """
+    sparse simulations x species matrices of the number of molecules of each
+    species produced and consumed in each simulation, from the reaction_counts
+    and the incidence_matrices.
+    """
+    return counts @ produced, counts @ consumed
+
+
+def count_statistics(counts: csr_matrix) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    statistics of each column of a simulations x reactions (or species)
+    count matrix, over the simulations in which the count is not zero.
+
+    :return observed: array of the number of simulations with a nonzero count
+    :return mean: array of the mean count over those simulations (nan if none)
+    :return std: array of the standard deviation of the count over them
+    """
+    counts = csr_matrix(counts)
+    counts.eliminate_zeros()
+    observed = counts.getnnz(axis=0)
+    total = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+    squares = np.asarray(counts.multiply(counts).sum(axis=0), dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / observed
+        variance = squares.ravel() / observed - mean ** 2
+    return observed, mean, np.sqrt(np.maximum(variance, 0.0))
+
+
+def _species_profile(
+    event_steps: np.ndarray,
+    event_species: np.ndarray,
+    event_deltas: np.ndarray,
+    snapshot_steps: np.ndarray,
+    initial_state: np.ndarray,
+) -> np.ndarray:
+    """
+    species counts after each of the ascending numbers of steps in
+    snapshot_steps, from the species changes (events) of each step.
+    """
+    num_snapshots = len(snapshot_steps)
+    num_species = len(initial_state)
+
+    # an event of step i shows up in the snapshots after i + 1 steps
+    event_bins = np.searchsorted(snapshot_steps, event_steps + 1)
+    kept = event_bins < num_snapshots
+    species_profile = np.bincount(
+        event_bins[kept] * num_species + event_species[kept],
+        weights=event_deltas[kept],
+        minlength=num_snapshots * num_species,
+    ).reshape(num_snapshots, num_species)
+    species_profile = np.cumsum(species_profile, axis=0).astype(np.int64)
+    species_profile += initial_state
+    return species_profile
+
+
+def species_at_steps(
+    stoichiometry: csr_matrix,
+    initial_state: np.ndarray,
+    reaction_history: np.ndarray,
+    snapshot_steps: np.ndarray,
+) -> np.ndarray:
+    """
+    species counts of a simulation after each of the ascending numbers of
+    steps in snapshot_steps, as an array of shape (len(snapshot_steps),
+    number of species). unlike time_dep_profiles, negative counts are not
+    checked for.
+    """
+    steps = stoichiometry[np.asarray(reaction_history, dtype=np.int64)]
+    event_steps = np.arange(len(reaction_history)).repeat(np.diff(steps.indptr))
+    return _species_profile(
+        event_steps,
+        steps.indices.astype(np.int64),
+        steps.data,
+        np.asarray(snapshot_steps, dtype=np.int64),
+        initial_state,
+    )
+
+
+def time_dep_profiles(
+    stoichiometry: csr_matrix,
+    initial_state: np.ndarray,
+    reaction_history: np.ndarray,
+    time_history: np.ndarray,
+    frequency: int = 1,
+):
+    """
+    species and reaction counts of a simulation at the start, after every
+    frequency reactions, and at the end. the states are cumulative sums of the
+    stoichiometry rows of the fired reactions, so the cost is linear in the
+    number of steps plus the size of the output. raises a NegativeStateError
+    for the first step leaving a species count negative.
+
+    :return snapshot_times: array of shape (number of snapshots,)
+    :return species_profile: array of shape (number of snapshots,
+        number of species) with the species counts
+    :return reaction_profile: sparse matrix of shape (number of snapshots,
+        number of reactions) with the number of times each reaction fired
+        since the previous snapshot, one entry per step at most. its
+        cumulative sum along the snapshots gives the reaction counts, see
+        reaction_profile_dict
+    """
+    rxn_history = np.asarray(reaction_history, dtype=np.int64)
+    num_steps = len(rxn_history)
+    num_reactions, num_species = stoichiometry.shape
+
+    # states after 0, frequency, 2 * frequency, ... and num_steps steps
+    snapshot_steps = np.arange(0, num_steps + 1, frequency)
+    if snapshot_steps[-1] != num_steps:
+        snapshot_steps = np.append(snapshot_steps, num_steps)
+    snapshot_times = np.concatenate([[0.0], time_history[snapshot_steps[1:] - 1]])
+    num_snapshots = len(snapshot_steps)
+
+    # one event per species changed by each step
+    steps = stoichiometry[rxn_history]
+    event_steps = np.arange(num_steps).repeat(np.diff(steps.indptr))
+    event_species = steps.indices.astype(np.int64)
+    event_deltas = steps.data
+
+    # count of each species after each of its events
+    order = np.lexsort((event_steps, event_species))
+    sorted_species = event_species[order]
+    running = np.cumsum(event_deltas[order])
+    starts = np.flatnonzero(np.r_[True, sorted_species[1:] != sorted_species[:-1]])
+    before = np.r_[0, running][starts]
+    counts = (
+        initial_state[sorted_species]
+        + running
+        - before.repeat(np.diff(np.r_[starts, len(order)]))
+    )
+    negative = np.flatnonzero(counts < 0)
+    if len(negative) > 0:
+        # the first step going negative, and its lowest species
+        neg_steps = event_steps[order][negative]
+        neg_species = sorted_species[negative]
+        first = np.lexsort((neg_species, neg_steps))[0]
+        step = int(neg_steps[first])
+        raise NegativeStateError(
+            int(neg_species[first]),
+            float(time_history[step]),
+            step,
+            int(rxn_history[step]),
+        )
+
+    species_profile = _species_profile(
+        event_steps, event_species, event_deltas, snapshot_steps, initial_state
+    )
+
+    # step i fires in the interval ending at the snapshot after i + 1 steps,
+    # repeated (interval, reaction) pairs are summed
+    step_bins = np.searchsorted(snapshot_steps, np.arange(1, num_steps + 1))
+    reaction_profile = csr_matrix(
+        (np.ones(num_steps, dtype=np.int64), (step_bins, rxn_history)),
+        shape=(num_snapshots, num_reactions),
+    )
+
+    return snapshot_times, species_profile, reaction_profile
+
+
+def reaction_profile_dict(reaction_profile: csr_matrix) -> Dict[int, List[int]]:
+    """
+    the {reaction index: [count at each snapshot]} form of a reaction_profile
+    returned by time_dep_profiles, for every reaction. only the reactions
+    which fired are cumulated, the others get lists of zeros.
+    """
+    num_snapshots, num_reactions = reaction_profile.shape
+    profiles = {index: [0] * num_snapshots for index in range(num_reactions)}
+    fired = reaction_profile.tocsc()
+    for index in np.flatnonzero(np.diff(fired.indptr)):
+        span = slice(fired.indptr[index], fired.indptr[index + 1])
+        column = np.zeros(num_snapshots, dtype=np.int64)
+        column[fired.indices[span]] = fired.data[span]
+        profiles[int(index)] = np.cumsum(column).tolist()
+    return profiles
+
+
+def first_production_steps(
+    produced: csr_matrix, reaction_history: Union[List[int], np.ndarray]
+) -> np.ndarray:
+    """
+    the step at which each species is first produced in a reaction history,
+    or -1 if it never is, from the produced incidence_matrices. one pass over
+    the history.
+    """
+    steps = produced[np.asarray(reaction_history, dtype=np.int64)]
+    event_steps = np.arange(len(reaction_history)).repeat(np.diff(steps.indptr))
+    species, first = np.unique(steps.indices, return_index=True)
+    first_production = np.full(produced.shape[1], -1, dtype=np.int64)
+    first_production[species] = event_steps[first]
+    return first_production
+
+
+def reaction_pathway(
+    reaction_history: np.ndarray,
+    first_production: np.ndarray,
+    reactants: np.ndarray,
+    initial_state: np.ndarray,
+    step: int,
+    pathways: Optional[Dict[int, List[int]]] = None,
+) -> List[int]:
+    """
+    the reaction pathway ending with the reaction fired at step: that
+    reaction, preceded by the pathways of the first productions of each of its
+    reactants absent from the initial state. the first productions form a DAG
+    over the steps, and the pathway of each step is only built once.
+
+    :param first_production: see first_production_steps
+    :param reactants: reactants of every reaction, padded with -1
+    :param pathways: pathways already built for this history, by step
+    """
+    if pathways is None:
+        pathways = {}
+    if step in pathways:
+        return pathways[step]
+
+    reaction_index = int(reaction_history[step])
+    pathway = [reaction_index]
+    for reactant_index in reactants[reaction_index]:
+        if reactant_index < 0 or initial_state[reactant_index] != 0:
+            continue
+        producing_step = int(first_production[reactant_index])
+        if producing_step < 0 or producing_step >= step:
+            raise ValueError(
+                "species {} consumed at step {} before it is produced".format(
+                    reactant_index, step
+                )
+            )
+        pathway = (
+            reaction_pathway(
+                reaction_history,
+                first_production,
+                reactants,
+                initial_state,
+                producing_step,
+                pathways,
+            )
+            + pathway
+        )
+
+    pathways[step] = pathway
+    return pathway
+
+
+def history_pathway(
+    produced: csr_matrix,
+    reactants: np.ndarray,
+    initial_state: np.ndarray,
+    target_species_index: int,
+    reaction_history: np.ndarray,
+) -> Optional[List[int]]:
+    """
+    the reaction pathway to the first production of a target species in a
+    reaction history, or None if the target is never produced.
+    """
+    first_production = first_production_steps(produced, reaction_history)
+    step = int(first_production[target_species_index])
+    if step < 0:
+        return None
+    return reaction_pathway(
+        reaction_history, first_production, reactants, initial_state, step
+    )
+
+
+# (produced, reactants, initial_state, target_species_index) of a pathway
+# worker process, set by _init_pathway_worker
+_worker_pathway_arguments = None  # type: Any
+
+
+def _init_pathway_worker(produced, reactants, initial_state, target_species_index):
+    global _worker_pathway_arguments
+    _worker_pathway_arguments = (
+        produced,
+        reactants,
+        initial_state,
+        target_species_index,
+    )
+
+
+def _pathway_batch(reaction_histories: List[np.ndarray]) -> List[Optional[List[int]]]:
+    """
+    the history_pathway of each of a batch of reaction histories, in a
+    worker process.
+    """
+    produced, reactants, initial_state, target = _worker_pathway_arguments
+    return [
+        history_pathway(produced, reactants, initial_state, target, reaction_history)
+        for reaction_history in reaction_histories
+    ]
+
+
+class StreamingStatistics:
+    """
+    statistics of a set of simulations, folded in one simulation at a time
+    by add, so that memory is bounded by one simulation plus the size of the
+    results, on top of the matrices and arrays of the network it is given:
+
+    reaction_tally: {reaction index: times fired}, in the order the
+        reactions first fired
+    final_state_statistics: mean and std of the final species counts
+    pathways: {target species: {frozenset: {"pathway", "frequency"}}}, the
+        pathways to the first production of each of target_species
+    profile_statistics: mean and std of the species counts at the times in
+        bin_edges, if given
+    """
+
+    def __init__(
+        self,
+        stoichiometry: csr_matrix,
+        produced: csr_matrix,
+        reactants: np.ndarray,
+        initial_state: np.ndarray,
+        target_species: Iterable[int] = (),
+        bin_edges: Optional[np.ndarray] = None,
+    ):
+        self.stoichiometry = stoichiometry
+        self.produced = produced
+        self.reactants = reactants
+        self.initial_state = initial_state
+        self.bin_edges = bin_edges
+
+        num_species = len(initial_state)
+        self.number_simulations = 0
+        self.reaction_tally = {}  # type: Dict[int, int]
+        self.final_state_sum = np.zeros(num_species)
+        self.final_state_squares = np.zeros(num_species)
+        self.pathways = {
+            target: {} for target in target_species
+        }  # type: Dict[int, Dict[frozenset, dict]]
+        self.profile_sum = None  # type: Optional[np.ndarray]
+        self.profile_squares = None  # type: Optional[np.ndarray]
+        if bin_edges is not None:
+            self.profile_sum = np.zeros((len(bin_edges), num_species))
+            self.profile_squares = np.zeros((len(bin_edges), num_species))
+
+    def add(self, reaction_history: np.ndarray, time_history: np.ndarray):
+        """
+        fold in one simulation.
+        """
+        rxn_history = np.asarray(reaction_history, dtype=np.int64)
+        self.number_simulations += 1
+
+        fired, first, counts = np.unique(
+            rxn_history, return_index=True, return_counts=True
+        )
+        order = np.argsort(first)
+        for reaction_index, count in zip(fired[order].tolist(), counts[order].tolist()):
+            self.reaction_tally[reaction_index] = (
+                self.reaction_tally.get(reaction_index, 0) + count
+            )
+
+        final_state = self.initial_state + self.stoichiometry[fired].T @ counts
+        self.final_state_sum += final_state
+        self.final_state_squares += final_state.astype(np.float64) ** 2
+
+        if len(self.pathways) > 0:
+            first_production = first_production_steps(self.produced, rxn_history)
+            # the pathways of the steps of this simulation, shared by the targets
+            step_pathways = {}  # type: Dict[int, List[int]]
+            for target, pathway_dict in self.pathways.items():
+                step = int(first_production[target])
+                if step < 0:
+                    continue
+                pathway = reaction_pathway(
+                    rxn_history,
+                    first_production,
+                    self.reactants,
+                    self.initial_state,
+                    step,
+                    step_pathways,
+                )
+                key = frozenset(pathway)
+                if key in pathway_dict:
+                    pathway_dict[key]["frequency"] += 1
+                else:
+                    pathway_dict[key] = {"pathway": pathway, "frequency": 1}
+
+        if (
+            self.bin_edges is not None
+            and self.profile_sum is not None
+            and self.profile_squares is not None
+        ):
+            profile = species_at_steps(
+                self.stoichiometry,
+                self.initial_state,
+                rxn_history,
+                np.searchsorted(time_history, self.bin_edges, side="right"),
+            )
+            self.profile_sum += profile
+            self.profile_squares += profile.astype(np.float64) ** 2
+
+    def final_state_statistics(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        mean and std of the final count of each species.
+        """
+        return _mean_std(
+            self.final_state_sum, self.final_state_squares, self.number_simulations
+        )
+
+    def profile_statistics(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        mean and std of the count of each species at each of the bin_edges,
+        as arrays of shape (len(bin_edges), number of species). a simulation
+        is in its final state at the times after its last reaction.
+        """
+        if self.profile_sum is None or self.profile_squares is None:
+            raise ValueError("no bin_edges were given")
+        return _mean_std(
+            self.profile_sum, self.profile_squares, self.number_simulations
+        )
+
+
+def _mean_std(total: np.ndarray, squares: np.ndarray, n: int):
+    mean = total / n
+    return mean, np.sqrt(np.maximum(squares / n - mean ** 2, 0.0))
+
+
 def update_state(state, reaction):
     for species_index in reaction["reactants"]:
         state[species_index] -= 1
@@ -198,12 +846,46 @@ def update_state(state, reaction):
 class SimulationAnalyzer:
     """
     A class to analyze the resutls of a set of MC runs
+
+    the reaction and time histories are loaded into two flat arrays (see
+    SimulationHistories), and reaction_histories / time_histories are views
+    into them. with cache_histories=True, the parsed histories are stored
+    as .npy files in network_folder/simulation_histories_npy the first time,
+    and memory mapped from there by later analyzers.
+
+    the reactions are read from the database a shard at a time into a
+    ReactionTable (load_reactions="shard"), all at once when the analyzer is
+    created (load_reactions="all"), or one query per reaction
+    (load_reactions="query"). load_reactions only applies to
+    index_to_reaction: the pathways, the species consumption, the profiles
+    and stream_statistics need the incidence and stoichiometry matrices of
+    every reaction, and those are built from a table with every shard loaded
+    (see loaded_reaction_table), whatever load_reactions is.
+
+    with streaming=True, no history is held in memory: reaction_histories
+    and time_histories read each simulation when it is accessed, from its
+    text files, or from the memory mapped cache with cache_histories=True.
+    the tallies, pathways and statistics go through the simulations one at
+    a time, and stream_statistics folds all of them, together with binned
+    species profiles, into a single pass. the network tables stay resident,
+    so memory is bounded by one trajectory, plus the reaction table and the
+    matrices, which are linear in the number of reactions, plus the size of
+    the results. generate_time_dep_profiles still returns the profiles of
+    every simulation.
     """
 
-    def __init__(self, network_folder: str, entries_box: EntriesBox):
+    def __init__(
+        self,
+        network_folder: str,
+        entries_box: EntriesBox,
+        cache_histories: bool = False,
+        load_reactions: str = "shard",
+        streaming: bool = False,
+    ):
 
         initial_state_postfix = "/initial_state"
         simulation_histories_postfix = "/simulation_histories"
+        histories_cache_postfix = "/simulation_histories_npy"
         database_postfix = "/rn.sqlite"
         reports_postfix = "/reports"
 
@@ -219,6 +901,28 @@ class SimulationAnalyzer:
         for i in range(self.number_of_shards):
             self.get_reactions_sql[i] = get_reaction(i)
 
+        if load_reactions not in ("shard", "all", "query"):
+            raise ValueError(
+                "load_reactions must be 'shard', 'all' or 'query', got {}".format(
+                    load_reactions
+                )
+            )
+        self.reaction_table = None  # type: Optional[ReactionTable]
+        self.stoichiometry_matrix = None  # type: Optional[csr_matrix]
+        self.incidence_matrices = None  # type: Optional[Tuple[csr_matrix, csr_matrix]]
+        self.reaction_count_matrix = None  # type: Optional[csr_matrix]
+        self.first_fired = None  # type: Optional[np.ndarray]
+        self.temporary_reaction_table = None  # type: Optional[ReactionTable]
+        if load_reactions != "query":
+            self.reaction_table = ReactionTable(
+                self.connection,
+                self.number_of_reactions,
+                self.shard_size,
+                self.number_of_shards,
+            )
+            if load_reactions == "all":
+                self.reaction_table.load_all()
+
         self.network_folder = network_folder
         self.histories_folder = network_folder + simulation_histories_postfix
         self.reports_folder = network_folder + reports_postfix
@@ -240,39 +944,36 @@ class SimulationAnalyzer:
         self.reaction_data: Dict[int, dict] = {}
 
         self.reaction_pathways_dict: Dict[int, Dict[frozenset, dict]] = dict()
-        self.reaction_histories: List[List[int]] = list()
-        self.time_histories = list()
         self.observed_reactions: Dict[int, int] = {}
 
-        histories_contents = sorted(os.listdir(self.histories_folder))
-        reaction_histories_contents = [
-            x for x in histories_contents if x.startswith("reactions")
-        ]
-        time_histories_contents = [
-            x for x in histories_contents if x.startswith("times")
-        ]
-
-        reaction_seeds = [x.split("_")[1] for x in reaction_histories_contents]
-        time_seeds = [x.split("_")[1] for x in reaction_histories_contents]
-
-        if reaction_seeds != time_seeds:
-            raise ValueError("Reactions and times not from same set of initial seeds!")
-
-        for filename in reaction_histories_contents:
-            reaction_history = list()
-            with open(self.histories_folder + "/" + filename) as f:
-                for line in f:
-                    reaction_history.append(int(line.strip()))
-
-            self.reaction_histories.append(reaction_history)
-
-        for filename in time_histories_contents:
-            time_history = list()
-            with open(self.histories_folder + "/" + filename) as f:
-                for line in f:
-                    time_history.append(float(line.strip()))
+        histories_cache_folder = None  # type: Optional[str]
+        if cache_histories:
+            histories_cache_folder = network_folder + histories_cache_postfix
+        self.streaming = streaming
+        self.histories: Union[SimulationHistories, HistoryFiles]
+        if streaming and not cache_histories:
+            self.histories = HistoryFiles(self.histories_folder)
+        else:
+            self.histories = SimulationHistories.load(
+                self.histories_folder, cache_folder=histories_cache_folder
+            )
 
-            self.time_histories.append(np.array(time_history))
+        self.reaction_histories: Sequence[np.ndarray]
+        self.time_histories: Sequence[np.ndarray]
+        if streaming:
+            self.reaction_histories = HistorySequence(
+                self.histories.reaction_history, len(self.histories)
+            )
+            self.time_histories = HistorySequence(
+                self.histories.time_history, len(self.histories)
+            )
+        else:
+            self.reaction_histories = [
+                self.histories.reaction_history(i) for i in range(len(self.histories))
+            ]
+            self.time_histories = [
+                self.histories.time_history(i) for i in range(len(self.histories))
+            ]
 
         self.number_simulations = len(self.reaction_histories)
         visualize_molecules(
@@ -283,6 +984,10 @@ class SimulationAnalyzer:
         shard = reaction_index // self.shard_size
         if reaction_index in self.reaction_data:
             return self.reaction_data[reaction_index]
+        elif self.reaction_table is not None:
+            reaction = self.reaction_table.reaction(int(reaction_index))
+            self.reaction_data[reaction_index] = reaction
+            return reaction
         else:
             print("fetching data for reaction", reaction_index)
             cur = self.connection.cursor()
@@ -305,10 +1010,16 @@ class SimulationAnalyzer:
         return weight
 
     def collect_duplicate_pathways(
-        self, pathways: List[List[int]]
+        self, pathways: Iterable[Optional[List[int]]]
     ) -> Dict[frozenset, dict]:
+        """
+        fold pathways, as they are produced, into a dict keyed by the set
+        of reactions of each pathway. None (no pathway) is skipped.
+        """
         pathway_dict: Dict[frozenset, dict] = {}
         for pathway in pathways:
+            if pathway is None:
+                continue
             key = frozenset(pathway)
             if key in pathway_dict:
                 pathway_dict[key]["frequency"] += 1
@@ -332,32 +1043,27 @@ class SimulationAnalyzer:
         """
         # if a reaction has the target species twice as a reactant or product
         # it will be counted twice
+        consumed, produced = self.incidence()
+        consumes = consumed.getcol(target_species_index).toarray().ravel()
+        produces = produced.getcol(target_species_index).toarray().ravel()
+        counts = self.reaction_counts()
+        totals = np.asarray(counts.sum(axis=0)).ravel()
+
         producing_reactions = {}
         consuming_reactions = {}
-        final_counts = []
-        for reaction_history in self.reaction_histories:
-            running_count = self.initial_state[target_species_index]
-
-            for reaction_index in reaction_history:
-                reaction = self.index_to_reaction(reaction_index)
-
-                for reactant_index in reaction["reactants"]:
-                    if target_species_index == reactant_index:
-                        running_count -= 1
-                        if reaction_index not in consuming_reactions:
-                            consuming_reactions[reaction_index] = 1
-                        else:
-                            consuming_reactions[reaction_index] += 1
-
-                for product_index in reaction["products"]:
-                    if target_species_index == product_index:
-                        running_count += 1
-                        if reaction_index not in producing_reactions:
-                            producing_reactions[reaction_index] = 1
-                        else:
-                            producing_reactions[reaction_index] += 1
-
-            final_counts.append(running_count)
+        for reaction_index in self.fired_reactions().tolist():
+            if produces[reaction_index] > 0:
+                producing_reactions[reaction_index] = int(
+                    produces[reaction_index] * totals[reaction_index]
+                )
+            if consumes[reaction_index] > 0:
+                consuming_reactions[reaction_index] = int(
+                    consumes[reaction_index] * totals[reaction_index]
+                )
+
+        final_counts = (
+            self.initial_state[target_species_index] + counts @ (produces - consumes)
+        ).tolist()
 
         return producing_reactions, consuming_reactions, final_counts
 
@@ -367,83 +1073,116 @@ class SimulationAnalyzer:
         reactants of the final reaction to produce a valid reaction
         pathway
         """
-
-        final_reaction_index = reaction_history_slice[-1]
-        pathway = [final_reaction_index]
-
-        final_reaction = self.index_to_reaction(final_reaction_index)
-
-        to_produce = []
-        for reactant_index in final_reaction["reactants"]:
-            if self.initial_state[reactant_index] == 0:
-                to_produce.append(reactant_index)
-
-        for missing in to_produce:
-            slice_producing = self.slice_producing_species(
-                missing, reaction_history_slice
-            )
-
-            pathway_prefix = self.reaction_pathway_from_history_slice(slice_producing)
-            pathway = pathway_prefix + pathway
-
-        return pathway
+        _, produced = self.incidence()
+        reaction_history = np.asarray(reaction_history_slice, dtype=np.int64)
+        return reaction_pathway(
+            reaction_history,
+            first_production_steps(produced, reaction_history),
+            self.loaded_reaction_table().reactants,
+            self.initial_state,
+            len(reaction_history) - 1,
+        )
 
     def slice_producing_species(
-        self, target_species_index: int, reaction_history_slice: List[int]
+        self,
+        target_species_index: int,
+        reaction_history_slice: Union[List[int], np.ndarray],
     ):
         """
         take a target species and a reaction history and return the
         initial slice producing the first occourance of the target
         species with its last reaction
         """
-
-        count = 0
-        species_found = False
-        for reaction_index in reaction_history_slice:
-            count += 1
-            reaction = self.index_to_reaction(reaction_index)
-            if target_species_index in reaction["products"]:
-                species_found = True
-                break
+        _, produced = self.incidence()
+        step = first_production_steps(produced, reaction_history_slice)[
+            target_species_index
+        ]
 
         # None if target wasn't produced
         # slice with last reaction prodcing target otherwise
-        if species_found:
-            return reaction_history_slice[0:count]
+        if step >= 0:
+            return reaction_history_slice[0 : step + 1]
         else:
             return None
 
-    def extract_reaction_pathways(self, target_species_index: int):
+    def extract_reaction_pathways(
+        self, target_species_index: int, number_of_processes: int = 1
+    ):
         """
         extract reaction pathways to target species index for all
-        reaction trajectories that produced it.
+        reaction trajectories that produced it. each trajectory is
+        indexed by the step at which each species is first produced,
+        and the pathway is a walk back from the first production of the
+        target. the pathways are folded into the pathway dict as they
+        come, in trajectory order, so neither the trajectories nor their
+        pathways are collected.
+
+        with number_of_processes > 1, batches of trajectories are
+        processed by a pool of processes. the incidence matrix and the
+        reactants are handed to each worker once, by the pool initializer,
+        and at most 2 * number_of_processes batches are submitted or
+        waiting to be folded at any time. when streaming, a batch is a
+        single trajectory, so only that many trajectories are loaded at
+        once.
         """
 
         print("extracting pathways to", target_species_index)
-        reaction_pathway_list = []
-
-        for reaction_history_num, reaction_history in enumerate(
-            self.reaction_histories
-        ):
-            print("scanning history", reaction_history_num, "for pathway")
-
-            slice_producing_target_index = self.slice_producing_species(
-                target_species_index, reaction_history
-            )
+        _, produced = self.incidence()
+        arguments = (
+            produced,
+            self.loaded_reaction_table().reactants,
+            self.initial_state,
+            target_species_index,
+        )
 
-            if slice_producing_target_index is None:
-                continue
+        if number_of_processes > 1:
+            if self.streaming:
+                batch_size = 1
             else:
-
-                pathway = self.reaction_pathway_from_history_slice(
-                    slice_producing_target_index
+                batch_size = max(
+                    1, self.number_simulations // (4 * number_of_processes)
                 )
+            reaction_pathway_dict = self.collect_duplicate_pathways(
+                self.pool_pathways(arguments, number_of_processes, batch_size)
+            )
+        else:
 
-                reaction_pathway_list.append(pathway)
+            def scan():
+                for reaction_history_num, reaction_history in enumerate(
+                    self.reaction_histories
+                ):
+                    print("scanning history", reaction_history_num, "for pathway")
+                    yield history_pathway(*arguments, reaction_history)
+
+            reaction_pathway_dict = self.collect_duplicate_pathways(scan())
 
-        reaction_pathway_dict = self.collect_duplicate_pathways(reaction_pathway_list)
         self.reaction_pathways_dict[target_species_index] = reaction_pathway_dict
 
+    def pool_pathways(
+        self, arguments: tuple, number_of_processes: int, batch_size: int
+    ) -> Iterable[Optional[List[int]]]:
+        """
+        the history_pathway of every trajectory, in trajectory order, computed
+        by a pool of number_of_processes workers which get the other
+        arguments of history_pathway once, through _init_pathway_worker.
+        batches of batch_size trajectories are submitted as earlier ones are
+        consumed, keeping 2 * number_of_processes batches in flight.
+        """
+        histories = iter(self.reaction_histories)
+        batches = iter(lambda: list(itertools.islice(histories, batch_size)), [])
+        window = 2 * number_of_processes
+        with Pool(
+            number_of_processes, initializer=_init_pathway_worker, initargs=arguments
+        ) as p:
+            pending = deque()  # type: deque
+            for batch in itertools.islice(batches, window):
+                pending.append(p.apply_async(_pathway_batch, (batch,)))
+            while pending:
+                pathways = pending.popleft().get()
+                for batch in itertools.islice(batches, 1):
+                    pending.append(p.apply_async(_pathway_batch, (batch,)))
+                yield from pathways
+
     def generate_consumption_report(self, mol_entry: MoleculeEntry):
         target_species_index = mol_entry.parameters["ind"]
 
@@ -641,14 +1380,77 @@ class SimulationAnalyzer:
 
             generate_latex_footer(f)
 
+    def reaction_counts(self) -> csr_matrix:
+        """
+        the reaction_counts matrix of the simulations, built the first time it
+        is needed.
+        """
+        if self.reaction_count_matrix is None:
+            self.reaction_count_matrix = reaction_counts(
+                self.histories, self.number_of_reactions
+            )
+        return self.reaction_count_matrix
+
+    def fired_reactions(self) -> np.ndarray:
+        """
+        the reactions which fired in any simulation, in the order they first
+        fired going through the simulations one after the other. this is the
+        order ties are listed in by the reports.
+        """
+        if self.first_fired is None:
+            seen = np.zeros(self.number_of_reactions, dtype=bool)
+            first_fired = []
+            for reaction_history in self.reaction_histories:
+                fired, first = np.unique(reaction_history, return_index=True)
+                fired = fired[np.argsort(first)]
+                new = fired[~seen[fired]]
+                seen[new] = True
+                first_fired.append(new.astype(np.int64))
+            self.first_fired = np.concatenate(
+                first_fired or [np.zeros(0, dtype=np.int64)]
+            )
+        return self.first_fired
+
     def compute_reaction_tally(self):
         if len(self.observed_reactions) == 0:
-            for history in self.reaction_histories:
-                for reaction_index in history:
-                    if reaction_index in self.observed_reactions:
-                        self.observed_reactions[reaction_index] += 1
-                    else:
-                        self.observed_reactions[reaction_index] = 1
+            totals = np.asarray(self.reaction_counts().sum(axis=0)).ravel()
+            for reaction_index in self.fired_reactions().tolist():
+                self.observed_reactions[reaction_index] = int(totals[reaction_index])
+
+    def stream_statistics(
+        self,
+        target_species: Iterable[int] = (),
+        bin_edges: Optional[np.ndarray] = None,
+    ) -> StreamingStatistics:
+        """
+        fold the simulations, one at a time, into a StreamingStatistics. the
+        reaction tally and the pathways to target_species are kept, so the
+        tally and pathway reports do not go through the histories again. the
+        whole reaction table and the matrices built from it are loaded first.
+        """
+        _, produced = self.incidence()
+        statistics = StreamingStatistics(
+            self.stoichiometry(),
+            produced,
+            self.loaded_reaction_table().reactants,
+            self.initial_state,
+            target_species,
+            bin_edges,
+        )
+        for n_sim in range(self.number_simulations):
+            statistics.add(self.reaction_histories[n_sim], self.time_histories[n_sim])
+
+        self.observed_reactions = dict(statistics.reaction_tally)
+        for target, pathways in statistics.pathways.items():
+            self.reaction_pathways_dict[target] = {
+                key: {
+                    "pathway": pathway["pathway"],
+                    "frequency": pathway["frequency"],
+                    "weight": self.compute_path_weight(pathway["pathway"]),
+                }
+                for key, pathway in pathways.items()
+            }
+        return statistics
 
     def frequently_occouring_reactions(self, number: int):
         """
@@ -682,13 +1484,86 @@ class SimulationAnalyzer:
 
             generate_latex_footer(f)
 
-    def generate_time_dep_profiles(self, frequency: int = 1):
+    def loaded_reaction_table(self) -> ReactionTable:
+        """
+        the reaction table with every shard loaded. with
+        load_reactions="query", a separate table is loaded the first time, so
+        every reaction is in memory from then on, even in that mode.
+        """
+        table = self.reaction_table
+        if table is None:
+            if self.temporary_reaction_table is None:
+                self.temporary_reaction_table = ReactionTable(
+                    self.connection,
+                    self.number_of_reactions,
+                    self.shard_size,
+                    self.number_of_shards,
+                )
+            table = self.temporary_reaction_table
+        table.load_all()
+        return table
+
+    def stoichiometry(self) -> csr_matrix:
+        """
+        the stoichiometry_matrix of all the reactions, built the first time
+        it is needed.
+        """
+        if self.stoichiometry_matrix is None:
+            self.stoichiometry_matrix = stoichiometry_matrix(
+                self.loaded_reaction_table(), self.number_of_species
+            )
+        return self.stoichiometry_matrix
+
+    def incidence(self) -> Tuple[csr_matrix, csr_matrix]:
+        """
+        the consumed and produced incidence_matrices of all the reactions,
+        built the first time they are needed.
+        """
+        if self.incidence_matrices is None:
+            self.incidence_matrices = incidence_matrices(
+                self.loaded_reaction_table(), self.number_of_species
+            )
+        return self.incidence_matrices
+
+    def species_production(self) -> Tuple[csr_matrix, csr_matrix]:
+        """
+        simulations x species matrices of the number of molecules of each
+        species produced and consumed in each simulation.
+        """
+        consumed, produced = self.incidence()
+        return species_production(self.reaction_counts(), consumed, produced)
+
+    def time_dep_profile_arrays(self, n_sim: int, frequency: int = 1):
+        """
+        species and reaction counts of one simulation at the start, after
+        every frequency reactions, and at the end, see time_dep_profiles.
+        """
+        try:
+            return time_dep_profiles(
+                self.stoichiometry(),
+                self.initial_state,
+                self.reaction_histories[n_sim],
+                self.time_histories[n_sim],
+                frequency,
+            )
+        except NegativeStateError as e:
+            raise ValueError(
+                "State invalid: simulation {}, negative specie {}, time {}, step {}, reaction {}".format(
+                    n_sim, e.species, e.time, e.step, e.reaction
+                )
+            )
+
+    def generate_time_dep_profiles(self, frequency: int = 1, dense: bool = False):
         """
         Generate plottable time-dependent profiles of species and rxns from raw KMC output, obtain final states.
 
         :param frequency (int): The system state will be sampled after every n
             reactions, where n is the frequency. Default is 1, meaning that each
             step will be sampled.
+        :param dense (bool): If True, return the profiles of each simulation as
+            arrays (and the reaction profiles as sparse matrices of the
+            firings between snapshots), see time_dep_profile_arrays, instead
+            of dicts of lists.
 
         :return dict containing species profiles, reaction profiles, and final states from each simulation.
                 {species_profiles: [ {mol_ind1: [n(t0), n(t1)...], mol_ind2: [...],  ... }, {...}, ... ]
@@ -703,53 +1578,20 @@ class SimulationAnalyzer:
         final_states = list()
 
         for n_sim in range(self.number_simulations):
-            sim_time_history = self.time_histories[n_sim]
-            sim_rxn_history = self.reaction_histories[n_sim]
-            state = copy.deepcopy(self.initial_state)
-            rxn_counts = dict()
-            snaps = [0.0]
-            sim_species_profile = dict()
-            sim_rxn_profile = dict()
-            for ii, mol_ind in enumerate(state):
-                sim_species_profile[ii] = [self.initial_state[ii]]
-            for index in range(self.number_of_reactions):
-                sim_rxn_profile[index] = [0]
-                rxn_counts[index] = 0
-            total_iterations = len(sim_rxn_history)
-
-            for iter in range(total_iterations):
-                rxn_ind = sim_rxn_history[iter]
-                t = sim_time_history[iter]
-                rxn_counts[rxn_ind] += 1
-
-                update_state(state, self.index_to_reaction(rxn_ind))
-                for i, v in enumerate(state):
-                    if v < 0:
-                        raise ValueError(
-                            "State invalid: simulation {}, negative specie {}, time {}, step {}, reaction {}".format(
-                                n_sim, i, t, iter, rxn_ind
-                            )
-                        )
-
-                if iter + 1 % frequency == 0:
-                    snaps.append(t)
-                    for i, v in enumerate(state):
-                        sim_species_profile[i].append(v)
-                    for rxn, count in rxn_counts.items():
-                        sim_rxn_profile[rxn].append(count)
-
-            # Always add the final state
-            if sim_time_history[-1] not in snaps:
-                snaps.append(sim_time_history[-1])
-                for i, v in enumerate(state):
-                    sim_species_profile[i].append(v)
-                for rxn, count in rxn_counts.items():
-                    sim_rxn_profile[rxn].append(count)
-
-            species_profiles.append(sim_species_profile)
-            reaction_profiles.append(sim_rxn_profile)
-            final_states.append(state)
-            snapshot_times.append(snaps)
+            (
+                snaps,
+                sim_species_profile,
+                sim_rxn_profile,
+            ) = self.time_dep_profile_arrays(n_sim, frequency)
+            final_states.append(sim_species_profile[-1].copy())
+            if dense:
+                species_profiles.append(sim_species_profile)
+                reaction_profiles.append(sim_rxn_profile)
+                snapshot_times.append(snaps)
+            else:
+                species_profiles.append(dict(enumerate(sim_species_profile.T.tolist())))
+                reaction_profiles.append(reaction_profile_dict(sim_rxn_profile))
+                snapshot_times.append(snaps.tolist())
 
         return {
             "species_profiles": species_profiles,
@@ -768,24 +1610,19 @@ class SimulationAnalyzer:
         :return: list of tuples containing statistical data for each species, sorted from highest to low avg occurrence
         """
 
-        # For each molecule, compile an array of its final amounts
-        state_arrays = dict()
+        if len(final_states) == 0:
+            return []
+
+        # row n_sim holds the final amount of each molecule in simulation n_sim
+        state_arrays = np.zeros((self.number_simulations, self.number_of_species))
         for iter, final_state in enumerate(final_states):
-            for index, amt in enumerate(final_state):
-                # Store the amount, and convert key from mol_ind to entry_id
-                if index not in state_arrays:
-                    state_arrays[index] = np.zeros(self.number_simulations)
-                state_arrays[index][iter] = amt
-        analyzed_states = dict()  # will contain statistical results of final states
-        for mol_entry, state_array in state_arrays.items():
-            analyzed_states[mol_entry] = (np.mean(state_array), np.std(state_array))
-        # Sort from highest avg final amount to lowest
-        sorted_analyzed_states = sorted(
-            [(entry_id, data_tup) for entry_id, data_tup in analyzed_states.items()],
-            key=lambda x: x[1][0],
-            reverse=True,
-        )
-        return sorted_analyzed_states
+            state_arrays[iter, : len(final_state)] = final_state
+        means = state_arrays.mean(axis=0)
+        stds = state_arrays.std(axis=0)
+
+        # Sort from highest avg final amount to lowest, ties by index
+        order = np.argsort(-means, kind="stable")
+        return [(int(i), (means[i], stds[i])) for i in order]
 
     def rank_reaction_counts(self):
         """
@@ -799,30 +1636,10 @@ class SimulationAnalyzer:
             [(rxn1, (avg, std)), (rxn2, (avg, std)) ... ]
         """
 
-        reaction_data = dict()  # keeping record of each iteration
-        # Loop to count all reactions fired
-        for n_sim in range(self.number_simulations):
-            rxns_fired = set(self.reaction_histories[n_sim])
-
-            for rxn_ind in rxns_fired:
-                if rxn_ind not in reaction_data:
-                    reaction_data[rxn_ind] = list()
-                reaction_data[rxn_ind].append(
-                    np.sum(self.reaction_histories[n_sim] == rxn_ind)
-                )
-
-        reaction_analysis = dict()
-        for rxn_ind, counts in reaction_data.items():
-            reaction_analysis[rxn_ind] = (
-                np.mean(np.array(counts)),
-                np.std(np.array(counts)),
-            )
-
-        # Sort reactions by the average amount fired
-        sorted_reaction_analysis = sorted(
-            [(i, c) for i, c in reaction_analysis.items()],
-            key=lambda x: x[1][0],
-            reverse=True,
-        )
+        # over the simulations in which each reaction fired at least once
+        observed, means, stds = count_statistics(self.reaction_counts())
+        fired = np.flatnonzero(observed)
 
-        return sorted_reaction_analysis
+        # Sort reactions by the average amount fired, ties by index
+        order = fired[np.argsort(-means[fired], kind="stable")]
+        return [(int(i), (means[i], stds[i])) for i in order]
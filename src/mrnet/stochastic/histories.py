@@ -0,0 +1,234 @@
+import json
+import os
+from collections.abc import Sequence
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# the simulator writes one reactions_<seed> and one times_<seed> file per
+# simulation into network_folder/simulation_histories, with one reaction index
+# (or time) per line. SimulationHistories parses them into two flat arrays, and
+# can store those as .npy files so that later analyses memory map them instead
+# of parsing the text again. HistoryFiles parses them one simulation at a time.
+
+cache_files = ["seeds", "offsets", "reactions", "times"]
+
+
+def parse_history_file(path: str, dtype) -> np.ndarray:
+    """
+    parse a file with one number per line without going through python
+    objects.
+    """
+    return np.fromfile(path, dtype=dtype, sep="\n")
+
+
+class SimulationHistories:
+    """
+    reaction and time histories of a set of simulations, concatenated: the
+    history of simulation i is reactions[offsets[i]:offsets[i + 1]] and
+    times[offsets[i]:offsets[i + 1]]. seeds[i] is the seed of simulation i.
+    """
+
+    def __init__(
+        self,
+        seeds: List[str],
+        offsets: np.ndarray,
+        reactions: np.ndarray,
+        times: np.ndarray,
+    ):
+        self.seeds = seeds
+        self.offsets = offsets
+        self.reactions = reactions
+        self.times = times
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def reaction_history(self, i: int) -> np.ndarray:
+        return self.reactions[self.offsets[i] : self.offsets[i + 1]]
+
+    def time_history(self, i: int) -> np.ndarray:
+        return self.times[self.offsets[i] : self.offsets[i + 1]]
+
+    @staticmethod
+    def history_files(histories_folder: str):
+        """
+        the reactions_<seed> and times_<seed> files of a histories folder, in
+        the (lexicographic) order SimulationAnalyzer has always used.
+        """
+        contents = sorted(os.listdir(histories_folder))
+        reaction_files = [x for x in contents if x.startswith("reactions")]
+        time_files = [x for x in contents if x.startswith("times")]
+
+        reaction_seeds = [x.split("_")[1] for x in reaction_files]
+        time_seeds = [x.split("_")[1] for x in time_files]
+        if reaction_seeds != time_seeds:
+            raise ValueError("Reactions and times not from same set of initial seeds!")
+
+        return reaction_seeds, reaction_files, time_files
+
+    @classmethod
+    def from_text(cls, histories_folder: str) -> "SimulationHistories":
+        """
+        parse the text histories written by the simulator.
+        """
+        seeds, reaction_files, time_files = cls.history_files(histories_folder)
+
+        reaction_histories = []
+        time_histories = []
+        for reaction_file, time_file in zip(reaction_files, time_files):
+            reaction_history = parse_history_file(
+                os.path.join(histories_folder, reaction_file), np.int32
+            )
+            time_history = parse_history_file(
+                os.path.join(histories_folder, time_file), np.float64
+            )
+            if len(reaction_history) != len(time_history):
+                raise ValueError(
+                    "{} and {} have different lengths".format(reaction_file, time_file)
+                )
+            reaction_histories.append(reaction_history)
+            time_histories.append(time_history)
+
+        offsets = np.zeros(len(seeds) + 1, dtype=np.int64)
+        np.cumsum([len(h) for h in reaction_histories], out=offsets[1:])
+        return cls(
+            seeds,
+            offsets,
+            np.concatenate(reaction_histories or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate(time_histories or [np.zeros(0, dtype=np.float64)]),
+        )
+
+    @staticmethod
+    def manifest(histories_folder: str) -> dict:
+        """
+        names, sizes and modification times of the text histories, used to
+        tell whether a cache is up to date.
+        """
+        _, reaction_files, time_files = SimulationHistories.history_files(
+            histories_folder
+        )
+        manifest = {}
+        for name in reaction_files + time_files:
+            stat = os.stat(os.path.join(histories_folder, name))
+            manifest[name] = [stat.st_size, stat.st_mtime_ns]
+        return manifest
+
+    def save(self, cache_folder: str, manifest: Optional[dict] = None):
+        """
+        write the arrays as .npy files (and the manifest of the text histories
+        they were parsed from) into cache_folder.
+        """
+        os.makedirs(cache_folder, exist_ok=True)
+        np.save(os.path.join(cache_folder, "seeds.npy"), np.array(self.seeds))
+        np.save(os.path.join(cache_folder, "offsets.npy"), self.offsets)
+        np.save(os.path.join(cache_folder, "reactions.npy"), self.reactions)
+        np.save(os.path.join(cache_folder, "times.npy"), self.times)
+
+        # written last, so a cache without a manifest is never trusted
+        with open(os.path.join(cache_folder, "manifest.json"), "w") as f:
+            json.dump(manifest or {}, f)
+
+    @classmethod
+    def open(cls, cache_folder: str, mmap: bool = True) -> "SimulationHistories":
+        """
+        open a cache written by SimulationHistories.save. with mmap=True the
+        reactions and times are memory mapped rather than read.
+        """
+        if mmap:
+            reactions = np.load(os.path.join(cache_folder, "reactions.npy"), "r")
+            times = np.load(os.path.join(cache_folder, "times.npy"), "r")
+        else:
+            reactions = np.load(os.path.join(cache_folder, "reactions.npy"))
+            times = np.load(os.path.join(cache_folder, "times.npy"))
+        return cls(
+            [str(s) for s in np.load(os.path.join(cache_folder, "seeds.npy"))],
+            np.load(os.path.join(cache_folder, "offsets.npy")),
+            reactions,
+            times,
+        )
+
+    @classmethod
+    def load(
+        cls,
+        histories_folder: str,
+        cache_folder: Optional[str] = None,
+        mmap: bool = True,
+    ) -> "SimulationHistories":
+        """
+        load the histories of a folder. if cache_folder is given, the .npy
+        cache in it is opened when it matches the text histories, and is
+        (re)written from them otherwise.
+        """
+        if cache_folder is None:
+            return cls.from_text(histories_folder)
+
+        manifest = cls.manifest(histories_folder)
+        manifest_path = os.path.join(cache_folder, "manifest.json")
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                cached_manifest = json.load(f)
+            if cached_manifest == manifest and all(
+                os.path.isfile(os.path.join(cache_folder, name + ".npy"))
+                for name in cache_files
+            ):
+                return cls.open(cache_folder, mmap=mmap)
+            os.remove(manifest_path)
+
+        histories = cls.from_text(histories_folder)
+        histories.save(cache_folder, manifest)
+        if mmap:
+            return cls.open(cache_folder, mmap=True)
+        return histories
+
+
+class HistoryFiles:
+    """
+    the text histories of a folder, parsed one simulation at a time when
+    they are accessed, so that only the histories in use are in memory. has
+    the same seeds, reaction_history and time_history as SimulationHistories.
+    """
+
+    def __init__(self, histories_folder: str):
+        self.histories_folder = histories_folder
+        (
+            self.seeds,
+            self.reaction_files,
+            self.time_files,
+        ) = SimulationHistories.history_files(histories_folder)
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def reaction_history(self, i: int) -> np.ndarray:
+        return parse_history_file(
+            os.path.join(self.histories_folder, self.reaction_files[i]), np.int32
+        )
+
+    def time_history(self, i: int) -> np.ndarray:
+        return parse_history_file(
+            os.path.join(self.histories_folder, self.time_files[i]), np.float64
+        )
+
+
+class HistorySequence(Sequence):
+    """
+    read only sequence of the reaction (or time) histories of a set of
+    simulations, each fetched from history(i) when it is accessed.
+    """
+
+    def __init__(self, history: Callable[[int], np.ndarray], length: int):
+        self.history = history
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.history(j) for j in range(*i.indices(self.length))]
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("history index out of range")
+        return self.history(i)
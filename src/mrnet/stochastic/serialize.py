@@ -1,9 +1,11 @@
-from typing import Tuple, Optional, Union, List, Dict
+from typing import Tuple, Optional, Union, List, Dict, Set
 import math
 import numpy as np
 import pickle
 import os
+import queue
 import sqlite3
+import threading
 
 
 from pymatgen.core.structure import Molecule
@@ -55,8 +57,8 @@ create_metadata_table = """
 """
 
 
-def create_reactions_table(n):
-    return (
+def create_reactions_table(n, index=True):
+    table = (
         "CREATE TABLE reactions_"
         + str(n)
         + """ (
@@ -71,8 +73,16 @@ def create_reactions_table(n):
                 rate                REAL NOT NULL,
                 dG                  REAL NOT NULL
         );
+"""
+    )
+    if index:
+        table += create_reaction_string_index(n)
+    return table
 
-CREATE INDEX reaction_"""
+
+def create_reaction_string_index(n):
+    return (
+        "\nCREATE INDEX reaction_"
         + str(n)
         + "_string_idx ON reactions_"
         + str(n)
@@ -114,6 +124,142 @@ def does_reaction_exist(n):
     return "SELECT COUNT(*) FROM reactions_" + str(n) + " WHERE reaction_string = ?"
 
 
+def reaction_key(reactants, products, number_of_species: int) -> int:
+    """
+    compact key identifying a reaction with at most two reactants and two products.
+
+    species indices are packed into 32 bits each (shifted by one, so a missing species
+    is 0), which gives an exact key of at most 128 bits for networks with fewer than
+    2 ** 32 - 1 species: the reactants in the high 64 bits and the products in the
+    low 64 bits. Like the reaction strings, the key depends on the order of the
+    reactants and products.
+    """
+    if number_of_species >= 0xFFFFFFFF:
+        raise ValueError("reaction keys need fewer than 2 ** 32 - 1 species")
+    if len(reactants) > 2 or len(products) > 2:
+        raise ValueError("reaction keys need at most two reactants and two products")
+
+    key = 0
+    for species in (reactants, products):
+        for i in range(2):
+            key <<= 32
+            if i < len(species):
+                key |= int(species[i]) + 1
+    return key
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _hash_key(high: int, low: int) -> int:
+    # both halves are mixed in, so that a reaction and its reverse hash apart
+    return _mix64(_mix64(high) ^ low)
+
+
+class BloomFilter:
+    """
+    fixed size Bloom filter over reaction keys.
+
+    might_contain never returns a false negative. it returns a false positive with
+    probability roughly (1 - exp(-num_hashes * n / num_bits)) ** num_hashes after n
+    keys have been added, so the memory use stays at num_bits / 8 bytes no matter
+    how many reactions are serialized.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int = 7):
+        if num_bits <= 0 or num_hashes <= 0:
+            raise ValueError("num_bits and num_hashes must be positive")
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    def positions(self, key: int) -> List[int]:
+        # double hashing: the i-th position is h1 + i * h2
+        h1 = _hash_key(key >> 64, key & 0xFFFFFFFFFFFFFFFF)
+        h2 = _mix64(h1) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: int):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, key: int) -> bool:
+        for position in self.positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class ReactionKeySet:
+    """
+    exact set of reaction keys, as an open addressing hash table with linear probing
+    over two uint64 arrays holding the high and low 64 bits of each key.
+
+    every slot takes 16 bytes and the table doubles when it is more than half full,
+    so a key costs between 32 and 64 bytes, instead of the ~100 bytes of a python int
+    in a set. the key 0 (a reaction without species) marks the empty slots and can
+    not be stored.
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.high = np.zeros(capacity, dtype=np.uint64)
+        self.low = np.zeros(capacity, dtype=np.uint64)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def slot(self, high: int, low: int) -> Tuple[int, bool]:
+        """
+        index of the slot holding the key, or of the empty slot where it belongs,
+        and whether the key was found.
+        """
+        mask = len(self.high) - 1
+        item_high = self.high.item
+        item_low = self.low.item
+        i = _hash_key(high, low) & mask
+        while True:
+            slot_high = item_high(i)
+            slot_low = item_low(i)
+            if slot_high == high and slot_low == low:
+                return i, True
+            if slot_high == 0 and slot_low == 0:
+                return i, False
+            i = (i + 1) & mask
+
+    def __contains__(self, key: int) -> bool:
+        return self.slot(key >> 64, key & 0xFFFFFFFFFFFFFFFF)[1]
+
+    def add(self, key: int):
+        if key == 0:
+            raise ValueError("the key 0 marks the empty slots")
+        high, low = key >> 64, key & 0xFFFFFFFFFFFFFFFF
+        i, found = self.slot(high, low)
+        if found:
+            return
+        self.high[i] = high
+        self.low[i] = low
+        self.size += 1
+        if 2 * self.size > len(self.high):
+            self.grow()
+
+    def grow(self):
+        occupied = np.flatnonzero(self.high | self.low)
+        keys = zip(self.high[occupied].tolist(), self.low[occupied].tolist())
+        self.high = np.zeros(2 * len(self.high), dtype=np.uint64)
+        self.low = np.zeros(len(self.high), dtype=np.uint64)
+        for high, low in keys:
+            i, _ = self.slot(high, low)
+            self.high[i] = high
+            self.low[i] = low
+
+
 class SerializeNetwork:
     """
     write the reaction network to a database for ingestion by RNMC.
@@ -135,8 +281,43 @@ class SerializeNetwork:
     so that insertions don't grind to a halt. But if the shard size is too small, we need to check for duplicates
     in more tables which also slows down the serialization process. Based on the above link, the optimal shard_size
     is probably somewhere between 1-3 million, but this is going to be hardware dependent.
+
+    the per shard lookups still get slower as the database grows, so by default
+    (dedup="hash") duplicates are detected in memory instead, with a ReactionKeySet
+    of the 128 bit keys returned by reaction_key for every reaction inserted so far.
+    the reaction_string indexes are then built once at the end, or not at all with
+    index_reaction_strings=False. for networks whose key set does not fit in memory,
+    dedup="bloom" keeps a BloomFilter of bloom_filter_bits bits and only runs the
+    SQL lookup when the filter reports a possible duplicate. dedup="sql" is the
+    original behaviour of looking up every reaction in every shard.
+
+    rows are buffered column by column and written commit_barrier at a time, with
+    one executemany per shard and one transaction per batch. the rates of a batch
+    are computed together by rates. with bulk_pragmas=True the database runs with
+    journal_mode=WAL and synchronous=OFF during the load, which is only safe
+    because a failed serialization is simply started over. the default rollback
+    journal and synchronous mode are restored at the end, so RNMC and
+    clone_database see a single plain database file.
+
+    with num_workers > 1 serialization is pipelined: the concerted chunks are
+    generated by a pool of num_workers processes (see ReactionIterator.chunks),
+    while a writer thread drains them from a queue of at most queue_size chunks
+    into the database. the chunks are consumed in order of intermediate index,
+    so the database is the same as with a single process.
     """
 
+    columns = [
+        "reaction_id",
+        "reaction_string",
+        "number_of_reactants",
+        "number_of_products",
+        "reactant_1",
+        "reactant_2",
+        "product_1",
+        "product_2",
+        "dG",
+    ]
+
     def __init__(
         self,
         folder: str,
@@ -147,11 +328,20 @@ class SerializeNetwork:
         constant_barrier: float = 0.0,
         insert_duplicates=False,
         dG_cutoff=0.5,
+        dedup: str = "hash",
+        index_reaction_strings: bool = True,
+        bloom_filter_bits: int = 2 ** 30,
+        bulk_pragmas: bool = True,
+        num_workers: int = 1,
+        queue_size: int = 16,
     ):
 
         if shard_size < 0:
             raise ValueError("shard_size must be positive")
 
+        if dedup not in ("hash", "bloom", "sql"):
+            raise ValueError("dedup must be one of 'hash', 'bloom' or 'sql'")
+
         self.folder = folder
         self.reaction_generator = reaction_generator
         self.shard_size = shard_size
@@ -160,23 +350,48 @@ class SerializeNetwork:
         self.constant_barrier = constant_barrier
         self.insert_duplicates = insert_duplicates
         self.dG_cutoff = dG_cutoff
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.dedup = dedup
+        self.index_reaction_strings = index_reaction_strings
+        # the SQL lookups need the indexes while inserting
+        self.eager_indexes = dedup != "hash"
+        self.reaction_keys = ReactionKeySet()
+        self.bloom_filter = BloomFilter(bloom_filter_bits) if dedup == "bloom" else None
         self.entries_list = self.reaction_generator.entries_box.entries_list
         self.db_postfix = "/rn.sqlite"
         self.current_shard = -1
         self.number_of_reactions = 0
         self.insert_statements: Dict[int, str] = {}
         self.does_exist_statements: Dict[int, str] = {}
+        self.buffer: Dict[str, list] = {column: [] for column in self.columns}
+        # reaction strings waiting in the buffer, for the SQL lookups
+        self.pending_strings: Set[str] = set()
 
         os.mkdir(self.folder)
-        self.con = sqlite3.connect(self.folder + self.db_postfix)
+        # in pipelined mode the connection is only used by the writer thread
+        # while serializing
+        self.con = sqlite3.connect(
+            self.folder + self.db_postfix, check_same_thread=False
+        )
 
         cur = self.con.cursor()
+        if bulk_pragmas:
+            cur.execute("PRAGMA journal_mode=WAL;")
+            cur.execute("PRAGMA synchronous=OFF;")
         cur.executescript(create_metadata_table)
 
         self.new_shard()
-        self.serialize()
+        if num_workers > 1:
+            self.serialize_pipelined()
+        else:
+            self.serialize()
+        self.flush()
 
         self.number_of_shards = self.current_shard + 1
+        if self.index_reaction_strings and not self.eager_indexes:
+            for i in range(self.number_of_shards):
+                cur.executescript(create_reaction_string_index(i))
         cur.execute(
             insert_metadata,
             (
@@ -188,12 +403,17 @@ class SerializeNetwork:
         )
 
         self.con.commit()
+        if bulk_pragmas:
+            cur.execute("PRAGMA journal_mode=DELETE;")
+            cur.execute("PRAGMA synchronous=FULL;")
         self.con.close()
 
     def new_shard(self):
         cur = self.con.cursor()
         self.current_shard += 1
-        cur.executescript(create_reactions_table(self.current_shard))
+        cur.executescript(
+            create_reactions_table(self.current_shard, index=self.eager_indexes)
+        )
         self.insert_statements[self.current_shard] = insert_reaction(self.current_shard)
         self.does_exist_statements[self.current_shard] = does_reaction_exist(
             self.current_shard
@@ -210,6 +430,26 @@ class SerializeNetwork:
 
         return False
 
+    def is_duplicate(self, key: int, reaction_string: str) -> bool:
+        if self.dedup == "hash":
+            return key in self.reaction_keys
+        elif self.bloom_filter is not None:
+            # only reactions the filter may have seen need the exact lookup
+            return self.bloom_filter.might_contain(key) and (
+                reaction_string in self.pending_strings
+                or self.does_reaction_exist(reaction_string)
+            )
+        else:
+            return reaction_string in self.pending_strings or self.does_reaction_exist(
+                reaction_string
+            )
+
+    def record_reaction(self, key: int):
+        if self.dedup == "hash":
+            self.reaction_keys.add(key)
+        elif self.bloom_filter is not None:
+            self.bloom_filter.add(key)
+
     def insert_reaction(
         self,
         reaction_string,
@@ -219,120 +459,207 @@ class SerializeNetwork:
         reactant_2,
         product_1,
         product_2,
-        rate,
         free_energy,
     ):
-
-        cur = self.con.cursor()
-
-        shard = self.number_of_reactions // self.shard_size
-        if shard > self.current_shard:
-            self.new_shard()
-
-        cur.execute(
-            self.insert_statements[self.current_shard],
-            (
-                self.number_of_reactions,
-                reaction_string,
-                number_of_reactants,
-                number_of_products,
-                reactant_1,
-                reactant_2,
-                product_1,
-                product_2,
-                rate,
-                free_energy,
-            ),
+        """
+        buffer a reaction row. the rate is computed and the row written by flush,
+        which runs every commit_barrier rows.
+        """
+
+        values = (
+            self.number_of_reactions,
+            reaction_string,
+            number_of_reactants,
+            number_of_products,
+            reactant_1,
+            reactant_2,
+            product_1,
+            product_2,
+            free_energy,
         )
+        for column, value in zip(self.columns, values):
+            self.buffer[column].append(value)
+        if self.dedup != "hash":
+            self.pending_strings.add(reaction_string)
 
         self.number_of_reactions += 1
 
-        if self.number_of_reactions % self.commit_barrier == 0:
-            self.con.commit()
+        if len(self.buffer["reaction_id"]) >= self.commit_barrier:
+            self.flush()
 
-    def serialize(self):
+    def flush(self):
+        """
+        write the buffered rows with one executemany per shard, compute their rates
+        in one pass and commit.
+        """
 
-        for reaction in self.reaction_generator:
-            reactants = reaction[0]
-            products = reaction[1]
-            forward_free_energy = reaction[2]
-            backward_free_energy = -forward_free_energy
-
-            forward_reaction_string = "".join(
-                [
-                    "+".join([str(i) for i in reactants]),
-                    "->",
-                    "+".join([str(i) for i in products]),
-                ]
-            )
-            # if we are inserting duplicates or the reaction does not exist
-            if self.insert_duplicates or not self.does_reaction_exist(
-                forward_reaction_string
-            ):
+        buffer = self.buffer
+        if not buffer["reaction_id"]:
+            return
 
-                try:
-                    reactant_1_index = int(reactants[0])
-                except IndexError:
-                    reactant_1_index = -1
+        rate_column = rates(
+            np.array(buffer["dG"], dtype=float),
+            self.temperature,
+            self.constant_barrier,
+        ).tolist()
 
-                try:
-                    reactant_2_index = int(reactants[1])
-                except IndexError:
-                    reactant_2_index = -1
+        cur = self.con.cursor()
+        # reaction ids are consecutive, so each shard gets a contiguous slice
+        start = 0
+        ids = buffer["reaction_id"]
+        while start < len(ids):
+            shard = ids[start] // self.shard_size
+            while shard > self.current_shard:
+                self.new_shard()
+            stop = min(len(ids), start + (shard + 1) * self.shard_size - ids[start])
+            cur.executemany(
+                self.insert_statements[shard],
+                zip(
+                    ids[start:stop],
+                    buffer["reaction_string"][start:stop],
+                    buffer["number_of_reactants"][start:stop],
+                    buffer["number_of_products"][start:stop],
+                    buffer["reactant_1"][start:stop],
+                    buffer["reactant_2"][start:stop],
+                    buffer["product_1"][start:stop],
+                    buffer["product_2"][start:stop],
+                    rate_column[start:stop],
+                    buffer["dG"][start:stop],
+                ),
+            )
+            start = stop
 
-                try:
-                    product_1_index = int(products[0])
-                except IndexError:
-                    product_1_index = -1
+        self.con.commit()
+        self.buffer = {column: [] for column in self.columns}
+        self.pending_strings = set()
+
+    def serialize(self):
 
+        for reaction in self.reaction_generator:
+            self.serialize_reaction(reaction)
+
+    def serialize_pipelined(self):
+        """
+        serialize with the concerted chunks generated on a pool of worker processes
+        and written by a separate thread, so generation and database writes overlap.
+        """
+
+        chunks: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+
+        def write():
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    return
+                # after a failure keep draining, so the producer never blocks
+                if errors:
+                    continue
                 try:
-                    product_2_index = int(products[1])
-                except IndexError:
-                    product_2_index = -1
+                    for reaction in chunk:
+                        self.serialize_reaction(reaction)
+                except BaseException as e:
+                    errors.append(e)
 
-                forward_rate = rate(
-                    forward_free_energy, self.temperature, self.constant_barrier
+        generated = self.reaction_generator.chunks(
+            num_workers=self.num_workers, window=self.queue_size
+        )
+        # fork the generation workers before starting the writer thread
+        first = next(generated, None)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            if first is not None:
+                chunks.put(first)
+            for chunk in generated:
+                if errors:
+                    break
+                chunks.put(chunk)
+        finally:
+            chunks.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+
+    def serialize_reaction(self, reaction):
+
+        reactants = reaction[0]
+        products = reaction[1]
+        forward_free_energy = reaction[2]
+        backward_free_energy = -forward_free_energy
+
+        forward_reaction_string = "".join(
+            [
+                "+".join([str(i) for i in reactants]),
+                "->",
+                "+".join([str(i) for i in products]),
+            ]
+        )
+        forward_key = reaction_key(reactants, products, len(self.entries_list))
+        # if we are inserting duplicates or the reaction does not exist
+        if self.insert_duplicates or not self.is_duplicate(
+            forward_key, forward_reaction_string
+        ):
+
+            try:
+                reactant_1_index = int(reactants[0])
+            except IndexError:
+                reactant_1_index = -1
+
+            try:
+                reactant_2_index = int(reactants[1])
+            except IndexError:
+                reactant_2_index = -1
+
+            try:
+                product_1_index = int(products[0])
+            except IndexError:
+                product_1_index = -1
+
+            try:
+                product_2_index = int(products[1])
+            except IndexError:
+                product_2_index = -1
+
+            self.insert_reaction(
+                forward_reaction_string,
+                len(reactants),
+                len(products),
+                reactant_1_index,
+                reactant_2_index,
+                product_1_index,
+                product_2_index,
+                forward_free_energy,
+            )
+            self.record_reaction(forward_key)
+
+            # we don't want to insert the backward reaction if
+            # dG is to large since it is extremely unlikely to fire
+            if backward_free_energy < self.dG_cutoff:
+
+                reverse_reaction_string = "".join(
+                    [
+                        "+".join([str(i) for i in products]),
+                        "->",
+                        "+".join([str(i) for i in reactants]),
+                    ]
                 )
 
                 self.insert_reaction(
-                    forward_reaction_string,
-                    len(reactants),
+                    reverse_reaction_string,
                     len(products),
-                    reactant_1_index,
-                    reactant_2_index,
+                    len(reactants),
                     product_1_index,
                     product_2_index,
-                    forward_rate,
-                    forward_free_energy,
+                    reactant_1_index,
+                    reactant_2_index,
+                    backward_free_energy,
+                )
+                self.record_reaction(
+                    reaction_key(products, reactants, len(self.entries_list))
                 )
-
-                # we don't want to insert the backward reaction if
-                # dG is to large since it is extremely unlikely to fire
-                if backward_free_energy < self.dG_cutoff:
-
-                    reverse_reaction_string = "".join(
-                        [
-                            "+".join([str(i) for i in products]),
-                            "->",
-                            "+".join([str(i) for i in reactants]),
-                        ]
-                    )
-
-                    backward_rate = rate(
-                        backward_free_energy, self.temperature, self.constant_barrier
-                    )
-
-                    self.insert_reaction(
-                        reverse_reaction_string,
-                        len(products),
-                        len(reactants),
-                        product_1_index,
-                        product_2_index,
-                        reactant_1_index,
-                        reactant_2_index,
-                        backward_rate,
-                        backward_free_energy,
-                    )
 
 
 def rate(dG, temperature, constant_barrier):
@@ -350,6 +677,16 @@ def rate(dG, temperature, constant_barrier):
     return rate
 
 
+def rates(dG: np.ndarray, temperature, constant_barrier) -> np.ndarray:
+    """
+    vectorized rate over an array of free energies
+    """
+    kT = KB * temperature
+    max_rate = kT / PLANCK
+    barrier = np.where(dG < 0, constant_barrier, constant_barrier + dG)
+    return max_rate * np.exp(-barrier / kT)
+
+
 def serialize_initial_state(
     folder: str,
     entries_box,
@@ -1,5 +1,6 @@
 from typing import List, Tuple, Set
 
+import networkx as nx
 from pymatgen.analysis.graphs import MoleculeGraph
 
 
@@ -33,3 +34,23 @@ def extract_bond_environment(
                 sub_bonds.append((bond[1], neighbor))
             indices = indices.union(extract_bond_environment(mg, sub_bonds, order - 1))
         return indices
+
+
+def weisfeiler_lehman_hash(graph: nx.Graph, iterations: int = 3) -> str:
+    """
+    Compute a species-labelled Weisfeiler-Lehman hash of a molecule graph.
+
+    Isomorphic graphs (with the same species on corresponding atoms) always get the
+    same hash, so the hash can be used to bucket graphs before running a full
+    isomorphism check; graphs with different hashes are never isomorphic. Bond
+    directions and multiplicities are ignored, as in MoleculeGraph.isomorphic_to.
+
+    :param graph: molecule graph with a "specie" node attribute, ex.
+        MoleculeGraph.graph
+    :param iterations: number of WL refinement iterations
+
+    :return: hex digest
+    """
+    return nx.weisfeiler_lehman_graph_hash(
+        nx.Graph(graph), node_attr="specie", iterations=iterations
+    )
@@ -1,3 +1,4 @@
+import copy
 import os
 import pytest
 import numpy as np
@@ -117,3 +118,47 @@ class TestMolEntry:
             [(1, 2), (2, 5), (3, 4), (3, 6)],
             [(2, 3)],
         ]
+
+    @staticmethod
+    @pytest.mark.skipif(not ob, reason="OpenBabel not present. Skipping...")
+    def test_get_bond_fragments():
+        entry = make_a_mol_entry()
+        fragments = entry.get_bond_fragments()
+
+        # cached, and shared with get_fragments
+        assert entry.get_bond_fragments() is fragments
+        assert entry.get_fragments()[(1, 2)][0] is fragments[(1, 2)].graphs[0]
+        assert list(fragments) == entry.bonds
+
+        ring = fragments[(0, 2)]
+        assert len(ring.graphs) == 1
+        assert ring.formulas == [entry.formula]
+        assert ring.num_bonds == [entry.num_bonds - 1]
+
+        split = fragments[(1, 2)]
+        assert sorted(split.formulas) == ["C2 H3 O1", "H1"]
+        assert sorted(split.num_bonds) == [0, 6]
+        assert split.hashes[0] != split.hashes[1]
+        assert fragments[(3, 4)].hashes == split.hashes
+
+        # the cache is not pickled with the entry
+        copied = copy.deepcopy(entry)
+        assert copied._fragment_cache is None
+        assert entry._fragment_cache is fragments
+
+    @staticmethod
+    @pytest.mark.skipif(not ob, reason="OpenBabel not present. Skipping...")
+    def test_fragment_cache_eviction(monkeypatch):
+        # each entry caches 11 fragment graphs, so only the latest entry fits
+        monkeypatch.setattr(MoleculeEntry, "fragment_cache_size", 15)
+        entry0 = make_a_mol_entry()
+        entry1 = make_a_mol_entry()
+
+        fragments0 = entry0.get_bond_fragments()
+        entry1.get_bond_fragments()
+        assert entry0._fragment_cache is None
+        assert entry1._fragment_cache is not None
+
+        # evicted fragments are rebuilt on demand
+        assert entry0.get_bond_fragments() == fragments0
+        assert entry1._fragment_cache is None
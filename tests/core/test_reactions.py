@@ -2,6 +2,8 @@
 import os
 import unittest
 
+import numpy as np
+
 from monty.serialization import loadfn
 from pymatgen.analysis.graphs import MoleculeGraph
 from pymatgen.analysis.local_env import OpenBabelNN, metal_edge_extender
@@ -14,11 +16,19 @@ from mrnet.core.reactions import (
     IntermolecularReaction,
     IntramolSingleBondChangeReaction,
     MetalHopReaction,
+    GraphHashIndex,
     RedoxReaction,
     bucket_mol_entries,
+    default_cost,
+    edge_costs,
+    exponent,
+    is_isomorphic,
+    rexp,
+    softplus,
     unbucket_mol_entries,
 )
 from mrnet.network.reaction_generation import ReactionIterator, EntriesBox
+from mrnet.utils.graphs import weisfeiler_lehman_hash
 
 try:
     import openbabel as ob
@@ -789,6 +799,44 @@ def test_bucket_mol_entries():
     assert bucket == ref_dict
 
 
+def test_graph_hash_index():
+    molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+    entries_dict = EntriesBox(molecule_entries).entries_dict
+    hash_index = GraphHashIndex(entries_dict)
+
+    for formula in entries_dict:
+        for num_bonds in entries_dict[formula]:
+            for charge in entries_dict[formula][num_bonds]:
+                bucket = entries_dict[formula][num_bonds][charge]
+                for entry in bucket:
+                    candidates = hash_index.candidates(
+                        formula, num_bonds, charge, weisfeiler_lehman_hash(entry.graph)
+                    )
+                    assert entry in candidates
+                    # every isomorphic entry of the bucket is a candidate
+                    isomorphic = [
+                        e for e in bucket if is_isomorphic(entry.graph, e.graph)[0]
+                    ]
+                    assert [e for e in candidates if e in isomorphic] == isomorphic
+                assert hash_index.candidates(formula, num_bonds, charge, "") == []
+
+
+def test_edge_costs():
+    free_energies = np.linspace(-3.0, 12.0, 31)
+    costs = edge_costs(free_energies)
+    scalar = {
+        "softplus": softplus,
+        "exponent": exponent,
+        "rexp": rexp,
+        "default_cost": default_cost,
+    }
+    assert set(costs) == set(scalar)
+    assert costs["rexp"].dtype == np.longdouble
+    for name, func in scalar.items():
+        expected = np.array([func(x) for x in free_energies], dtype=np.longdouble)
+        np.testing.assert_allclose(costs[name], expected, rtol=1e-12)
+
+
 def test_unbucket_mol_entries():
     d = {"a": {"aa": [0, 1, 2], "aaa": [3, 4]}, "b": {"bb": [5, 6, 7], "bbb": (8, 9)}}
     out = unbucket_mol_entries(d)
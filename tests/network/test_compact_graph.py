@@ -0,0 +1,321 @@
+# coding: utf-8
+import copy
+import os
+import unittest
+from unittest import mock
+
+import networkx as nx
+import numpy as np
+from monty.serialization import loadfn
+from pymatgen.util.testing import PymatgenTest
+from scipy.sparse.csgraph import dijkstra
+
+from mrnet.network.compact_graph import (
+    CompactGraph,
+    nx_multi_source_paths,
+    nx_reachable_sources,
+)
+from mrnet.network.reaction_generation import ReactionIterator, EntriesBox
+from mrnet.network.reaction_network import ReactionNetwork
+from mrnet.network.reaction_path import ReactionPath
+from mrnet.stochastic.serialize import find_mol_entry_from_xyz_and_charge
+
+__author__ = "Daniel Barter"
+
+test_dir = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "..",
+    "test_files",
+    "reaction_network_files",
+)
+
+
+def build_network(**kwargs):
+    molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+    li_plus_mol_entry = find_mol_entry_from_xyz_and_charge(
+        molecule_entries, (os.path.join(test_dir, "Li.xyz")), 1
+    )
+    ec_mol_entry = find_mol_entry_from_xyz_and_charge(
+        molecule_entries, (os.path.join(test_dir, "EC.xyz")), 0
+    )
+    ledc_mol_entry = find_mol_entry_from_xyz_and_charge(
+        molecule_entries, (os.path.join(test_dir, "LEDC.xyz")), 0
+    )
+    rn = ReactionNetwork(ReactionIterator(EntriesBox(molecule_entries)), **kwargs)
+    starts = [li_plus_mol_entry.parameters["ind"], ec_mol_entry.parameters["ind"]]
+    return rn, starts, ledc_mol_entry.parameters["ind"]
+
+
+class TestCompactGraph(PymatgenTest):
+    @classmethod
+    def setUpClass(cls):
+        cls.RN, cls.starts, cls.target = build_network()
+        cls.CG = CompactGraph(cls.RN.graph)
+
+    def test_layout(self):
+        self.assertEqual(self.CG.num_nodes, len(self.RN.graph.nodes))
+        self.assertEqual(self.CG.num_edges, len(self.RN.graph.edges))
+        self.assertEqual(self.CG.num_species, len(self.RN.entries_list))
+        for node in self.RN.graph.nodes:
+            self.assertEqual(self.CG.label(self.CG.node_id(node)), node)
+            self.assertEqual(self.CG.is_reaction(node), isinstance(node, str))
+        for u, v, data in self.RN.graph.edges(data=True):
+            self.assertAlmostEqual(
+                self.CG.edge_weight(u, v, "default_cost"), data["default_cost"]
+            )
+
+    def test_reaction_species(self):
+        for node in self.RN.graph.nodes:
+            if isinstance(node, str):
+                self.assertEqual(
+                    self.CG.reaction_species(node),
+                    ReactionPath.reaction_species(node, self.RN.graph),
+                )
+
+    def test_reaction_node_table(self):
+        RN, _, _ = build_network(reaction_node_ids=True)
+        CG = CompactGraph(RN.graph)
+        for node in RN.graph.nodes:
+            if isinstance(node, str):
+                self.assertEqual(
+                    CG.reaction_species(node), self.CG.reaction_species(node)
+                )
+
+    def test_single_source_paths(self):
+        for start in self.starts:
+            dist, paths = self.CG.single_source_paths(start, "default_cost")
+            nx_dist = nx.single_source_dijkstra_path_length(
+                self.RN.graph, start, weight="default_cost"
+            )
+            nx_dist = {k: v for k, v in nx_dist.items() if isinstance(k, int)}
+            self.assertEqual(set(dist), set(nx_dist))
+            for node, cost in dist.items():
+                self.assertAlmostEqual(cost, nx_dist[node])
+                self.assertAlmostEqual(
+                    self.CG.path_cost(paths[node], "default_cost"), cost
+                )
+
+    def test_multi_source_dijkstra(self):
+        sources = self.starts + [0, 5, 10]
+        dist, pred = self.CG.multi_source_dijkstra(sources, "default_cost")
+        for ii, source in enumerate(sources):
+            single_dist, single_pred = self.CG.dijkstra(source, "default_cost")
+            self.assertArrayAlmostEqual(dist[ii], single_dist)
+
+        # the exact mode is one scipy call, the python search is only for a top k
+        for k in [None, len(sources)]:
+            with mock.patch(
+                "mrnet.network.compact_graph.dijkstra", wraps=dijkstra
+            ) as scipy_dijkstra, mock.patch(
+                "mrnet.network.compact_graph.multi_source_labels"
+            ) as labels:
+                self.CG.multi_source_dijkstra(sources, "default_cost", k)
+            scipy_dijkstra.assert_called_once()
+            self.assertEqual(
+                scipy_dijkstra.call_args.kwargs["indices"],
+                [self.CG.index[s] for s in sources],
+            )
+            labels.assert_not_called()
+
+        results = self.CG.multi_source_paths(sources, "default_cost")
+        for source in sources:
+            costs, paths = results[source]
+            self.assertEqual(
+                costs, self.CG.single_source_paths(source, "default_cost")[0]
+            )
+            for node, cost in costs.items():
+                self.assertEqual(paths[node][0], source)
+                self.assertAlmostEqual(
+                    self.CG.path_cost(paths[node], "default_cost"), cost
+                )
+
+        for k in [1, 2, 4]:
+            top_dist, top_pred = self.CG.multi_source_dijkstra(
+                sources, "default_cost", k
+            )
+            for node_id in range(self.CG.num_nodes):
+                kept = np.flatnonzero(np.isfinite(top_dist[:, node_id]))
+                reachable = np.sort(dist[:, node_id][np.isfinite(dist[:, node_id])])
+                self.assertEqual(len(kept), min(k, len(reachable)))
+                self.assertArrayAlmostEqual(
+                    np.sort(top_dist[kept, node_id]), reachable[: len(kept)]
+                )
+                for ii in kept:
+                    self.assertAlmostEqual(top_dist[ii, node_id], dist[ii, node_id])
+                    path = [
+                        self.CG.label(n)
+                        for n in self.CG._path_ids(top_pred[ii], node_id)
+                    ]
+                    self.assertEqual(path[0], sources[ii])
+                    self.assertAlmostEqual(
+                        self.CG.path_cost(path, "default_cost"), dist[ii, node_id]
+                    )
+
+    def test_nx_multi_source_paths(self):
+        sources = self.starts + [0, 5, 10]
+        exact = nx_multi_source_paths(self.RN.graph, sources, "default_cost")
+        for source in sources:
+            nx_dist, nx_paths = nx.single_source_dijkstra(
+                self.RN.graph, source, weight="default_cost"
+            )
+            costs, paths = exact[source]
+            self.assertEqual(
+                set(costs), {n for n in nx_dist if isinstance(n, int)}
+            )
+            for node, cost in costs.items():
+                self.assertAlmostEqual(cost, nx_dist[node])
+                self.assertEqual(paths[node], nx_paths[node])
+
+        reach = nx_reachable_sources(self.RN.graph, sources)
+        compact_reach = self.CG.reachable_sources(sources)
+        for node in self.RN.graph.nodes:
+            if isinstance(node, int):
+                mask = sum(
+                    1 << ii for ii, s in enumerate(sources) if node in exact[s][0]
+                )
+                self.assertEqual(reach.get(node, 0), mask)
+                self.assertEqual(compact_reach.get(node, 0), mask)
+
+        k = 2
+        top = nx_multi_source_paths(self.RN.graph, sources, "default_cost", k)
+        for node in exact[sources[0]][0]:
+            reachable = sorted(
+                exact[s][0][node] for s in sources if node in exact[s][0]
+            )
+            kept = [s for s in sources if node in top[s][0]]
+            self.assertEqual(len(kept), min(k, len(reachable)))
+            for source in kept:
+                self.assertAlmostEqual(top[source][0][node], exact[source][0][node])
+                self.assertAlmostEqual(
+                    nx.path_weight(
+                        self.RN.graph, top[source][1][node], "default_cost"
+                    ),
+                    exact[source][0][node],
+                )
+
+    def test_repair_shortest_paths(self):
+        CG = copy.deepcopy(self.CG)
+        sources = self.starts + [0, 5]
+        dist, pred = CG.multi_source_dijkstra(sources, "default_cost")
+        rng = np.random.RandomState(7)
+        weighted = np.flatnonzero(CG.weights["default_cost"] > 0)
+        for _ in range(5):
+            attrs = {}
+            for pos in rng.choice(weighted, 10, replace=False):
+                u, v = CG.label(CG.sources[pos]), CG.label(CG.indices[pos])
+                attrs[(u, v)] = {
+                    "default_cost": CG.weights["default_cost"][pos] * rng.uniform(0, 3)
+                }
+            CG.set_edge_weights(attrs)
+            changed = CG.pop_changed_edges("default_cost")
+            self.assertEqual(len(changed), len(attrs))
+            CG.repair_shortest_paths(dist, pred, "default_cost", changed)
+
+            expected, _ = CG.multi_source_dijkstra(sources, "default_cost")
+            self.assertArrayAlmostEqual(dist, expected)
+            # the cached python copies of the weights follow the changes too
+            top_dist, _ = CG.multi_source_dijkstra(sources, "default_cost", 1)
+            kept = np.isfinite(top_dist)
+            self.assertArrayAlmostEqual(top_dist[kept], expected[kept])
+            self.assertArrayAlmostEqual(
+                top_dist.min(axis=0), expected.min(axis=0)
+            )
+            for ii in range(len(sources)):
+                for node_id in np.flatnonzero(np.isfinite(dist[ii])):
+                    path = [CG.label(n) for n in CG._path_ids(pred[ii], node_id)]
+                    self.assertEqual(path[0], sources[ii])
+                    self.assertAlmostEqual(
+                        CG.path_cost(path, "default_cost"), dist[ii, node_id]
+                    )
+        self.assertEqual(len(CG.pop_changed_edges("default_cost")), 0)
+
+    def test_shortest_simple_paths(self):
+        start = self.starts[1]
+        expected = []
+        for path in nx.shortest_simple_paths(
+            self.RN.graph, start, self.target, weight="default_cost"
+        ):
+            expected.append(nx.path_weight(self.RN.graph, path, "default_cost"))
+            if len(expected) == 10:
+                break
+        computed = []
+        for path in self.CG.shortest_simple_paths(start, self.target, "default_cost"):
+            self.assertEqual(len(set(path)), len(path))
+            computed.append(self.CG.path_cost(path, "default_cost"))
+            if len(computed) == 10:
+                break
+        for x, y in zip(computed, expected):
+            self.assertAlmostEqual(x, y)
+
+        with self.assertRaises(nx.NetworkXNoPath):
+            self.CG.shortest_path(
+                start,
+                self.target,
+                "default_cost",
+                ignore_nodes=list(self.RN.graph.predecessors(self.target)),
+            )
+
+    def test_solve_prerequisites(self):
+        RN, starts, target = build_network(graph_backend="compact")
+        RN_nx, _, _ = build_network()
+        PRs, solved_PRs = RN.solve_prerequisites(starts, "default_cost")
+        PRs_nx, solved_PRs_nx = RN_nx.solve_prerequisites(starts, "default_cost")
+
+        self.assertEqual(solved_PRs, solved_PRs_nx)
+        for node in PRs_nx:
+            for start in PRs_nx[node]:
+                self.assertAlmostEqual(PRs[node][start].cost, PRs_nx[node][start].cost)
+
+        RN_inc, _, _ = build_network(graph_backend="compact")
+        PRs_inc, solved_PRs_inc = RN_inc.solve_prerequisites(
+            starts, "default_cost", incremental=True
+        )
+        self.assertEqual(solved_PRs_inc, solved_PRs)
+        self.assertEqual(RN_inc.min_cost, RN.min_cost)
+        for node in PRs:
+            for start in PRs[node]:
+                self.assertEqual(PRs_inc[node][start].cost, PRs[node][start].cost)
+        with self.assertRaises(ValueError):
+            RN_nx.solve_prerequisites(starts, "default_cost", incremental=True)
+        with self.assertRaises(ValueError):
+            RN_inc.solve_prerequisites(
+                starts, "default_cost", incremental=True, top_k_starts=1
+            )
+
+        # only the k cheapest starts of each PR, on both backends, including
+        # starts which do not reach every PR
+        for top_starts in [starts, starts + [0, 5]]:
+            RN_exact, _, _ = build_network()
+            PRs_exact, solved_PRs_exact = RN_exact.solve_prerequisites(
+                top_starts, "default_cost"
+            )
+            for graph_backend in ["networkx", "compact"]:
+                for k in range(1, len(top_starts)):
+                    RN_top, _, _ = build_network(graph_backend=graph_backend)
+                    PRs_top, solved_PRs_top = RN_top.solve_prerequisites(
+                        top_starts, "default_cost", top_k_starts=k
+                    )
+                    self.assertEqual(solved_PRs_top, solved_PRs_exact)
+                    self.assertEqual(RN_top.min_cost, RN_exact.min_cost)
+                    for node in PRs_exact:
+                        self.assertAlmostEqual(
+                            min(
+                                [p.cost for p in PRs_top[node].values() if p.path],
+                                default=0,
+                            ),
+                            min(
+                                [p.cost for p in PRs_exact[node].values() if p.path],
+                                default=0,
+                            ),
+                        )
+
+        _, paths, _ = RN.find_paths(starts, target, "default_cost", num_paths=5)
+        _, paths_nx, _ = RN_nx.find_paths(starts, target, "default_cost", num_paths=5)
+        self.assertEqual(len(paths), 5)
+        for path, path_nx in zip(paths, paths_nx):
+            self.assertAlmostEqual(path["cost"], path_nx["cost"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,8 @@ import copy
 import pickle
 import math
 import os
+import tempfile
+from unittest import mock
 
 import numpy as np
 from scipy.constants import N_A
@@ -15,6 +17,7 @@ from mrnet.network.reaction_generation import (
     ReactionIterator,
     EntriesBox,
     ReactionGenerator,
+    _cancel_species,
 )
 from mrnet.stochastic.serialize import (
     SerializeNetwork,
@@ -57,6 +60,19 @@ class TestEntriesBox(PymatgenTest):
         entries_unfiltered = EntriesBox(molecule_entries, remove_complexes=False)
         assert len(entries_unfiltered.entries_list) == 200
 
+    def test_isomorphic_duplicates(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        duplicates = copy.deepcopy(molecule_entries)
+        for entry in duplicates:
+            entry.correction = 1.0
+            entry.entry_id = str(entry.entry_id) + "_dup"
+        entries_box = EntriesBox(molecule_entries)
+        dup_box = EntriesBox(duplicates + molecule_entries)
+        # the lower energy copy of each isomorphic pair is kept
+        assert [e.entry_id for e in dup_box.entries_list] == [
+            e.entry_id for e in entries_box.entries_list
+        ]
+
 
 class TestReactionIterator(PymatgenTest):
     def test_reaction_iterator(self):
@@ -107,6 +123,51 @@ class TestReactionIterator(PymatgenTest):
         ]
         assert rxns_filtered == filtered_reference
 
+    def test_chunks(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        entries_box = EntriesBox(molecule_entries)
+        reactions = list(ReactionIterator(entries_box, single_elem_interm_ignore=[]))
+
+        for num_workers in [1, 3]:
+            reaction_iterator = ReactionIterator(
+                entries_box, single_elem_interm_ignore=[]
+            )
+            # start in the middle of the elementary chunk
+            chunked = [next(reaction_iterator), next(reaction_iterator)]
+            for chunk in reaction_iterator.chunks(num_workers=num_workers, window=2):
+                self.assertTrue(len(chunk) > 0)
+                chunked.extend(chunk)
+            self.assertEqual(chunked, reactions)
+            self.assertEqual(list(reaction_iterator), [])
+
+        # without fork the workers can not get the iterator, chunks are serial
+        with mock.patch(
+            "mrnet.network.reaction_generation._can_fork", return_value=False
+        ):
+            reaction_iterator = ReactionIterator(
+                entries_box, single_elem_interm_ignore=[]
+            )
+            chunked = []
+            for chunk in reaction_iterator.chunks(num_workers=3, window=2):
+                chunked.extend(chunk)
+            self.assertEqual(chunked, reactions)
+
+    def test_parallel_iteration(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        entries_box = EntriesBox(molecule_entries)
+        reactions = list(ReactionIterator(entries_box, single_elem_interm_ignore=[]))
+
+        reaction_iterator = ReactionIterator(
+            entries_box,
+            single_elem_interm_ignore=[],
+            num_workers=3,
+            concerted_window=2,
+        )
+        self.assertEqual(list(reaction_iterator), reactions)
+        self.assertEqual(
+            reaction_iterator.intermediate_index, len(entries_box.entries_list) - 1
+        )
+
 
 class TestReactionGenerator(PymatgenTest):
     def test_build(self):
@@ -121,6 +182,138 @@ class TestReactionGenerator(PymatgenTest):
         assert len(RG.graph.edges) == 320
         assert len(RG.graph.nodes) == 164
 
+    def test_build_parallel(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        entries_box = EntriesBox(molecule_entries)
+        reaction_types = [
+            "RedoxReaction",
+            "IntramolSingleBondChangeReaction",
+            "IntermolecularReaction",
+            "CoordinationBondChangeReaction",
+        ]
+        serial = ReactionGenerator(entries_box)
+        serial.build(reaction_types)
+        parallel = ReactionGenerator(entries_box, num_workers=2, chunk_size=3)
+        parallel.build(reaction_types)
+
+        assert len(parallel.reactions) == len(serial.reactions)
+        for r, r_ref in zip(parallel.reactions, serial.reactions):
+            assert r.__class__ == r_ref.__class__
+            assert r.parameters["ind"] == r_ref.parameters["ind"]
+            assert r.reactants[0] is r_ref.reactants[0]
+            assert [p.parameters["ind"] for p in r.products] == [
+                p.parameters["ind"] for p in r_ref.products
+            ]
+            assert r.free_energy_A == r_ref.free_energy_A
+        assert list(parallel.graph.nodes) == list(serial.graph.nodes)
+        assert parallel.matrix == serial.matrix
+
+    def test_build_reaction_cache(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        entries_box = EntriesBox(molecule_entries)
+        reference = ReactionGenerator(entries_box)
+        reference.build()
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            RG = ReactionGenerator(entries_box, reaction_cache_dir=cache_dir)
+            RG.build()
+            assert len(os.listdir(cache_dir)) == 1
+            cached = ReactionGenerator(entries_box, reaction_cache_dir=cache_dir)
+            cached.build()
+            assert len(os.listdir(cache_dir)) == 1
+
+            for r, r_ref in zip(cached.reactions, RG.reactions):
+                assert r.__class__ == r_ref.__class__
+                assert r.parameters["ind"] == r_ref.parameters["ind"]
+                assert list(r.reactant_indices) == list(r_ref.reactant_indices)
+                assert list(r.product_indices) == list(r_ref.product_indices)
+                assert r.free_energy_A == r_ref.free_energy_A
+            assert len(cached.reactions) == len(reference.reactions)
+            assert cached.graph.nodes(data=True) == reference.graph.nodes(data=True)
+            assert sorted(cached.graph.edges(data=True), key=str) == sorted(
+                reference.graph.edges(data=True), key=str
+            )
+            assert cached.matrix == reference.matrix
+
+            # atom mappings are part of the key and survive the round trip
+            redox = ReactionGenerator(entries_box, reaction_cache_dir=cache_dir)
+            redox.build({"RedoxReaction"}, determine_atom_mappings=True)
+            assert len(os.listdir(cache_dir)) == 2
+            redox_cached = ReactionGenerator(entries_box, reaction_cache_dir=cache_dir)
+            redox_cached.build({"RedoxReaction"}, determine_atom_mappings=True)
+            for r, r_ref in zip(redox_cached.reactions, redox.reactions):
+                assert r.reactants_atom_mapping == r_ref.reactants_atom_mapping
+                assert r.products_atom_mapping == r_ref.products_atom_mapping
+
+    def test_build_matrix(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        RG = ReactionGenerator(EntriesBox(molecule_entries))
+        RG.build()
+
+        # the nested dictionaries the matrix used to be built as
+        matrix = {i: {} for i in range(len(RG.entries_box.entries_list))}
+        matrix_inverse = {i: {} for i in range(len(RG.entries_box.entries_list))}
+        for node in RG.graph.nodes:
+            if (
+                isinstance(node, str)
+                and "electron" not in RG.graph.nodes[node]["rxn_type"]
+            ):
+                dG = RG.graph.nodes[node]["free_energy"]
+                for u in RG.graph.predecessors(node):
+                    for v in RG.graph.successors(node):
+                        matrix[u].setdefault(v, []).append((node, dG, "e"))
+        for u in matrix:
+            for v in matrix[u]:
+                matrix_inverse[v].setdefault(u, []).extend(matrix[u][v])
+
+        computed = RG.matrix.to_dict()
+        assert computed == matrix
+        assert all(list(computed[u]) == list(matrix[u]) for u in matrix)
+        computed_inverse = RG.matrix_inverse.to_dict()
+        assert computed_inverse == matrix_inverse
+        assert all(
+            list(computed_inverse[v]) == list(matrix_inverse[v]) for v in matrix_inverse
+        )
+        assert RG.matrix.nnz == RG.matrix_inverse.nnz
+        assert RG.matrix_inverse.transpose().to_dict() == matrix
+
+    def test_concerted_candidates(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        RG = ReactionGenerator(
+            EntriesBox(molecule_entries), filter_concerted_metal_coordination=True
+        )
+        RG.build()
+
+        for entry in RG.entries_box.entries_list:
+            # pairwise reference through concerted_reaction_filter
+            ind = entry.parameters["ind"]
+            out_nodes, out_dGs = RG.matrix.row_reactions(ind)
+            in_nodes, in_dGs = RG.matrix_inverse.row_reactions(ind)
+            expected = []
+            for kr, r_start, r_stop in RG.matrix.row_groups(ind):
+                for kc, c_start, c_stop in RG.matrix_inverse.row_groups(ind):
+                    if kr == kc:
+                        continue
+                    for s2 in range(r_start, r_stop):
+                        for e2 in range(c_start, c_stop):
+                            if in_dGs[e2] > 0 and out_dGs[s2] + in_dGs[e2] < 0:
+                                r, r_node = RG.concerted_reaction_filter(
+                                    in_nodes[e2], out_nodes[s2]
+                                )
+                                if r is not None:
+                                    expected.append(r_node)
+            _, computed = RG.identify_concerted_rxns_for_specific_intermediate(
+                entry, single_elem_interm_ignore=[]
+            )
+            assert computed == expected
+
+        reactants, products = _cancel_species(
+            np.array([[1, 6, 2, -1], [4, 4, 4, 5], [2, 1, -1, -1]]),
+            np.array([[3, 7, 2, 2], [4, 4, 4, 6], [1, 2, -1, -1]]),
+        )
+        assert reactants.tolist() == [[-1, -1, 1, 6], [-1, -1, 4, 5], [-1] * 4]
+        assert products.tolist() == [[-1, 2, 3, 7], [-1, -1, 4, 6], [-1] * 4]
+
     def test_parse_reaction_node(self):
 
         nodes = ["19+32,673", "41,992", "1+652,53+40", "4,6+5"]
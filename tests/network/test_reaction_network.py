@@ -17,13 +17,14 @@ from pymatgen.analysis.graphs import MoleculeGraph
 from pymatgen.analysis.local_env import OpenBabelNN, metal_edge_extender
 
 from mrnet.core.mol_entry import MoleculeEntry
-from mrnet.core.reactions import RedoxReaction
+from mrnet.core.reactions import RedoxReaction, default_cost, rexp, softplus
 from mrnet.network.reaction_network import (
     ReactionPath,
     ReactionNetwork,
     path_finding_wrapper,
 )
-from mrnet.network.reaction_generation import ReactionIterator
+from mrnet.network.reaction_generation import ReactionIterator, EntriesBox
+from mrnet.network.reaction_nodes import parse_reaction_node
 from mrnet.stochastic.serialize import find_mol_entry_from_xyz_and_charge
 
 import openbabel as ob
@@ -63,6 +64,125 @@ class DanielTest(PymatgenTest):
 
         assert result_canonicalized == expected
 
+    def test_update_edge_weights(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        RN = ReactionNetwork(ReactionIterator(EntriesBox(molecule_entries)))
+        RN.weight = "default_cost"
+        orig_graph = copy.deepcopy(RN.graph)
+        base_weights = RN.build_PR_base_weights("default_cost")
+        self.assertFalse(base_weights.flags.writeable)
+
+        min_cost = {PR: 0.1 * PR for PR in RN.PR_record}
+        attrs = RN.update_edge_weights(min_cost)
+        # base weights are unchanged, so a second update does not accumulate
+        self.assertEqual(RN.update_edge_weights(min_cost), attrs)
+        self.assertEqual(RN.update_edge_weights(min_cost, orig_graph), attrs)
+        for (u, v), value in attrs.items():
+            self.assertEqual(RN.graph[u][v]["default_cost"], value["default_cost"])
+
+    def test_edge_costs(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        RN = ReactionNetwork(ReactionIterator(EntriesBox(molecule_entries)))
+        for u, v, data in RN.graph.edges(data=True):
+            if isinstance(v, str):
+                free_energy = RN.graph.nodes[v]["free_energy"]
+                self.assertAlmostEqual(data["softplus"], softplus(free_energy))
+                self.assertEqual(data["rexp"], rexp(free_energy))
+                self.assertAlmostEqual(
+                    data["default_cost"] / default_cost(free_energy), 1.0
+                )
+                self.assertEqual(data["weight"], 1.0)
+            else:
+                self.assertEqual(data["default_cost"], 0.0)
+
+    def test_reaction_node_ids(self):
+        molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+        li_plus_mol_entry = find_mol_entry_from_xyz_and_charge(
+            molecule_entries, (os.path.join(test_dir, "Li.xyz")), 1
+        )
+        ec_mol_entry = find_mol_entry_from_xyz_and_charge(
+            molecule_entries, (os.path.join(test_dir, "EC.xyz")), 0
+        )
+        ledc_mol_entry = find_mol_entry_from_xyz_and_charge(
+            molecule_entries, (os.path.join(test_dir, "LEDC.xyz")), 0
+        )
+        starts = [li_plus_mol_entry.parameters["ind"], ec_mol_entry.parameters["ind"]]
+        target = ledc_mol_entry.parameters["ind"]
+
+        RN = ReactionNetwork(
+            ReactionIterator(EntriesBox(molecule_entries)), reaction_node_ids=True
+        )
+        RN_ref = ReactionNetwork(ReactionIterator(EntriesBox(molecule_entries)))
+        RN_compact = ReactionNetwork(
+            ReactionIterator(EntriesBox(molecule_entries)),
+            reaction_node_ids=True,
+            graph_backend="compact",
+        )
+        table = RN.reaction_nodes
+        self.assertIs(RN.graph.graph["reaction_nodes"], table)
+        reaction_nodes = [n for n in RN.graph.nodes if isinstance(n, str)]
+        self.assertEqual(len(table), len(reaction_nodes))
+        for node in reaction_nodes:
+            self.assertEqual(table.label(table.node_id(node)), node)
+            self.assertEqual(table.species(node), parse_reaction_node(node))
+            self.assertEqual(
+                ReactionPath.reaction_species(node, RN.graph),
+                ReactionPath.reaction_species(node, RN_ref.graph),
+            )
+
+        RN.solve_prerequisites(starts, "default_cost")
+        RN_ref.solve_prerequisites(starts, "default_cost")
+        _, paths, _ = RN.find_paths(starts, target, "default_cost", num_paths=5)
+        _, paths_ref, _ = RN_ref.find_paths(starts, target, "default_cost", num_paths=5)
+        self.assertEqual(paths, paths_ref)
+        RN_compact.solve_prerequisites(starts, "default_cost")
+        _, paths_compact, _ = RN_compact.find_paths(
+            starts, target, "default_cost", num_paths=5
+        )
+        self.assertEqual(
+            [p["cost"] for p in paths_compact], [p["cost"] for p in paths_ref]
+        )
+        self.assertIsNotNone(RN_compact.compact_graph)
+
+        removed = ec_mol_entry.parameters["ind"]
+        self.assertTrue(len(table.reactions_with(removed)) > 0)
+        RN.remove_node([removed])
+        RN_ref.remove_node([removed])
+        RN_compact.remove_node([removed])
+        # the CSR arrays of the removed nodes are not reused
+        self.assertIsNone(RN_compact.compact_graph)
+        li = li_plus_mol_entry.parameters["ind"]
+        for path, path_ref in zip(
+            RN_compact.valid_shortest_simple_paths(li, target),
+            RN_ref.valid_shortest_simple_paths(li, target),
+        ):
+            self.assertNotIn(removed, path)
+            for node in path:
+                self.assertIn(node, RN_ref.graph)
+            self.assertAlmostEqual(
+                sum(
+                    RN_compact.graph[u][v]["default_cost"]
+                    for u, v in zip(path, path[1:])
+                ),
+                sum(
+                    RN_ref.graph[u][v]["default_cost"]
+                    for u, v in zip(path_ref, path_ref[1:])
+                ),
+            )
+            break
+        self.assertEqual(table.reactions_with(removed), [])
+        self.assertEqual(set(RN.graph.nodes), set(RN_ref.graph.nodes))
+        self.assertEqual(RN.PR_record, RN_ref.PR_record)
+        self.assertEqual(RN.Reactant_record, RN_ref.Reactant_record)
+        for node in RN.graph.nodes:
+            if isinstance(node, str):
+                self.assertNotIn(removed, sum(parse_reaction_node(node), []))
+        for record in (RN.PR_record, RN.Reactant_record):
+            self.assertNotIn(removed, record)
+            for edges in record.values():
+                for u, v in edges:
+                    self.assertIn(v, RN.graph)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,6 +4,10 @@ import copy
 import pickle
 import math
 import os
+import sqlite3
+import tempfile
+from functools import lru_cache
+from types import SimpleNamespace
 
 import numpy as np
 from scipy.constants import N_A
@@ -12,14 +16,42 @@ from pymatgen.util.testing import PymatgenTest
 
 from mrnet.network.reaction_generation import ReactionIterator, EntriesBox
 from mrnet.stochastic.serialize import (
+    BloomFilter,
+    ReactionKeySet,
     SerializeNetwork,
+    rate,
+    rates,
+    reaction_key,
     serialize_simulation_parameters,
     find_mol_entry_from_xyz_and_charge,
     run_simulator,
     clone_database,
     serialize_initial_state,
 )
-from mrnet.stochastic.analyze import SimulationAnalyzer, NetworkUpdater
+from mrnet.stochastic.analyze import (
+    SimulationAnalyzer,
+    NetworkUpdater,
+    NegativeStateError,
+    ReactionTable,
+    StreamingStatistics,
+    count_statistics,
+    first_production_steps,
+    get_reaction,
+    history_pathway,
+    incidence_matrices,
+    reaction_counts,
+    reaction_profile_dict,
+    species_at_steps,
+    species_production,
+    stoichiometry_matrix,
+    time_dep_profiles,
+    update_state,
+)
+from mrnet.stochastic.histories import (
+    HistoryFiles,
+    HistorySequence,
+    SimulationHistories,
+)
 from mrnet.utils.constants import ROOM_TEMP
 
 try:
@@ -38,6 +70,66 @@ test_dir = os.path.join(
 )
 
 
+@lru_cache(maxsize=None)
+def load_entries_box():
+    molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
+    return EntriesBox(molecule_entries)
+
+
+def serialize_network(tmp_dir, **kwargs):
+    """
+    serialize the reactions of ronalds_MoleculeEntry.json, in shards of 100,
+    into a network folder in tmp_dir and return the folder.
+    """
+    folder = os.path.join(tmp_dir, "network")
+    SerializeNetwork(
+        folder, ReactionIterator(load_entries_box()), shard_size=100, **kwargs
+    )
+    return folder
+
+
+class LargeReactionIterator:
+    """
+    stands in for a ReactionIterator over number_of_species species, yielding
+    reactions between species with indices above 65535, each one twice.
+    """
+
+    def __init__(self, number_of_species=70000, number_of_reactions=300):
+        self.entries_box = SimpleNamespace(entries_list=[None] * number_of_species)
+        rng = np.random.default_rng(3)
+        self.reactions = []
+        for _ in range(number_of_reactions):
+            reactants = [int(i) for i in rng.integers(65530, number_of_species, 2)]
+            products = [int(rng.integers(65530, number_of_species))]
+            self.reactions.append((reactants, products, float(rng.normal())))
+        self.reactions += self.reactions
+
+    def __iter__(self):
+        return iter(self.reactions)
+
+
+def toy_network():
+    """
+    the reactions 0: A -> B, 1: B + B -> C, 2: C -> A + A, 3: A + B -> A + C
+    of the species A = 0, B = 1 and C = 2, as dicts and as a ReactionTable.
+    """
+    reactions = [
+        {"reactants": [0], "products": [1]},
+        {"reactants": [1, 1], "products": [2]},
+        {"reactants": [2], "products": [0, 0]},
+        {"reactants": [0, 1], "products": [0, 2]},
+    ]
+    table = ReactionTable(sqlite3.connect(":memory:"), len(reactions), 10, 1)
+    table.reactants[:] = -1
+    table.products[:] = -1
+    table.dG[:] = np.nan
+    table.loaded_shards[:] = True
+    for i, reaction in enumerate(reactions):
+        table.reactants[i, : len(reaction["reactants"])] = reaction["reactants"]
+        table.products[i, : len(reaction["products"])] = reaction["products"]
+    return reactions, table
+
+
 class RNMC(PymatgenTest):
     def test_rnmc(self):
         molecule_entries = loadfn(os.path.join(test_dir, "ronalds_MoleculeEntry.json"))
@@ -113,3 +205,707 @@ class RNMC(PymatgenTest):
         os.system("rm -r " + network_folder_1)
         os.system("rm -r " + network_folder_2)
         os.system("rm -r " + param_folder)
+
+
+class TestSerializeNetwork(PymatgenTest):
+    def serialize(self, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = serialize_network(tmp_dir, **kwargs)
+            # the bulk load pragmas do not outlive the serialization
+            self.assertEqual(os.listdir(folder), ["rn.sqlite"])
+            con = sqlite3.connect(folder + "/rn.sqlite")
+            journal_mode = con.execute("PRAGMA journal_mode;").fetchone()[0]
+            self.assertEqual(journal_mode, "delete")
+            metadata = con.execute("SELECT * FROM metadata;").fetchone()
+            rows = []
+            for shard in range(metadata[3]):
+                rows += con.execute(
+                    "SELECT * FROM reactions_{} ORDER BY reaction_id;".format(shard)
+                ).fetchall()
+            indexes = con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index';"
+            ).fetchall()
+            con.close()
+        return metadata, rows, sorted(i[0] for i in indexes)
+
+    def test_dedup(self):
+        metadata, rows, indexes = self.serialize(dedup="sql")
+        self.assertEqual(len(rows), metadata[1])
+        self.assertEqual(len({row[1] for row in rows}), len(rows))
+        self.assertEqual(indexes, ["reaction_0_string_idx", "reaction_1_string_idx"])
+
+        # the in memory dedup modes insert exactly the same reactions
+        self.assertEqual(self.serialize(dedup="hash"), (metadata, rows, indexes))
+        self.assertEqual(self.serialize(dedup="bloom"), (metadata, rows, indexes))
+        # a tiny filter reports many false positives, which the lookups resolve
+        self.assertEqual(
+            self.serialize(dedup="bloom", bloom_filter_bits=64),
+            (metadata, rows, indexes),
+        )
+        self.assertEqual(
+            self.serialize(index_reaction_strings=False), (metadata, rows, [])
+        )
+
+        with self.assertRaises(ValueError):
+            self.serialize(dedup="none")
+
+    def test_batched_writes(self):
+        metadata, rows, indexes = self.serialize(commit_barrier=100000)
+        # batches smaller than and not aligned with the shards
+        self.assertEqual(
+            self.serialize(commit_barrier=37, bulk_pragmas=False),
+            (metadata, rows, indexes),
+        )
+        self.assertEqual(metadata[3], 2)
+        for row in rows:
+            self.assertAlmostEqual(row[8] / rate(row[9], ROOM_TEMP, 0.0), 1.0)
+
+        dG = np.array([-1.0, 0.0, 0.3, 2.0])
+        self.assertArrayAlmostEqual(
+            rates(dG, ROOM_TEMP, 0.1) / [rate(x, ROOM_TEMP, 0.1) for x in dG],
+            np.ones(len(dG)),
+        )
+
+    def test_pipelined(self):
+        self.assertEqual(
+            self.serialize(num_workers=3, queue_size=2, commit_barrier=50),
+            self.serialize(),
+        )
+
+    def test_reaction_key(self):
+        self.assertEqual(
+            reaction_key((0,), (1,), 10), 0x00000001000000000000000200000000
+        )
+        self.assertEqual(
+            reaction_key((3, 4), (5, 6), 10), 0x00000004000000050000000600000007
+        )
+        self.assertNotEqual(
+            reaction_key((3, 4), (5,), 10), reaction_key((4, 3), (5,), 10)
+        )
+        # exact keys beyond 16 bit species indices
+        self.assertEqual(
+            reaction_key((70000, 4), (65535,), 70001),
+            0x00011171000000050001000000000000,
+        )
+        self.assertNotEqual(
+            reaction_key((70000,), (4,), 70001), reaction_key((4,), (70000,), 70001)
+        )
+        with self.assertRaises(ValueError):
+            reaction_key((3,), (5,), 2 ** 32)
+        with self.assertRaises(ValueError):
+            reaction_key((3, 4, 5), (5,), 10)
+
+        bloom = BloomFilter(1 << 12)
+        keys = [reaction_key((i,), (i + 1,), 100) for i in range(50)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(bloom.might_contain(key) for key in keys))
+        self.assertFalse(bloom.might_contain(reaction_key((1,), (0,), 100)))
+
+    def test_reaction_key_set(self):
+        rng = np.random.default_rng(11)
+        keys = {
+            reaction_key(
+                [int(i) for i in rng.integers(0, 2 ** 31, 2)],
+                [int(rng.integers(0, 2 ** 31))],
+                2 ** 31,
+            )
+            for _ in range(5000)
+        }
+        key_set = ReactionKeySet(capacity=8)
+        for key in keys:
+            self.assertNotIn(key, key_set)
+            key_set.add(key)
+            key_set.add(key)
+        # grown by doubling, and never more than half full
+        self.assertEqual(len(key_set), len(keys))
+        self.assertEqual(len(key_set.high), 16384)
+        self.assertEqual(key_set.high.dtype, np.uint64)
+        self.assertTrue(all(key in key_set for key in keys))
+        # the same halves swapped are another key
+        self.assertFalse(
+            any(((key & (2 ** 64 - 1)) << 64 | key >> 64) in key_set for key in keys)
+        )
+        with self.assertRaises(ValueError):
+            key_set.add(0)
+        with self.assertRaises(ValueError):
+            ReactionKeySet(capacity=12)
+
+    def test_dedup_large_network(self):
+        # more species than fit in 16 bits
+        generator = LargeReactionIterator()
+        tables = []
+        for dedup in ["sql", "hash", "bloom"]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                folder = os.path.join(tmp_dir, "network")
+                network = SerializeNetwork(
+                    folder, generator, shard_size=100, dedup=dedup, dG_cutoff=10.0
+                )
+                con = sqlite3.connect(folder + "/rn.sqlite")
+                metadata = con.execute("SELECT * FROM metadata;").fetchone()
+                rows = []
+                for shard in range(metadata[3]):
+                    rows += con.execute(
+                        "SELECT * FROM reactions_{} ORDER BY reaction_id;".format(
+                            shard
+                        )
+                    ).fetchall()
+                con.close()
+            tables.append((metadata, rows))
+            if dedup == "hash":
+                self.assertEqual(len(network.reaction_keys), metadata[1])
+        metadata, rows = tables[0]
+        self.assertEqual(metadata[0], 70000)
+        self.assertEqual(len({row[1] for row in rows}), len(rows))
+        # every reaction and its reverse, once
+        self.assertEqual(len(rows), len(generator.reactions))
+        self.assertEqual(tables[1], tables[0])
+        self.assertEqual(tables[2], tables[0])
+
+
+class TestReactionTable(PymatgenTest):
+    def test_reaction_table(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = serialize_network(tmp_dir)
+            con = sqlite3.connect(folder + "/rn.sqlite")
+            metadata = con.execute("SELECT * FROM metadata;").fetchone()
+            number_of_reactions, shard_size, number_of_shards = metadata[1:4]
+
+            lazy = ReactionTable(
+                con, number_of_reactions, shard_size, number_of_shards, batch_size=7
+            )
+            eager = ReactionTable(
+                con, number_of_reactions, shard_size, number_of_shards
+            )
+            eager.load_all()
+            self.assertTrue(eager.loaded_shards.all())
+            self.assertFalse(np.isnan(eager.dG).any())
+
+            # the last shard is loaded on its own
+            index = number_of_reactions - 1
+            lazy.reaction(index)
+            self.assertEqual(
+                lazy.loaded_shards.tolist(),
+                [i == index // shard_size for i in range(number_of_shards)],
+            )
+            for index in range(number_of_reactions):
+                res = con.execute(
+                    get_reaction(index // shard_size), (index,)
+                ).fetchone()
+                expected = {
+                    "reactants": [i for i in res[0:2] if i >= 0],
+                    "products": [i for i in res[2:4] if i >= 0],
+                    "dG": res[4],
+                }
+                self.assertEqual(lazy.reaction(index), expected)
+                self.assertEqual(eager.reaction(index), expected)
+            con.close()
+
+
+class TestNetworkUpdater(PymatgenTest):
+    def test_find_duplicates(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = serialize_network(tmp_dir, insert_duplicates=True)
+            network_updater = NetworkUpdater(folder, number_of_threads=2)
+
+            # group every reaction string of every shard in memory
+            ids_by_string = {}
+            for shard in range(network_updater.number_of_shards):
+                for reaction_id, reaction_string in network_updater.connection.execute(
+                    "SELECT reaction_id, reaction_string FROM reactions_{};".format(
+                        shard
+                    )
+                ):
+                    ids_by_string.setdefault(reaction_string, []).append(reaction_id)
+            expected = {
+                tuple(sorted(ids)) for ids in ids_by_string.values() if len(ids) > 1
+            }
+            self.assertTrue(len(expected) > 0)
+
+            self.assertEqual(network_updater.find_duplicates(), expected)
+            self.assertEqual(
+                network_updater.find_duplicates(number_of_partitions=3, batch_size=7),
+                expected,
+            )
+            # the partitions are cleaned up
+            self.assertEqual(os.listdir(folder), ["rn.sqlite"])
+
+            network_updater.set_duplicate_reaction_rates_to_zero()
+            zeroed = {x for xs in expected for x in xs[1:]}
+            for index in range(network_updater.number_of_reactions):
+                shard = index // network_updater.shard_size
+                reaction_rate = network_updater.connection.execute(
+                    "SELECT rate FROM reactions_{} WHERE reaction_id = ?;".format(
+                        shard
+                    ),
+                    (index,),
+                ).fetchone()[0]
+                self.assertEqual(reaction_rate == 0.0, index in zeroed)
+            network_updater.connection.close()
+
+    def test_recompute_all_rates(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = serialize_network(tmp_dir)
+            network_updater = NetworkUpdater(folder)
+            for temperature, kwargs in [
+                (400.0, {"batch_size": 7}),
+                (300.0, {"commit_frequency": 5}),
+                (350.0, {"commit_frequency": 30, "batch_size": 7}),
+            ]:
+                network_updater.recompute_all_rates(temperature, 0.3, **kwargs)
+
+                # read through another connection, which only sees committed rows
+                reader = sqlite3.connect(os.path.join(folder, "rn.sqlite"))
+                rows = []
+                for shard in range(network_updater.number_of_shards):
+                    rows += reader.execute(
+                        "SELECT reaction_id, rate, dG FROM reactions_{};".format(shard)
+                    ).fetchall()
+                self.assertEqual(len(rows), network_updater.number_of_reactions)
+                for _, reaction_rate, dG in rows:
+                    self.assertAlmostEqual(
+                        reaction_rate / rate(dG, temperature, 0.3), 1.0
+                    )
+                reader.close()
+            network_updater.connection.close()
+
+
+class TestTimeDepProfiles(PymatgenTest):
+    def test_time_dep_profiles(self):
+        reactions, table = toy_network()
+        stoichiometry = stoichiometry_matrix(table, 3)
+
+        rng = np.random.RandomState(3)
+        initial_state = np.array([5, 1, 0])
+        state = initial_state.copy()
+        history, states = [], [initial_state.copy()]
+        for _ in range(40):
+            enabled = [
+                i
+                for i, r in enumerate(reactions)
+                if all(state[x] >= r["reactants"].count(x) for x in r["reactants"])
+            ]
+            history.append(rng.choice(enabled))
+            update_state(state, reactions[history[-1]])
+            states.append(state.copy())
+        times = np.cumsum(rng.exponential(size=len(history)))
+
+        for frequency in [1, 3, 40, 100]:
+            snapshots, species, fired = time_dep_profiles(
+                stoichiometry, initial_state, np.array(history), times, frequency
+            )
+            steps = list(range(0, len(history) + 1, frequency))
+            if steps[-1] != len(history):
+                steps.append(len(history))
+            self.assertArrayEqual(snapshots, [0.0] + [times[k - 1] for k in steps[1:]])
+            self.assertArrayEqual(species, [states[k] for k in steps])
+            self.assertArrayEqual(
+                species_at_steps(
+                    stoichiometry, initial_state, np.array(history), np.array(steps)
+                ),
+                species,
+            )
+            counts = [np.bincount(history[:k], minlength=len(reactions)) for k in steps]
+            self.assertArrayEqual(np.cumsum(fired.toarray(), axis=0), counts)
+            self.assertEqual(
+                reaction_profile_dict(fired),
+                dict(enumerate(np.array(counts).T.tolist())),
+            )
+
+        # a second B + B -> C with no B left
+        with self.assertRaises(NegativeStateError) as context:
+            time_dep_profiles(
+                stoichiometry, initial_state, np.array([0, 1, 1]), times[:3]
+            )
+        self.assertEqual(context.exception.species, 1)
+        self.assertEqual(context.exception.step, 2)
+        self.assertEqual(context.exception.reaction, 1)
+
+
+class TestReactionStatistics(PymatgenTest):
+    def test_reaction_statistics(self):
+        reactions, table = toy_network()
+        consumed, produced = incidence_matrices(table, 3)
+        self.assertArrayEqual(
+            consumed.toarray(), [[1, 0, 0], [0, 2, 0], [0, 0, 1], [1, 1, 0]]
+        )
+        self.assertArrayEqual(
+            produced.toarray(), [[0, 1, 0], [0, 0, 1], [2, 0, 0], [1, 0, 1]]
+        )
+        self.assertArrayEqual(
+            stoichiometry_matrix(table, 3).toarray(),
+            [[-1, 1, 0], [0, -2, 1], [2, 0, -1], [0, -1, 1]],
+        )
+
+        rng = np.random.RandomState(5)
+        histories = [rng.randint(0, 3, size=n).astype(np.int32) for n in (30, 0, 7)]
+        offsets = np.cumsum([0] + [len(h) for h in histories])
+        simulation_histories = SimulationHistories(
+            ["1", "2", "3"],
+            offsets,
+            np.concatenate(histories),
+            np.zeros(offsets[-1]),
+        )
+        counts = reaction_counts(simulation_histories, len(reactions))
+        expected_counts = np.array(
+            [np.bincount(h, minlength=len(reactions)) for h in histories]
+        )
+        self.assertArrayEqual(counts.toarray(), expected_counts)
+
+        species_produced, species_consumed = species_production(
+            counts, consumed, produced
+        )
+        for i, history in enumerate(histories):
+            expected_produced = np.zeros(3, dtype=int)
+            expected_consumed = np.zeros(3, dtype=int)
+            for reaction in history:
+                for species in reactions[reaction]["products"]:
+                    expected_produced[species] += 1
+                for species in reactions[reaction]["reactants"]:
+                    expected_consumed[species] += 1
+            self.assertArrayEqual(species_produced.toarray()[i], expected_produced)
+            self.assertArrayEqual(species_consumed.toarray()[i], expected_consumed)
+
+        observed, mean, std = count_statistics(counts)
+        for reaction in range(len(reactions)):
+            fired = [c for c in expected_counts[:, reaction] if c > 0]
+            self.assertEqual(observed[reaction], len(fired))
+            if len(fired) == 0:
+                self.assertTrue(np.isnan(mean[reaction]))
+            else:
+                self.assertAlmostEqual(mean[reaction], np.mean(fired))
+                self.assertAlmostEqual(std[reaction], np.std(fired))
+
+
+class TestReactionPathways(PymatgenTest):
+    def test_history_pathway(self):
+        _, table = toy_network()
+        _, produced = incidence_matrices(table, 3)
+        initial_state = np.array([5, 0, 0])
+
+        history = np.array([0, 0, 1, 2, 0, 3])
+        self.assertArrayEqual(first_production_steps(produced, history), [3, 0, 2])
+        self.assertArrayEqual(
+            first_production_steps(produced, history[:2]), [-1, 0, -1]
+        )
+
+        def pathway(target, history):
+            return history_pathway(
+                produced, table.reactants, initial_state, target, history
+            )
+
+        # both B consumed by B + B -> C come from the first A -> B
+        self.assertEqual(pathway(2, history), [0, 0, 1])
+        self.assertEqual(pathway(0, history), [0, 0, 1, 2])
+        self.assertEqual(pathway(1, history), [0])
+        self.assertIsNone(pathway(2, history[:2]))
+
+        with self.assertRaises(ValueError):
+            pathway(2, np.array([1]))
+
+
+class TestStreamingStatistics(PymatgenTest):
+    def test_streaming_statistics(self):
+        _, table = toy_network()
+        _, produced = incidence_matrices(table, 3)
+        stoichiometry = stoichiometry_matrix(table, 3)
+        initial_state = np.array([5, 0, 0])
+
+        histories = [
+            np.array([0, 0, 1, 2, 0, 3]),
+            np.array([0, 0, 0, 1]),
+            np.array([], dtype=int),
+        ]
+        times = [np.arange(1.0, len(h) + 1) for h in histories]
+        bin_edges = np.array([0.0, 2.5, 4.0, 10.0])
+        statistics = StreamingStatistics(
+            stoichiometry,
+            produced,
+            table.reactants,
+            initial_state,
+            target_species=[0, 2],
+            bin_edges=bin_edges,
+        )
+        for history, time_history in zip(histories, times):
+            statistics.add(history, time_history)
+
+        self.assertEqual(statistics.number_simulations, 3)
+        self.assertEqual(
+            list(statistics.reaction_tally.items()), [(0, 6), (1, 2), (2, 1), (3, 1)]
+        )
+        self.assertEqual(
+            statistics.pathways[0],
+            {frozenset([0, 1, 2]): {"pathway": [0, 0, 1, 2], "frequency": 1}},
+        )
+        self.assertEqual(
+            statistics.pathways[2],
+            {frozenset([0, 1]): {"pathway": [0, 0, 1], "frequency": 2}},
+        )
+
+        profiles = []
+        for history, time_history in zip(histories, times):
+            _, species, _ = time_dep_profiles(
+                stoichiometry, initial_state, history, time_history
+            )
+            steps = np.searchsorted(time_history, bin_edges, side="right")
+            profiles.append(species[steps])
+        mean, std = statistics.profile_statistics()
+        self.assertArrayAlmostEqual(mean, np.mean(profiles, axis=0))
+        self.assertArrayAlmostEqual(std, np.std(profiles, axis=0))
+
+        final_states = [profile[-1] for profile in profiles]
+        mean, std = statistics.final_state_statistics()
+        self.assertArrayAlmostEqual(mean, np.mean(final_states, axis=0))
+        self.assertArrayAlmostEqual(std, np.std(final_states, axis=0))
+
+
+def write_history(folder, seed, reactions, times):
+    with open(os.path.join(folder, "reactions_" + str(seed)), "w") as f:
+        f.writelines(str(r) + "\n" for r in reactions)
+    with open(os.path.join(folder, "times_" + str(seed)), "w") as f:
+        f.writelines(repr(t) + "\n" for t in times)
+
+
+class TestSimulationHistories(PymatgenTest):
+    def test_load(self):
+        rng = np.random.RandomState(0)
+        histories = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = os.path.join(tmp_dir, "simulation_histories")
+            os.mkdir(folder)
+            for seed in [1, 2, 10, 3]:
+                length = 0 if seed == 3 else rng.randint(1, 500)
+                reactions = rng.randint(0, 100000, length)
+                times = np.cumsum(rng.exponential(size=length))
+                write_history(folder, seed, reactions, times)
+                histories[str(seed)] = (reactions, times)
+
+            loaded = SimulationHistories.load(folder)
+            # the seeds come in the order of the file names
+            self.assertEqual(loaded.seeds, ["1", "10", "2", "3"])
+            self.assertEqual(loaded.reactions.dtype, np.int32)
+            for i, seed in enumerate(loaded.seeds):
+                self.assertArrayEqual(loaded.reaction_history(i), histories[seed][0])
+                self.assertArrayEqual(loaded.time_history(i), histories[seed][1])
+
+            cache = os.path.join(tmp_dir, "cache")
+            for mmap in [True, True, False]:
+                cached = SimulationHistories.load(folder, cache, mmap=mmap)
+                self.assertEqual(isinstance(cached.reactions, np.memmap), mmap)
+                self.assertEqual(cached.seeds, loaded.seeds)
+                self.assertArrayEqual(cached.offsets, loaded.offsets)
+                self.assertArrayEqual(cached.reactions, loaded.reactions)
+                self.assertArrayEqual(cached.times, loaded.times)
+
+            # a changed history invalidates the cache
+            write_history(folder, 2, [7, 8], [0.5, 1.5])
+            cached = SimulationHistories.load(folder, cache)
+            self.assertArrayEqual(cached.reaction_history(2), [7, 8])
+            self.assertArrayEqual(cached.time_history(2), [0.5, 1.5])
+
+            write_history(folder, 4, [7, 8], [0.5])
+            with self.assertRaises(ValueError):
+                SimulationHistories.load(folder)
+            os.remove(os.path.join(folder, "times_4"))
+            with self.assertRaises(ValueError):
+                SimulationHistories.load(folder)
+            os.remove(os.path.join(folder, "reactions_4"))
+
+            # read one simulation at a time
+            files = HistoryFiles(folder)
+            self.assertEqual(files.seeds, cached.seeds)
+            reaction_histories = HistorySequence(files.reaction_history, len(files))
+            self.assertEqual(len(reaction_histories), 4)
+            for i in range(len(files)):
+                self.assertArrayEqual(reaction_histories[i], cached.reaction_history(i))
+                self.assertArrayEqual(files.time_history(i), cached.time_history(i))
+            self.assertArrayEqual(reaction_histories[-2], [7, 8])
+            self.assertEqual(len(reaction_histories[1:3]), 2)
+            with self.assertRaises(IndexError):
+                reaction_histories[4]
+
+
+def simulated_network(tmp_dir, number_of_simulations=12):
+    """
+    a network folder with the reactions of serialize_network, an initial state
+    and the histories of random walks over the enabled reactions, as the
+    simulator would leave it. returns the folder and the histories by seed.
+    """
+    folder = serialize_network(tmp_dir)
+    entries_box = load_entries_box()
+    rng = np.random.RandomState(7)
+    initial_species = rng.choice(
+        len(entries_box.entries_list), size=12, replace=False
+    )
+    serialize_initial_state(
+        folder,
+        entries_box,
+        [(entries_box.entries_list[i], 3) for i in initial_species],
+    )
+    with open(os.path.join(folder, "initial_state")) as f:
+        initial_state = np.array([int(c) for c in f.readlines()])
+
+    con = sqlite3.connect(os.path.join(folder, "rn.sqlite"))
+    number_of_reactions, shard_size, number_of_shards = con.execute(
+        "SELECT * FROM metadata;"
+    ).fetchone()[1:4]
+    table = ReactionTable(con, number_of_reactions, shard_size, number_of_shards)
+    table.load_all()
+    con.close()
+    consumed, _ = incidence_matrices(table, len(initial_state))
+    consumed = consumed.toarray()
+    stoichiometry = stoichiometry_matrix(table, len(initial_state)).toarray()
+
+    # the molecule diagrams need graphviz, and are not drawn if already there
+    os.makedirs(os.path.join(folder, "reports", "molecule_diagrams"))
+    histories_folder = os.path.join(folder, "simulation_histories")
+    os.mkdir(histories_folder)
+    histories = {}
+    for seed in range(number_of_simulations):
+        state = initial_state.copy()
+        reactions = []
+        for _ in range(0 if seed == 5 else 60):
+            enabled = np.flatnonzero((consumed <= state).all(axis=1))
+            if len(enabled) == 0:
+                break
+            reactions.append(int(rng.choice(enabled)))
+            state += stoichiometry[reactions[-1]]
+        times = np.cumsum(rng.exponential(size=len(reactions)))
+        write_history(histories_folder, seed, reactions, times)
+        histories[str(seed)] = (np.array(reactions, dtype=int), times)
+    return folder, histories
+
+
+class TestSimulationAnalyzer(PymatgenTest):
+    def test_analysis_modes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder, histories = simulated_network(tmp_dir)
+            entries_box = load_entries_box()
+
+            reference = SimulationAnalyzer(folder, entries_box)
+            self.assertEqual(reference.number_simulations, len(histories))
+            for i, seed in enumerate(reference.histories.seeds):
+                self.assertArrayEqual(
+                    reference.reaction_histories[i], histories[seed][0]
+                )
+                self.assertArrayEqual(reference.time_histories[i], histories[seed][1])
+
+            # the two species produced in the most simulations, out of those
+            # with a pathway of more than two reactions
+            reference.compute_reaction_tally()
+            for target in np.flatnonzero(reference.initial_state == 0).tolist():
+                reference.extract_reaction_pathways(target)
+            targets = sorted(
+                (
+                    target
+                    for target, pathways in reference.reaction_pathways_dict.items()
+                    if max([len(p["pathway"]) for p in pathways.values()] or [0]) > 2
+                ),
+                key=lambda target: -sum(
+                    p["frequency"]
+                    for p in reference.reaction_pathways_dict[target].values()
+                ),
+            )[:2]
+            self.assertEqual(len(targets), 2)
+            for target in targets:
+                pathways = reference.reaction_pathways_dict[target].values()
+                self.assertTrue(len(pathways) > 1)
+                self.assertTrue(max(p["frequency"] for p in pathways) > 1)
+            profiles = reference.generate_time_dep_profiles(frequency=7)
+
+            def check(analyzer):
+                self.assertEqual(
+                    [h.tolist() for h in analyzer.reaction_histories],
+                    [h.tolist() for h in reference.reaction_histories],
+                )
+                analyzer.compute_reaction_tally()
+                self.assertEqual(
+                    list(analyzer.observed_reactions.items()),
+                    list(reference.observed_reactions.items()),
+                )
+                for target in targets:
+                    analyzer.extract_reaction_pathways(target)
+                    self.assertEqual(
+                        analyzer.reaction_pathways_dict[target],
+                        reference.reaction_pathways_dict[target],
+                    )
+                    self.assertEqual(
+                        analyzer.extract_species_consumption_info(target),
+                        reference.extract_species_consumption_info(target),
+                    )
+                analyzer_profiles = analyzer.generate_time_dep_profiles(frequency=7)
+                for key in ["species_profiles", "reaction_profiles", "snapshot_times"]:
+                    self.assertEqual(analyzer_profiles[key], profiles[key])
+                self.assertArrayEqual(
+                    analyzer_profiles["final_states"], profiles["final_states"]
+                )
+                for reaction_index in analyzer.observed_reactions:
+                    self.assertEqual(
+                        analyzer.index_to_reaction(reaction_index),
+                        reference.index_to_reaction(reaction_index),
+                    )
+
+            for kwargs in [
+                {"streaming": True},
+                # the second analyzer with cache_histories reads the cache
+                {"cache_histories": True},
+                {"cache_histories": True},
+                {"streaming": True, "cache_histories": True},
+                {"load_reactions": "all"},
+                {"load_reactions": "query"},
+                {"streaming": True, "load_reactions": "query"},
+            ]:
+                analyzer = SimulationAnalyzer(folder, entries_box, **kwargs)
+                check(analyzer)
+                if kwargs.get("cache_histories"):
+                    self.assertTrue(
+                        os.path.isdir(os.path.join(folder, "simulation_histories_npy"))
+                    )
+                    if not kwargs.get("streaming"):
+                        self.assertIsInstance(analyzer.histories.reactions, np.memmap)
+
+            # pathways from a pool of processes, with and without streaming
+            for streaming in [False, True]:
+                analyzer = SimulationAnalyzer(folder, entries_box, streaming=streaming)
+                for target in targets:
+                    analyzer.extract_reaction_pathways(target, number_of_processes=2)
+                    self.assertEqual(
+                        list(analyzer.reaction_pathways_dict[target].items()),
+                        list(reference.reaction_pathways_dict[target].items()),
+                    )
+
+            # everything folded in one pass
+            bin_edges = np.linspace(
+                0.0, max(times[-1] for _, times in histories.values() if len(times)), 6
+            )
+            for streaming in [False, True]:
+                analyzer = SimulationAnalyzer(folder, entries_box, streaming=streaming)
+                statistics = analyzer.stream_statistics(targets, bin_edges)
+                self.assertEqual(
+                    list(analyzer.observed_reactions.items()),
+                    list(reference.observed_reactions.items()),
+                )
+                for target in targets:
+                    self.assertEqual(
+                        analyzer.reaction_pathways_dict[target],
+                        reference.reaction_pathways_dict[target],
+                    )
+
+                mean, std = statistics.final_state_statistics()
+                self.assertArrayAlmostEqual(
+                    mean, np.mean(profiles["final_states"], axis=0)
+                )
+                self.assertArrayAlmostEqual(
+                    std, np.std(profiles["final_states"], axis=0)
+                )
+
+                binned = []
+                for n_sim in range(reference.number_simulations):
+                    _, species, _ = reference.time_dep_profile_arrays(n_sim)
+                    steps = np.searchsorted(
+                        reference.time_histories[n_sim], bin_edges, side="right"
+                    )
+                    binned.append(species[steps])
+                mean, std = statistics.profile_statistics()
+                self.assertArrayAlmostEqual(mean, np.mean(binned, axis=0))
+                self.assertArrayAlmostEqual(std, np.std(binned, axis=0))
@@ -0,0 +1,35 @@
+import copy
+from pathlib import Path
+
+import networkx as nx
+from monty.serialization import loadfn
+
+from mrnet.utils.graphs import weisfeiler_lehman_hash
+
+test_dir = Path(__file__).parent.parent.parent.joinpath(
+    "test_files", "reaction_network_files"
+)
+
+
+def test_weisfeiler_lehman_hash():
+    entries = loadfn(test_dir.joinpath("ronalds_MoleculeEntry.json"))
+
+    for entry in entries:
+        graph = entry.graph
+        # relabeling the atoms does not change the hash
+        perm = list(reversed(range(len(graph))))
+        relabeled = nx.relabel_nodes(graph, dict(zip(range(len(graph)), perm)))
+        assert weisfeiler_lehman_hash(relabeled) == weisfeiler_lehman_hash(graph)
+
+    # entries with different hashes are never isomorphic
+    for e1 in entries[:20]:
+        for e2 in entries[:20]:
+            if weisfeiler_lehman_hash(e1.graph) != weisfeiler_lehman_hash(e2.graph):
+                assert not e1.mol_graph.isomorphic_to(e2.mol_graph)
+
+    # species are part of the hash
+    entry = [e for e in entries if e.num_atoms > 2][0]
+    graph = copy.deepcopy(entry.graph)
+    node = [n for n in graph.nodes if graph.nodes[n]["specie"] != "Cl"][0]
+    graph.nodes[node]["specie"] = "Cl"
+    assert weisfeiler_lehman_hash(graph) != weisfeiler_lehman_hash(entry.graph)